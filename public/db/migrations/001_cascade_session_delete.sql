@@ -0,0 +1,27 @@
+-- 001: delete a session's messages with the session (needed by delete_chat_sessions)
+-- Migrations are idempotent; apply them in order in the Supabase SQL editor.
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE chat_messages DROP CONSTRAINT IF EXISTS chat_messages_session_id_fkey;
+ALTER TABLE chat_messages ADD CONSTRAINT chat_messages_session_id_fkey
+    FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE;
+
+-- Deletes only sessions of the user in the caller's JWT
+CREATE OR REPLACE FUNCTION delete_chat_sessions(p_session_ids UUID[])
+RETURNS INT AS $$
+    WITH deleted AS (
+        DELETE FROM chat_sessions
+        WHERE user_id = auth.uid() AND id = ANY(p_session_ids)
+        RETURNING id
+    )
+    SELECT COUNT(*)::INT FROM deleted;
+$$ LANGUAGE sql;
+
+REVOKE ALL ON FUNCTION delete_chat_sessions(UUID[]) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION delete_chat_sessions(UUID[]) TO authenticated;
+
+INSERT INTO schema_migrations (version) VALUES ('001_cascade_session_delete') ON CONFLICT DO NOTHING;
@@ -0,0 +1,21 @@
+-- 002: composite indexes matching the hot queries
+--   sidebar:      WHERE user_id = ? [AND created_at < ?] ORDER BY created_at DESC LIMIT n
+--   chat history: WHERE session_id = ? [AND created_at >= ? / < ?] ORDER BY created_at [DESC] LIMIT n
+-- Both become a single index range scan with no sort, at any table size.
+-- On a large live table, run each CREATE INDEX as CREATE INDEX CONCURRENTLY on its own instead.
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_id_created_at
+    ON chat_sessions(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id_created_at
+    ON chat_messages(session_id, created_at);
+
+-- The single-column indexes are prefixes of the new ones
+DROP INDEX IF EXISTS idx_chat_sessions_user_id;
+DROP INDEX IF EXISTS idx_chat_messages_session_id;
+
+INSERT INTO schema_migrations (version) VALUES ('002_composite_indexes') ON CONFLICT DO NOTHING;
@@ -0,0 +1,65 @@
+-- 003: message_count and last_message_at on chat_sessions, kept up to date by triggers
+-- Statement-level triggers update each session once per insert statement, so the
+-- app's bulk message inserts cost one UPDATE per session rather than one per row.
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS message_count INT NOT NULL DEFAULT 0;
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMPTZ;
+
+-- Backfill existing sessions
+UPDATE chat_sessions s
+SET message_count = m.message_count, last_message_at = m.last_message_at
+FROM (
+    SELECT session_id, COUNT(*) AS message_count, MAX(created_at) AS last_message_at
+    FROM chat_messages
+    GROUP BY session_id
+) m
+WHERE m.session_id = s.id;
+
+CREATE OR REPLACE FUNCTION chat_messages_inserted() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE chat_sessions s
+    SET message_count = s.message_count + n.message_count,
+        last_message_at = GREATEST(s.last_message_at, n.last_message_at)
+    FROM (
+        SELECT session_id, COUNT(*) AS message_count, MAX(created_at) AS last_message_at
+        FROM new_rows
+        GROUP BY session_id
+    ) n
+    WHERE s.id = n.session_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION chat_messages_deleted() RETURNS TRIGGER AS $$
+BEGIN
+    -- Sessions being deleted themselves are already gone and simply don't match
+    UPDATE chat_sessions s
+    SET message_count = GREATEST(s.message_count - o.message_count, 0)
+    FROM (
+        SELECT session_id, COUNT(*) AS message_count
+        FROM old_rows
+        GROUP BY session_id
+    ) o
+    WHERE s.id = o.session_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS chat_messages_inserted ON chat_messages;
+CREATE TRIGGER chat_messages_inserted
+    AFTER INSERT ON chat_messages
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_messages_inserted();
+
+DROP TRIGGER IF EXISTS chat_messages_deleted ON chat_messages;
+CREATE TRIGGER chat_messages_deleted
+    AFTER DELETE ON chat_messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_messages_deleted();
+
+INSERT INTO schema_migrations (version) VALUES ('003_session_message_stats') ON CONFLICT DO NOTHING;
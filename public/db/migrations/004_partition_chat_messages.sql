@@ -0,0 +1,83 @@
+-- 004 (optional): partition chat_messages by month (apply after 001-003)
+-- Only worth it once the table holds tens of millions of rows: old months can then be
+-- detached or dropped cheaply and vacuum works per partition. The composite index from
+-- 002 already keeps the app's queries fast without it.
+-- This copies the table inside one transaction and blocks writes while it runs, so use a
+-- maintenance window. Re-create any row level security policies on the new table afterwards.
+-- The primary key becomes (id, created_at), as partitioned tables require; the app's
+-- upserts by primary key keep working because retries resend the same created_at.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE chat_messages RENAME TO chat_messages_unpartitioned;
+ALTER TABLE chat_messages_unpartitioned RENAME CONSTRAINT chat_messages_pkey TO chat_messages_unpartitioned_pkey;
+ALTER INDEX IF EXISTS idx_chat_messages_session_id_created_at RENAME TO idx_chat_messages_unpartitioned_session_id_created_at;
+DROP TRIGGER IF EXISTS chat_messages_inserted ON chat_messages_unpartitioned;
+DROP TRIGGER IF EXISTS chat_messages_deleted ON chat_messages_unpartitioned;
+
+CREATE TABLE chat_messages (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    session_id UUID NOT NULL,
+    content TEXT,
+    role TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at),
+    FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows outside the monthly partitions; keep it empty by creating months ahead
+CREATE TABLE chat_messages_default PARTITION OF chat_messages DEFAULT;
+
+CREATE INDEX idx_chat_messages_session_id_created_at ON chat_messages(session_id, created_at);
+
+-- Create monthly partitions from p_from for p_months months; schedule it (e.g. with pg_cron) to stay ahead
+CREATE OR REPLACE FUNCTION create_chat_message_partitions(p_from DATE, p_months INT)
+RETURNS VOID AS $$
+DECLARE
+    v_start DATE;
+BEGIN
+    FOR i IN 0..p_months - 1 LOOP
+        v_start := (date_trunc('month', p_from) + make_interval(months => i))::DATE;
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+            'chat_messages_' || to_char(v_start, 'YYYY_MM'),
+            v_start,
+            (v_start + INTERVAL '1 month')::DATE
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_chat_message_partitions(
+    COALESCE((SELECT MIN(created_at) FROM chat_messages_unpartitioned), now())::DATE,
+    (
+        SELECT (EXTRACT(YEAR FROM age(now(), COALESCE(MIN(created_at), now()))) * 12
+              + EXTRACT(MONTH FROM age(now(), COALESCE(MIN(created_at), now()))))::INT + 4
+        FROM chat_messages_unpartitioned
+    )
+);
+
+INSERT INTO chat_messages (id, session_id, content, role, created_at)
+SELECT id, session_id, content, role, COALESCE(created_at, now())
+FROM chat_messages_unpartitioned;
+
+-- Triggers from 003 go on after the copy so existing counts aren't added twice
+CREATE TRIGGER chat_messages_inserted
+    AFTER INSERT ON chat_messages
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_messages_inserted();
+CREATE TRIGGER chat_messages_deleted
+    AFTER DELETE ON chat_messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_messages_deleted();
+
+INSERT INTO schema_migrations (version) VALUES ('004_partition_chat_messages') ON CONFLICT DO NOTHING;
+
+COMMIT;
+
+-- After checking the new table: DROP TABLE chat_messages_unpartitioned;
@@ -0,0 +1,61 @@
+-- 005: per-user analysis quota. One usage row per analysis, checked against a sliding
+-- window by consume_analysis_quota, which takes the user from the caller's JWT and the
+-- limit and window from the server.
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS usage (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+CREATE INDEX IF NOT EXISTS idx_usage_user_id_created_at ON usage(user_id, created_at);
+
+-- Users read and give back only their own usage; rows are added by consume_analysis_quota
+ALTER TABLE usage ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS usage_select_own ON usage;
+CREATE POLICY usage_select_own ON usage FOR SELECT TO authenticated USING (user_id = auth.uid());
+DROP POLICY IF EXISTS usage_delete_own ON usage;
+CREATE POLICY usage_delete_own ON usage FOR DELETE TO authenticated USING (user_id = auth.uid());
+
+-- Keep the limit and window in sync with ANALYSIS_DAILY_LIMIT and QUOTA_WINDOW_SECONDS in app_config.py
+CREATE OR REPLACE FUNCTION consume_analysis_quota()
+RETURNS TABLE (allowed BOOLEAN, used INT, oldest TIMESTAMPTZ, usage_id UUID) AS $$
+DECLARE
+    v_user_id UUID := auth.uid();
+    v_limit CONSTANT INT := 15;
+    v_window CONSTANT INTERVAL := INTERVAL '24 hours';
+    v_used INT;
+    v_oldest TIMESTAMPTZ;
+    v_id UUID;
+BEGIN
+    IF v_user_id IS NULL THEN
+        RAISE EXCEPTION 'consume_analysis_quota requires a signed-in user' USING ERRCODE = '42501';
+    END IF;
+
+    -- Serialize concurrent requests for the same user
+    PERFORM pg_advisory_xact_lock(hashtext(v_user_id::text));
+
+    SELECT COUNT(*), MIN(u.created_at) INTO v_used, v_oldest
+    FROM usage u
+    WHERE u.user_id = v_user_id
+      AND u.created_at > now() - v_window;
+
+    IF v_used >= v_limit THEN
+        RETURN QUERY SELECT FALSE, v_used, v_oldest, NULL::UUID;
+        RETURN;
+    END IF;
+
+    INSERT INTO usage (user_id) VALUES (v_user_id) RETURNING id INTO v_id;
+    RETURN QUERY SELECT TRUE, v_used + 1, COALESCE(v_oldest, now()), v_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION consume_analysis_quota() FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION consume_analysis_quota() TO authenticated;
+
+INSERT INTO schema_migrations (version) VALUES ('005_analysis_quota') ON CONFLICT DO NOTHING;
@@ -0,0 +1,18 @@
+-- 006: the sidebar pages sessions by (created_at, id), so sessions created in the same
+-- instant are neither skipped nor repeated between pages:
+--   WHERE user_id = ? [AND (created_at < ? OR (created_at = ? AND id < ?))]
+--   ORDER BY created_at DESC, id DESC LIMIT n
+-- On a large live table, run the CREATE INDEX as CREATE INDEX CONCURRENTLY on its own instead.
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_id_created_at_id
+    ON chat_sessions(user_id, created_at DESC, id DESC);
+
+-- A prefix of the new index
+DROP INDEX IF EXISTS idx_chat_sessions_user_id_created_at;
+
+INSERT INTO schema_migrations (version) VALUES ('006_session_cursor_index') ON CONFLICT DO NOTHING;
@@ -12,6 +12,8 @@ CREATE TABLE chat_sessions (
     user_id UUID NOT NULL,
     title TEXT,
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    message_count INT NOT NULL DEFAULT 0,
+    last_message_at TIMESTAMPTZ,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
@@ -22,12 +24,133 @@ CREATE TABLE chat_messages (
     content TEXT,
     role TEXT,
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (session_id) REFERENCES chat_sessions(id)
+    FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE
+);
+
+-- Create usage table (one row per analysis, used for the sliding daily quota)
+CREATE TABLE usage (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
 -- Add indexes to improve query performance
-CREATE INDEX idx_chat_sessions_user_id ON chat_sessions(user_id);
-CREATE INDEX idx_chat_messages_session_id ON chat_messages(session_id);
+-- Composite indexes serve the sidebar and chat history queries (filter + ORDER BY created_at) in one range scan
+CREATE INDEX idx_chat_sessions_user_id_created_at_id ON chat_sessions(user_id, created_at DESC, id DESC);
+CREATE INDEX idx_chat_messages_session_id_created_at ON chat_messages(session_id, created_at);
+CREATE INDEX idx_usage_user_id_created_at ON usage(user_id, created_at);
 
 -- Add unique constraint to prevent duplicate emails
-ALTER TABLE users ADD CONSTRAINT unique_email UNIQUE (email);
\ No newline at end of file
+ALTER TABLE users ADD CONSTRAINT unique_email UNIQUE (email);
+
+-- Atomically check the signed-in user's sliding-window quota and record one analysis.
+-- The limit and window live here, not in the request, so clients can't raise them;
+-- keep them in sync with ANALYSIS_DAILY_LIMIT and QUOTA_WINDOW_SECONDS in app_config.py.
+-- Existing databases: apply public/db/migrations/005_analysis_quota.sql
+CREATE OR REPLACE FUNCTION consume_analysis_quota()
+RETURNS TABLE (allowed BOOLEAN, used INT, oldest TIMESTAMPTZ, usage_id UUID) AS $$
+DECLARE
+    v_user_id UUID := auth.uid();
+    v_limit CONSTANT INT := 15;
+    v_window CONSTANT INTERVAL := INTERVAL '24 hours';
+    v_used INT;
+    v_oldest TIMESTAMPTZ;
+    v_id UUID;
+BEGIN
+    IF v_user_id IS NULL THEN
+        RAISE EXCEPTION 'consume_analysis_quota requires a signed-in user' USING ERRCODE = '42501';
+    END IF;
+
+    -- Serialize concurrent requests for the same user
+    PERFORM pg_advisory_xact_lock(hashtext(v_user_id::text));
+
+    SELECT COUNT(*), MIN(u.created_at) INTO v_used, v_oldest
+    FROM usage u
+    WHERE u.user_id = v_user_id
+      AND u.created_at > now() - v_window;
+
+    IF v_used >= v_limit THEN
+        RETURN QUERY SELECT FALSE, v_used, v_oldest, NULL::UUID;
+        RETURN;
+    END IF;
+
+    INSERT INTO usage (user_id) VALUES (v_user_id) RETURNING id INTO v_id;
+    RETURN QUERY SELECT TRUE, v_used + 1, COALESCE(v_oldest, now()), v_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION consume_analysis_quota() FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION consume_analysis_quota() TO authenticated;
+
+-- Users read and give back only their own usage; rows are added by consume_analysis_quota
+ALTER TABLE usage ENABLE ROW LEVEL SECURITY;
+CREATE POLICY usage_select_own ON usage FOR SELECT TO authenticated USING (user_id = auth.uid());
+CREATE POLICY usage_delete_own ON usage FOR DELETE TO authenticated USING (user_id = auth.uid());
+
+-- Delete some of the signed-in user's chat sessions; their messages go with them through ON DELETE CASCADE.
+-- Existing databases: apply public/db/migrations/001_cascade_session_delete.sql
+CREATE OR REPLACE FUNCTION delete_chat_sessions(p_session_ids UUID[])
+RETURNS INT AS $$
+    WITH deleted AS (
+        DELETE FROM chat_sessions
+        WHERE user_id = auth.uid() AND id = ANY(p_session_ids)
+        RETURNING id
+    )
+    SELECT COUNT(*)::INT FROM deleted;
+$$ LANGUAGE sql;
+
+REVOKE ALL ON FUNCTION delete_chat_sessions(UUID[]) FROM PUBLIC, anon;
+GRANT EXECUTE ON FUNCTION delete_chat_sessions(UUID[]) TO authenticated;
+
+-- Keep chat_sessions.message_count and last_message_at current, once per statement
+CREATE OR REPLACE FUNCTION chat_messages_inserted() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE chat_sessions s
+    SET message_count = s.message_count + n.message_count,
+        last_message_at = GREATEST(s.last_message_at, n.last_message_at)
+    FROM (
+        SELECT session_id, COUNT(*) AS message_count, MAX(created_at) AS last_message_at
+        FROM new_rows
+        GROUP BY session_id
+    ) n
+    WHERE s.id = n.session_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION chat_messages_deleted() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE chat_sessions s
+    SET message_count = GREATEST(s.message_count - o.message_count, 0)
+    FROM (
+        SELECT session_id, COUNT(*) AS message_count
+        FROM old_rows
+        GROUP BY session_id
+    ) o
+    WHERE s.id = o.session_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_messages_inserted
+    AFTER INSERT ON chat_messages
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_messages_inserted();
+
+CREATE TRIGGER chat_messages_deleted
+    AFTER DELETE ON chat_messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION chat_messages_deleted();
+
+-- Schema changes after this script live in public/db/migrations; this script already includes 001-003, 005 and 006
+CREATE TABLE schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO schema_migrations (version) VALUES
+    ('001_cascade_session_delete'),
+    ('002_composite_indexes'),
+    ('003_session_message_stats'),
+    ('005_analysis_quota'),
+    ('006_session_cursor_index');
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+Benchmark the app's hot chat queries against the old and new index layouts.
+
+    python scripts/benchmark_queries.py --messages 100000,1000000,3000000
+
+Builds a SQLite copy of the chat_sessions/chat_messages schema per size, then times
+the sidebar and chat history queries issued by AuthService with the original
+single-column indexes and with the composite indexes and denormalized counts from
+public/db/migrations. Each size includes one heavy user and one long session, where
+the difference shows. SQLite stands in for Postgres here: absolute numbers differ,
+but both planners need the composite index to skip the sort.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+SESSION_PAGE_SIZE = 20
+MESSAGE_PAGE_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE chat_sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT,
+    created_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_message_at TEXT
+);
+CREATE TABLE chat_messages (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    content TEXT,
+    role TEXT,
+    created_at TEXT NOT NULL
+);
+"""
+
+LAYOUTS = {
+    "single-column": [
+        "CREATE INDEX idx_chat_sessions_user_id ON chat_sessions(user_id)",
+        "CREATE INDEX idx_chat_messages_session_id ON chat_messages(session_id)"
+    ],
+    # Composite indexes; the message count query also switches to the denormalized columns
+    "composite": [
+        "CREATE INDEX idx_chat_sessions_user_id_created_at_id ON chat_sessions(user_id, created_at DESC, id DESC)",
+        "CREATE INDEX idx_chat_messages_session_id_created_at ON chat_messages(session_id, created_at)"
+    ]
+}
+
+# name -> (sql for the single-column layout, sql for the composite layout)
+QUERIES = {
+    "sidebar first page": (
+        "SELECT id, title, created_at FROM chat_sessions WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT :session_limit",
+    ),
+    "sidebar next page": (
+        "SELECT id, title, created_at FROM chat_sessions WHERE user_id = :user_id "
+        "AND (created_at, id) < (:before, :before_id) ORDER BY created_at DESC, id DESC LIMIT :session_limit",
+    ),
+    "sidebar with message counts": (
+        "SELECT s.id, s.title, COUNT(m.id), MAX(m.created_at) FROM chat_sessions s "
+        "LEFT JOIN chat_messages m ON m.session_id = s.id WHERE s.user_id = :user_id "
+        "GROUP BY s.id ORDER BY s.created_at DESC LIMIT :session_limit",
+        "SELECT id, title, message_count, last_message_at FROM chat_sessions WHERE user_id = :user_id "
+        "ORDER BY created_at DESC, id DESC LIMIT :session_limit"
+    ),
+    "history newest page": (
+        "SELECT id, role, content, created_at FROM chat_messages WHERE session_id = :session_id "
+        "ORDER BY created_at DESC LIMIT :message_limit",
+    ),
+    "history new since cursor": (
+        "SELECT id, role, content, created_at FROM chat_messages WHERE session_id = :session_id "
+        "AND created_at >= :since ORDER BY created_at",
+    )
+}
+
+def build_database(path, total_messages, users, seed=7):
+    """Create and fill a database; returns the parameters for a typical and a heavy case."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    start = datetime(2024, 1, 1)
+
+    sessions_per_user = max(1, total_messages // (users * 40))
+    heavy_user = str(uuid.UUID(int=rng.getrandbits(128)))
+    sessions = []
+    for user_index in range(users):
+        user_id = heavy_user if user_index == 0 else str(uuid.UUID(int=rng.getrandbits(128)))
+        count = sessions_per_user * 20 if user_index == 0 else rng.randint(1, sessions_per_user * 2)
+        for _ in range(count):
+            created_at = start + timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+            sessions.append((str(uuid.UUID(int=rng.getrandbits(128))), user_id, created_at))
+    conn.executemany(
+        "INSERT INTO chat_sessions (id, user_id, title, created_at) VALUES (?, ?, 'Report analysis', ?)",
+        ((session_id, user_id, created_at.isoformat()) for session_id, user_id, created_at in sessions)
+    )
+
+    # One long session with a tenth of all messages, the rest spread at random
+    heavy_session = sessions[0][0]
+    heavy_count = total_messages // 10
+    counts = {}
+
+    def messages():
+        for index in range(total_messages):
+            if index < heavy_count:
+                session_id, _, created_at = sessions[0]
+            else:
+                session_id, _, created_at = sessions[rng.randrange(len(sessions))]
+            counts[session_id] = counts.get(session_id, 0) + 1
+            yield (
+                str(uuid.UUID(int=rng.getrandbits(128))),
+                session_id,
+                "Analyzing report for patient" if index % 2 else "Analysis content " * 20,
+                "assistant" if index % 2 else "user",
+                (created_at + timedelta(seconds=rng.randint(0, 30 * 24 * 3600))).isoformat()
+            )
+
+    conn.executemany(
+        "INSERT INTO chat_messages (id, session_id, content, role, created_at) VALUES (?, ?, ?, ?, ?)",
+        messages()
+    )
+    conn.execute(
+        "UPDATE chat_sessions SET message_count = s.message_count, last_message_at = s.last_message_at "
+        "FROM (SELECT session_id, COUNT(*) AS message_count, MAX(created_at) AS last_message_at "
+        "FROM chat_messages GROUP BY session_id) s WHERE chat_sessions.id = s.session_id"
+    )
+    conn.commit()
+
+    typical_session = max(
+        (session for session in sessions[1:] if session[1] != heavy_user),
+        key=lambda session: counts.get(session[0], 0) if counts.get(session[0], 0) <= 60 else -1
+    )
+    typical = _params(conn, typical_session[1], typical_session[0])
+    heavy = _params(conn, heavy_user, heavy_session)
+    conn.close()
+    return {"typical": typical, "heavy": heavy}
+
+def _params(conn, user_id, session_id):
+    before = conn.execute(
+        "SELECT created_at, id FROM chat_sessions WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?",
+        (user_id, SESSION_PAGE_SIZE)
+    ).fetchone()
+    since = conn.execute(
+        "SELECT created_at FROM chat_messages WHERE session_id = ? ORDER BY created_at DESC LIMIT 1 OFFSET 5",
+        (session_id,)
+    ).fetchone()
+    return {
+        "user_id": user_id,
+        "session_id": session_id,
+        "before": before[0] if before else "9999",
+        "before_id": before[1] if before else "",
+        "since": since[0] if since else "0000",
+        "session_limit": SESSION_PAGE_SIZE + 1,
+        "message_limit": MESSAGE_PAGE_SIZE + 1
+    }
+
+def apply_layout(conn, layout):
+    for statement in conn.execute(
+            "SELECT 'DROP INDEX ' || name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+        conn.execute(statement[0])
+    for statement in LAYOUTS[layout]:
+        conn.execute(statement)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def time_query(conn, sql, params, runs):
+    """Median and p95 latency in milliseconds, and whether the plan needs a sort."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1], "TEMP B-TREE" in plan
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat queries with and without the composite indexes.")
+    parser.add_argument("--messages", default="100000,1000000",
+                        help="Comma-separated total message counts to test")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs per query")
+    parser.add_argument("--dir", default=None, help="Where to put the databases (default: a temp dir)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="chat-bench-")
+    print(f"{'messages':>10}  {'case':<8} {'query':<28} {'layout':<14} {'p50 ms':>8} {'p95 ms':>8}  sort")
+    for total in (int(value) for value in args.messages.split(",")):
+        path = os.path.join(directory, f"chat_{total}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        started = time.time()
+        cases = build_database(path, total, args.users)
+        print(f"# built {total:,} messages in {time.time() - started:.0f}s")
+
+        conn = sqlite3.connect(path)
+        for layout_index, layout in enumerate(LAYOUTS):
+            apply_layout(conn, layout)
+            for case, params in cases.items():
+                for name, variants in QUERIES.items():
+                    sql = variants[min(layout_index, len(variants) - 1)]
+                    p50, p95, sorts = time_query(conn, sql, params, args.runs)
+                    print(f"{total:>10,}  {case:<8} {name:<28} {layout:<14} {p50:>8.3f} {p95:>8.3f}  {'yes' if sorts else 'no'}")
+        conn.close()
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,80 @@
-from datetime import datetime, timedelta
-import streamlit as st
-from agents.model_manager import ModelManager
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from agents.model_manager import ModelManager, ModelTier
+from agents.state import StreamlitState
+from auth.user_client import get_user_clients
+from config.app_config import (
+    MAP_REDUCE_MIN_REPORT_TOKENS,
+    MAP_REDUCE_MIN_SECTIONS,
+    MAP_REDUCE_WORKERS,
+    MAP_REDUCE_SECTION_MAX_TOKENS,
+    RETRIEVAL_EXAMPLE_MAX_CHARS
+)
+from config.prompts import SPECIALIST_PROMPTS
+from services.cache_service import get_analysis_cache
+from services.knowledge_store import get_knowledge_base
+from services.near_duplicate_cache import get_near_duplicate_index
+from services.quota_service import get_quota_service
+from services.retrieval_service import get_case_retriever
+from utils.lab_parser import parse_lab_report, LabResult
+from utils.report_sections import split_sections
+from utils.token_budget import compact_report, truncate_to_tokens
+from utils.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
 
 class AnalysisAgent:
     """
     Agent responsible for managing report analysis, rate limiting,
     and implementing in-context learning from previous analyses.
+    
+    Per-user state (user, analytics) lives in a state backend from agents.state:
+    StreamlitState in the app, MemoryState or SQLiteState elsewhere.
+    prepare_request, run_analysis, complete_analysis and index_analysis only use
+    the shared, lock-protected caches and stores, so one agent can serve many
+    worker threads. Other methods use the state backend, which only MemoryState
+    and SQLiteState allow from several threads.
     """
     
-    def __init__(self):
-        self.model_manager = ModelManager()
+    # Fast tiers for the per-section calls of a map-reduce analysis
+    SECTION_TIERS = [ModelTier.TERTIARY, ModelTier.SECONDARY]
+    
+    def __init__(self, model_manager=None, state=None, quota=None):
+        """
+        Args:
+            model_manager: ModelManager to use (default: one configured from Streamlit secrets)
+            state: State backend (default: StreamlitState)
+            quota: QuotaService to use (default: the process-wide one)
+        """
+        self.state = state or StreamlitState()
+        self.model_manager = model_manager or ModelManager()
+        self.cache = get_analysis_cache()
+        self.knowledge_base = get_knowledge_base()
+        self.retriever = get_case_retriever()
+        self.near_duplicates = get_near_duplicate_index()
+        if quota is None:
+            auth_service = self.state.get('auth_service')
+            quota = get_quota_service(get_user_clients() if auth_service else None)
+        self.quota = quota
         self._init_state()
         
     def _init_state(self):
-        """Initialize analysis-related session state variables."""
-        if 'analysis_count' not in st.session_state:
-            st.session_state.analysis_count = 0
-        if 'last_analysis' not in st.session_state:
-            st.session_state.last_analysis = datetime.now()
-        if 'analysis_limit' not in st.session_state:
-            st.session_state.analysis_limit = 15
-        if 'models_used' not in st.session_state:
-            st.session_state.models_used = {}
-        if 'knowledge_base' not in st.session_state:
-            st.session_state.knowledge_base = {}
+        """Initialize analysis-related state variables."""
+        self.state.setdefault('models_used', {})
+        self.state.setdefault('cache_stats', {"hits": 0, "near_hits": 0, "misses": 0})
             
+    def _user_id(self):
+        user = self.state.get('user') or {}
+        return user.get('id', 'anonymous')
+
+    def _access_token(self):
+        return self.state.get('auth_token')
+
     def check_rate_limit(self):
         """Check if user has reached their analysis limit."""
-        # Calculate time until reset
-        time_until_reset = timedelta(days=1) - (datetime.now() - st.session_state.last_analysis)
-        hours, remainder = divmod(time_until_reset.seconds, 3600)
-        minutes, _ = divmod(remainder, 60)
-        
-        # Reset counter after 24 hours
-        if time_until_reset.days < 0:
-            st.session_state.analysis_count = 0
-            st.session_state.last_analysis = datetime.now()
-            return True, None
-        
-        # Check if limit reached
-        if st.session_state.analysis_count >= st.session_state.analysis_limit:
-            error_msg = f"Daily limit reached. Reset in {hours}h {minutes}m"
-            return False, error_msg
-        return True, None
+        return self.quota.check(self._user_id(), self._access_token())
 
-    def analyze_report(self, data, system_prompt, check_only=False, chat_history=None):
+    def analyze_report(self, data, system_prompt, check_only=False, chat_history=None, stream=False):
         """
         Analyze report data using in-context learning from previous analyses.
         
@@ -53,83 +83,285 @@ class AnalysisAgent:
             system_prompt: Base system prompt
             check_only: If True, only check rate limit without generating analysis
             chat_history: Previous messages in the current session (optional)
+            stream: If True, return a generator of ModelManager stream events
         """
-        can_analyze, error_msg = self.check_rate_limit()
-        if not can_analyze:
-            return {"success": False, "error": error_msg}
-        
         if check_only:
-            return can_analyze, error_msg
+            return self.check_rate_limit()
+        
+        prepared = self.prepare_analysis(data, system_prompt, chat_history)
         
+        if stream:
+            return self._analyze_report_stream(prepared)
+        
+        if "result" in prepared:
+            return prepared["result"]
+        
+        result = self.run_analysis(prepared)
+        self.complete_analysis(prepared, result)
+        self.record_analysis(prepared, result)
+        return result
+    
+    def _analyze_report_stream(self, prepared):
+        """Streaming variant of analyze_report yielding ModelManager stream events."""
+        if "result" in prepared:
+            result = prepared["result"]
+            if result["success"]:
+                yield {"type": "token", "content": result["content"]}
+            yield {"type": "done", "result": result}
+            return
+        
+        for event in self.run_analysis(prepared, stream=True):
+            if event["type"] == "done":
+                self.complete_analysis(prepared, event["result"])
+                self.record_analysis(prepared, event["result"])
+            yield event
+    
+    def prepare_analysis(self, data, system_prompt, chat_history=None):
+        """
+        Run the session-bound steps before any model call: preprocessing,
+        cache lookup, quota reservation and prompt building.
+        Returns {"result": ...} if the request is already answered (cache hit,
+        near-duplicate hit or quota exceeded), otherwise the inputs for run_analysis.
+        """
+        user_id = self._user_id()
+        access_token = self._access_token()
+        prepared = self.prepare_request(
+            data, system_prompt, chat_history,
+            reserve=lambda: self.quota.consume(user_id, access_token),
+            user_id=user_id
+        )
+        if "result" not in prepared:
+            # complete_analysis may run off the script thread and needs it to give quota back
+            prepared["access_token"] = access_token
+        self._update_cache_stats(prepared["cache_status"])
+        return prepared
+    
+    def prepare_request(self, data, system_prompt, chat_history=None, reserve=None, user_id=None):
+        """
+        Preprocess a report and build its prompt without touching session state.
+        `reserve` is called after cache misses to take quota and must return
+        (allowed, error_msg, usage_id); without it no quota is used.
+        `user_id` scopes near-duplicate reuse and similar cases to that user's own reports.
+        """
         # Process data before sending to model
         processed_data = self._preprocess_data(data)
         
-        # Enhance prompt with in-context learning (only if chat_history is provided)
-        enhanced_prompt = self._build_enhanced_prompt(system_prompt, processed_data, chat_history) if chat_history else system_prompt
+        # Serve repeated requests from the cache; hits don't count against the daily limit.
+        # Only answers from the tier that would answer now are reused, so a fallback
+        # model's answer is not served while the primary model is up.
+        tier = self.model_manager.select_tiers()[0].value
+        cached = self.cache.get(self.cache.make_key(processed_data, system_prompt, tier))
+        if cached:
+            return {"result": {**cached, "success": True, "cached": True}, "cache_status": "hits"}
         
-        # Generate analysis using model manager
-        result = self.model_manager.generate_analysis(processed_data, enhanced_prompt)
+        # Reuse the analysis of a nearly identical report whose flagged values are the same
+        near_duplicate = self.near_duplicates.find(processed_data, system_prompt, user_id)
+        if near_duplicate:
+            logger.info(
+                f"Near-duplicate report (similarity {near_duplicate['similarity']:.2f}); "
+                f"model calls saved so far: {self.near_duplicates.stats()['llm_calls_saved']}"
+            )
+            return {"result": {
+                **near_duplicate["result"],
+                "success": True,
+                "cached": True,
+                "near_duplicate": {"similarity": round(near_duplicate["similarity"], 3)}
+            }, "cache_status": "near_hits"}
         
-        if result["success"]:
-            # Update analytics and learning systems
-            self._update_analytics(result)
-            self._update_knowledge_base(processed_data, result["content"])
+        # Reserve one analysis from the user's quota; it is given back if the analysis fails
+        usage_id = None
+        if reserve:
+            can_analyze, error_msg, usage_id = reserve()
+            if not can_analyze:
+                return {"result": {"success": False, "error": error_msg}, "cache_status": "misses"}
+        
+        # Enhance prompt with in-context learning from the user's knowledge base and chat history
+        enhanced_prompt = self._build_enhanced_prompt(system_prompt, processed_data, chat_history, user_id)
+        
+        model_data, token_budget = self._fit_token_budget(data, processed_data, enhanced_prompt)
+        sections = self._plan_sections(model_data, token_budget)
+        
+        return {
+            "processed_data": processed_data,
+            "model_data": model_data,
+            "system_prompt": system_prompt,
+            "prompt": enhanced_prompt,
+            "cache_status": "misses",
+            "user_id": user_id,
+            "usage_id": usage_id,
+            "token_budget": token_budget,
+            "sections": sections
+        }
+    
+    def _plan_sections(self, processed_data, token_budget):
+        """Split large reports into sections for a map-reduce analysis; None for a single call."""
+        if not isinstance(processed_data, dict) or (token_budget["report_tokens"] or 0) < MAP_REDUCE_MIN_REPORT_TOKENS:
+            return None
+        sections = split_sections(processed_data["report"])
+        return sections if len(sections) >= MAP_REDUCE_MIN_SECTIONS else None
+    
+    def _fit_token_budget(self, data, processed_data, prompt):
+        """
+        Estimate prompt tokens per model tier, trimming the report if no tier can take it.
+        Returns (model_data, token counts reported in the result metadata). model_data is
+        processed_data itself, or a copy with the report trimmed; processed_data is left
+        whole because the cache and near-duplicate keys are computed from it.
+        """
+        raw_report = data.get("report", "") if isinstance(data, dict) else str(data)
+        prompt_tokens = self.model_manager.estimate_prompt_tokens(processed_data, prompt)
         
+        model_data = processed_data
+        truncated = False
+        overflow = prompt_tokens - self.model_manager.max_prompt_tokens()
+        if overflow > 0 and isinstance(processed_data, dict):
+            report = processed_data["report"]
+            model_data = {**processed_data, "report": truncate_to_tokens(report, estimate_tokens(report) - overflow)}
+            prompt_tokens = self.model_manager.estimate_prompt_tokens(model_data, prompt)
+            truncated = True
+        
+        return model_data, {
+            "raw_report_tokens": estimate_tokens(raw_report),
+            "report_tokens": estimate_tokens(model_data["report"]) if isinstance(model_data, dict) else None,
+            "prompt_tokens": prompt_tokens,
+            "truncated": truncated,
+            "fitting_tiers": [
+                tier.value for tier in ModelTier
+                if self.model_manager.fits_context(tier, prompt_tokens)
+            ]
+        }
+    
+    def run_analysis(self, prepared, stream=False):
+        """
+        Generate the analysis for prepared inputs.
+        Doesn't touch session state, so it is safe to call from worker threads.
+        """
+        if stream:
+            return self._run_analysis_stream(prepared)
+        data, prompt, metadata = self._analysis_inputs(prepared)
+        result = self.model_manager.generate_analysis(data, prompt)
+        return self._attach_metadata(result, metadata)
+    
+    def _run_analysis_stream(self, prepared):
+        data, prompt, metadata = self._analysis_inputs(prepared)
+        for event in self.model_manager.generate_analysis_stream(data, prompt):
+            if event["type"] == "done":
+                self._attach_metadata(event["result"], metadata)
+            yield event
+    
+    def _analysis_inputs(self, prepared):
+        """
+        Return (data, prompt, metadata) for the final model call.
+        For sectioned reports this runs the map step, and the final call reduces
+        the section findings on the preferred tier.
+        """
+        metadata = {"token_budget": prepared.get("token_budget"), "trace": []}
+        if not prepared.get("sections"):
+            return prepared["model_data"], prepared["prompt"], metadata
+        
+        data = prepared["model_data"]
+        sections = prepared["sections"]
+        section_prompt = SPECIALIST_PROMPTS["section_analyst"]
+        section_inputs = [{**data, "report": text} for _, text in sections]
+        
+        # Section tiers in health order, and only as many calls at once as their token budget admits
+        tiers = self.model_manager.select_tiers(self.SECTION_TIERS)
+        largest_call = max(
+            self.model_manager.estimate_prompt_tokens(section_input, section_prompt)
+            for section_input in section_inputs
+        ) + MAP_REDUCE_SECTION_MAX_TOKENS
+        workers = max(1, min(
+            MAP_REDUCE_WORKERS,
+            len(sections),
+            self.model_manager.tokens_per_minute(tiers) // largest_call
+        ))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda section_input: self.model_manager.generate_analysis(
+                    section_input,
+                    section_prompt,
+                    tiers=tiers,
+                    max_tokens=MAP_REDUCE_SECTION_MAX_TOKENS
+                ),
+                section_inputs
+            ))
+        
+        failed = [name for (name, _), result in zip(sections, results) if not result["success"]]
+        metadata["trace"] = [entry for result in results for entry in result["trace"]]
+        metadata["map_reduce"] = {"sections": [name for name, _ in sections], "failed_sections": failed}
+        if len(failed) == len(sections):
+            # Nothing to reduce; analyze the whole report in one call instead
+            return data, prepared["prompt"], metadata
+        
+        findings = []
+        for (name, text), result in zip(sections, results):
+            # A section that couldn't be reviewed is passed through as raw values
+            findings.append(f"### {name}\n{result['content'] if result['success'] else text}")
+        report = "## Section findings\n" + "\n\n".join(findings)
+        if data.get("lab_panel"):
+            report += "\n\n## Out-of-range values\n" + self._summarize_panel(data)
+        
+        prompt = prepared["prompt"] + "\n\n" + SPECIALIST_PROMPTS["report_synthesis"]
+        return {**data, "report": report}, prompt, metadata
+    
+    def _attach_metadata(self, result, metadata):
+        """Add token counts and map step details to a model result."""
+        result["token_budget"] = metadata["token_budget"]
+        result["trace"] = metadata["trace"] + result.get("trace", [])
+        if "map_reduce" in metadata:
+            result["map_reduce"] = metadata["map_reduce"]
         return result
     
+    def complete_analysis(self, prepared, result):
+        """Cache and learn from a successful result or give the quota back (thread-safe)."""
+        if result["success"]:
+            tier = _answering_tier(result)
+            if tier:
+                self.cache.set(self.cache.make_key(prepared["processed_data"], prepared["system_prompt"], tier), result)
+            self.near_duplicates.add(
+                prepared["processed_data"], prepared["system_prompt"], result, prepared["user_id"]
+            )
+            self._update_knowledge_base(prepared["processed_data"], result["content"], prepared["user_id"])
+        else:
+            self.quota.release(prepared["user_id"], prepared["usage_id"], prepared.get("access_token"))
+    
+    def index_analysis(self, prepared, result):
+        """Add a saved analysis to the similar-case index (thread-safe)."""
+        data = prepared["processed_data"]
+        if not result["success"] or not isinstance(data, dict):
+            return
+        try:
+            self.retriever.add(
+                prepared["user_id"], data.get("lab_panel"), self._summarize_panel(data),
+                _strip_disclaimer(result["content"])
+            )
+        except Exception as e:
+            logger.warning(f"Failed to index analysis: {str(e)}")
+    
+    def record_analysis(self, prepared, result):
+        """Update this session's analytics after an analysis."""
+        if result["success"]:
+            self._update_analytics(result)
+    
     def _update_analytics(self, result):
         """Update analytics after successful analysis."""
-        st.session_state.analysis_count += 1
-        st.session_state.last_analysis = datetime.now()
-        
         # Track which models are being used
         model_used = result.get("model_used", "unknown")
-        if model_used in st.session_state.models_used:
-            st.session_state.models_used[model_used] += 1
-        else:
-            st.session_state.models_used[model_used] = 1
+        self.state.increment('models_used', model_used)
     
-    def _update_knowledge_base(self, data, analysis):
+    def _update_cache_stats(self, key):
+        """Track cache hits, near-duplicate hits and misses for this session."""
+        self.state.increment('cache_stats', key)
+    
+    def _update_knowledge_base(self, data, analysis, user_id):
         """
         Update knowledge base with new analysis results for in-context learning.
         Maps key health indicators to analysis patterns.
         """
         if not isinstance(data, dict) or 'report' not in data:
             return
-            
-        # Extract key health indicators and map them to analysis outcomes
-        # This basic implementation can be expanded with more sophisticated extraction
-        report_text = data['report'].lower()
-        patient_profile = f"{data.get('age', 'unknown')}-{data.get('gender', 'unknown')}"
-        
-        # Look for key health indicators in the report
-        key_indicators = [
-            "hemoglobin", "glucose", "cholesterol", "triglycerides", 
-            "hdl", "ldl", "wbc", "rbc", "platelet", "creatinine"
-        ]
-        
-        # Store snippets of analysis associated with key health indicators
-        for indicator in key_indicators:
-            if indicator in report_text:
-                # Find any mentions of this indicator in the analysis
-                if indicator in analysis.lower():
-                    # Store this learning in knowledge base
-                    if indicator not in st.session_state.knowledge_base:
-                        st.session_state.knowledge_base[indicator] = {}
-                    
-                    if patient_profile not in st.session_state.knowledge_base[indicator]:
-                        st.session_state.knowledge_base[indicator][patient_profile] = []
-                    
-                    # Extract the relevant section from analysis (simple approach)
-                    lines = analysis.split('\n')
-                    relevant_lines = [l for l in lines if indicator in l.lower()]
-                    if relevant_lines:
-                        # Limit knowledge base size to prevent overflow
-                        if len(st.session_state.knowledge_base[indicator][patient_profile]) >= 3:
-                            st.session_state.knowledge_base[indicator][patient_profile].pop(0)
-                        st.session_state.knowledge_base[indicator][patient_profile].append(relevant_lines[0])
+        self.knowledge_base.learn(data, analysis, user_id)
     
-    def _build_enhanced_prompt(self, system_prompt, data, chat_history):
+    def _build_enhanced_prompt(self, system_prompt, data, chat_history, user_id=None):
         """
         Build an enhanced prompt using in-context learning from:
         1. Knowledge base of previous analyses
@@ -139,9 +371,13 @@ class AnalysisAgent:
         
         # Add in-context learning from knowledge base
         if isinstance(data, dict) and 'report' in data:
-            kb_context = self._get_knowledge_base_context(data)
+            kb_context = self._get_knowledge_base_context(data, user_id)
             if kb_context:
                 enhanced_prompt += "\n\n## Relevant Learning From Previous Analyses\n" + kb_context
+            
+            similar_cases = self._get_similar_cases(data, user_id)
+            if similar_cases:
+                enhanced_prompt += "\n\n## Similar Previous Cases\n" + similar_cases
         
         # Add session context from chat history
         if chat_history:
@@ -151,35 +387,40 @@ class AnalysisAgent:
         
         return enhanced_prompt
     
-    def _get_knowledge_base_context(self, data):
-        """Extract relevant context from knowledge base."""
-        if 'knowledge_base' not in st.session_state or not st.session_state.knowledge_base:
+    def _get_knowledge_base_context(self, data, user_id):
+        """Extract relevant context from the user's knowledge base."""
+        return self.knowledge_base.context(data, user_id)
+    
+    def _get_similar_cases(self, data, user_id):
+        """Format the user's prior analyses of the most similar lab panels as examples."""
+        try:
+            cases = self.retriever.similar(user_id, data.get("lab_panel"))
+        except Exception as e:
+            logger.warning(f"Similar case lookup failed: {str(e)}")
             return ""
-            
-        report_text = data.get('report', '').lower()
-        patient_profile = f"{data.get('age', 'unknown')}-{data.get('gender', 'unknown')}"
         
-        context_items = []
-        
-        # Find relevant knowledge from previous analyses
-        for indicator, profiles in st.session_state.knowledge_base.items():
-            if indicator in report_text:
-                # Get insights from similar patient profiles first
-                if patient_profile in profiles:
-                    for insight in profiles[patient_profile]:
-                        context_items.append(f"- {indicator} (similar patient profile): {insight}")
-                
-                # Then get general insights
-                for profile, insights in profiles.items():
-                    if profile != patient_profile:
-                        for insight in insights:
-                            context_items.append(f"- {indicator} (other patient profile): {insight}")
-        
-        # Limit context size
-        if len(context_items) > 5:
-            context_items = context_items[:5]
-            
-        return "\n".join(context_items) if context_items else ""
+        examples = []
+        for number, case in enumerate(cases, 1):
+            analysis = case["analysis"]
+            if len(analysis) > RETRIEVAL_EXAMPLE_MAX_CHARS:
+                analysis = analysis[:RETRIEVAL_EXAMPLE_MAX_CHARS - 3] + "..."
+            examples.append(
+                f"### Case {number} (similarity {case['similarity']:.2f})\n"
+                f"Report:\n{case['report']}\n\nAnalysis:\n{analysis}"
+            )
+        return "\n\n".join(examples)
+    
+    def _summarize_panel(self, data):
+        """Out-of-range values of a report, used as the stored report of a case."""
+        flagged = [
+            LabResult.from_dict(value).to_prompt()
+            for value in data.get("lab_panel", []) if value["status"] in ("low", "high")
+        ]
+        if flagged:
+            return "\n".join(flagged)
+        if not data.get("lab_panel"):
+            return "No structured lab values parsed"
+        return "All values within reference ranges"
     
     def _get_session_context(self, chat_history):
         """Extract relevant context from current session."""
@@ -215,7 +456,22 @@ class AnalysisAgent:
                 "patient_name": data.get("patient_name", ""),
                 "age": data.get("age", ""),
                 "gender": data.get("gender", ""),
-                "report": data.get("report", "")
+                "report": compact_report(data.get("report", ""))
             }
+            
+            # Send the parsed lab values compactly instead of the raw report text
+            panel = parse_lab_report(processed["report"])
+            if panel.results:
+                processed["report"] = panel.to_prompt()
+                processed["lab_panel"] = [result.to_dict() for result in panel.results]
             return processed
         return data
+
+def _strip_disclaimer(analysis):
+    """Drop the quoted disclaimer so stored examples keep only the findings."""
+    return "\n".join(line for line in analysis.split("\n") if not line.lstrip().startswith(">")).strip()
+
+def _answering_tier(result):
+    """The tier of the model call that produced the final answer, from the result's trace."""
+    tiers = [entry["tier"] for entry in result.get("trace", []) if entry["outcome"] == "success"]
+    return tiers[-1] if tiers else None
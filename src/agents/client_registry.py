@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import groq
+import httpx
+from config.app_config import (
+    GROQ_POOL_MAX_CONNECTIONS,
+    GROQ_POOL_MAX_KEEPALIVE,
+    GROQ_KEEPALIVE_EXPIRY_SECONDS,
+    GROQ_CONNECT_TIMEOUT_SECONDS,
+    GROQ_READ_TIMEOUT_SECONDS
+)
+
+class PoolStats:
+    """Counters for requests and connections going through a shared pool."""
+
+    def __init__(self, max_connections):
+        self.max_connections = max_connections
+        self.requests = 0
+        self.new_connections = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def connection_opened(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(0, self.requests - self.new_connections)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "connection_reuse_rate": round(reused / self.requests, 3) if self.requests else 0.0,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "pool_utilization": round(self.in_flight / self.max_connections, 3),
+                "peak_pool_utilization": round(self.peak_in_flight / self.max_connections, 3)
+            }
+
+class _TrackedStream(httpx.SyncByteStream):
+    """Response body wrapper that marks the request finished once the body is closed."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """HTTP transport that reports pool utilization and connection reuse."""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request):
+        def trace(event_name, info):
+            # httpcore only opens a TCP connection when none can be reused
+            if event_name == "connection.connect_tcp.complete":
+                self.stats.connection_opened()
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self.stats.request_started()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            self.stats.request_finished()
+            raise
+        response.stream = _TrackedStream(response.stream, self.stats.request_finished)
+        return response
+
+_clients = {}
+_stats = {}
+_clients_lock = threading.Lock()
+
+def get_groq_client(api_key):
+    """
+    Return the process-wide Groq client for an API key.
+    All sessions share one HTTP connection pool instead of opening their own.
+    """
+    key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    with _clients_lock:
+        if key not in _clients:
+            stats = PoolStats(GROQ_POOL_MAX_CONNECTIONS)
+            transport = InstrumentedTransport(
+                stats,
+                limits=httpx.Limits(
+                    max_connections=GROQ_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=GROQ_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=GROQ_KEEPALIVE_EXPIRY_SECONDS
+                )
+            )
+            http_client = httpx.Client(
+                transport=transport,
+                timeout=httpx.Timeout(GROQ_READ_TIMEOUT_SECONDS, connect=GROQ_CONNECT_TIMEOUT_SECONDS)
+            )
+            # Retries are handled by our own retry policy so the SDK must not retry silently
+            _clients[key] = groq.Groq(api_key=api_key, max_retries=0, http_client=http_client)
+            _stats[key] = stats
+        return _clients[key]
+
+def get_pool_stats():
+    """Connection pool metrics for every shared client, keyed by a short API key hash."""
+    with _clients_lock:
+        stats = dict(_stats)
+    return {key: value.snapshot() for key, value in stats.items()}
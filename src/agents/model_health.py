@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+from enum import Enum
+from config.app_config import (
+    MODEL_HEALTH_WINDOW,
+    MODEL_HEALTH_MIN_SAMPLES,
+    MODEL_CIRCUIT_ERROR_RATE,
+    MODEL_CIRCUIT_FAILURE_THRESHOLD,
+    MODEL_CIRCUIT_OPEN_SECONDS,
+    MODEL_RATE_LIMIT_COOLDOWN_SECONDS
+)
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class ModelHealth:
+    """Rolling call statistics and circuit breaker state for a single model."""
+
+    def __init__(self, window):
+        self.outcomes = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.cooldown_until = 0.0
+        self.probe_in_flight = False
+        self.probe_started_at = 0.0
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def latency_percentile(self, percentile):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+class ModelHealthTracker:
+    """
+    Tracks model health across all sessions in the process.
+    A model is skipped while its circuit is open or it is cooling down
+    after a rate limit; once the open period ends a single probe request
+    is let through (half-open) to decide whether to close the circuit.
+    """
+
+    def __init__(self, window=50, min_samples=10, error_rate_threshold=0.5,
+                 failure_threshold=5, open_seconds=60, rate_limit_cooldown=30):
+        self.window = window
+        self.min_samples = min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model):
+        if model not in self._models:
+            self._models[model] = ModelHealth(self.window)
+        return self._models[model]
+
+    def _refresh_state(self, health, now):
+        if health.state == CircuitState.OPEN and now - health.opened_at >= self.open_seconds:
+            health.state = CircuitState.HALF_OPEN
+            health.probe_in_flight = False
+        elif health.probe_in_flight and now - health.probe_started_at >= self.open_seconds:
+            # The probe never reported back (e.g. an abandoned stream); allow another
+            health.probe_in_flight = False
+
+    def blocked_for(self, model):
+        """Seconds until the model can be tried again (0 if available now)."""
+        with self._lock:
+            now = time.time()
+            health = self._get(model)
+            self._refresh_state(health, now)
+            waits = [max(0.0, health.cooldown_until - now)]
+            if health.state == CircuitState.OPEN:
+                waits.append(health.opened_at + self.open_seconds - now)
+            elif health.state == CircuitState.HALF_OPEN and health.probe_in_flight:
+                waits.append(health.probe_started_at + self.open_seconds - now)
+            return max(waits)
+
+    def is_available(self, model):
+        return self.blocked_for(model) == 0
+
+    def is_degraded(self, model):
+        """True if the model is reachable but failing often."""
+        with self._lock:
+            health = self._get(model)
+            return len(health.outcomes) >= self.min_samples and \
+                health.error_rate() >= self.error_rate_threshold / 2
+
+    def allow_request(self, model):
+        """Claim permission to call the model, taking the probe slot if half-open."""
+        with self._lock:
+            now = time.time()
+            health = self._get(model)
+            self._refresh_state(health, now)
+            if health.cooldown_until > now or health.state == CircuitState.OPEN:
+                return False
+            if health.state == CircuitState.HALF_OPEN:
+                if health.probe_in_flight:
+                    return False
+                health.probe_in_flight = True
+                health.probe_started_at = now
+            return True
+
+    def release_probe(self, model):
+        """Give back a half-open probe slot that was claimed but not used."""
+        with self._lock:
+            self._get(model).probe_in_flight = False
+
+    def record_success(self, model, latency):
+        with self._lock:
+            health = self._get(model)
+            health.outcomes.append(True)
+            health.latencies.append(latency)
+            health.consecutive_failures = 0
+            if health.state != CircuitState.CLOSED:
+                # A successful probe starts a fresh window so old failures don't re-trip it
+                health.state = CircuitState.CLOSED
+                health.probe_in_flight = False
+                health.outcomes.clear()
+                health.outcomes.append(True)
+
+    def record_failure(self, model, latency):
+        """A transient or server error; these are what trip the circuit."""
+        with self._lock:
+            now = time.time()
+            health = self._get(model)
+            health.outcomes.append(False)
+            health.latencies.append(latency)
+            health.consecutive_failures += 1
+
+            tripped = health.consecutive_failures >= self.failure_threshold or (
+                len(health.outcomes) >= self.min_samples and
+                health.error_rate() >= self.error_rate_threshold
+            )
+            if health.state == CircuitState.HALF_OPEN or tripped:
+                health.state = CircuitState.OPEN
+                health.opened_at = now
+                health.probe_in_flight = False
+
+    def record_rate_limit(self, model, cooldown=None):
+        """Skip the model until the rate limit resets; it says nothing about the model's health."""
+        with self._lock:
+            health = self._get(model)
+            wait = cooldown if cooldown is not None else self.rate_limit_cooldown
+            health.cooldown_until = max(health.cooldown_until, time.time() + wait)
+            health.probe_in_flight = False
+
+    def record_rejection(self, model):
+        """The model answered but rejected this request (bad request, prompt too long)."""
+        with self._lock:
+            self._get(model).probe_in_flight = False
+
+    def snapshot(self):
+        """Per-model stats for monitoring."""
+        with self._lock:
+            now = time.time()
+            stats = {}
+            for model, health in self._models.items():
+                self._refresh_state(health, now)
+                stats[model] = {
+                    "state": health.state.value,
+                    "calls": len(health.outcomes),
+                    "error_rate": round(health.error_rate(), 3),
+                    "p50_latency": health.latency_percentile(50),
+                    "p95_latency": health.latency_percentile(95),
+                    "cooldown_remaining": max(0.0, round(health.cooldown_until - now, 1))
+                }
+            return stats
+
+_health_tracker = None
+_health_tracker_lock = threading.Lock()
+
+def get_health_tracker():
+    """Return the process-wide model health tracker."""
+    global _health_tracker
+    with _health_tracker_lock:
+        if _health_tracker is None:
+            _health_tracker = ModelHealthTracker(
+                window=MODEL_HEALTH_WINDOW,
+                min_samples=MODEL_HEALTH_MIN_SAMPLES,
+                error_rate_threshold=MODEL_CIRCUIT_ERROR_RATE,
+                failure_threshold=MODEL_CIRCUIT_FAILURE_THRESHOLD,
+                open_seconds=MODEL_CIRCUIT_OPEN_SECONDS,
+                rate_limit_cooldown=MODEL_RATE_LIMIT_COOLDOWN_SECONDS
+            )
+        return _health_tracker
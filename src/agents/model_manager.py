@@ -1,11 +1,19 @@
-import groq
 import streamlit as st
 from enum import Enum
 import logging
+import os
 import time
+from config.app_config import RATE_LIMIT_MAX_WAIT_SECONDS
+from utils.tokens import estimate_message_tokens
+from agents.client_registry import get_groq_client
+from agents.model_health import get_health_tracker
+from agents.rate_limiter import get_rate_limiter
+from agents.retry_policy import default_retry_policy, classify_error, parse_retry_after, RATE_LIMIT, TRANSIENT
 
 logger = logging.getLogger(__name__)
 
+REPORT_TOO_LONG_ERROR = "This report is too long to analyze. Please upload a shorter report."
+
 class ModelTier(Enum):
     PRIMARY = "primary"
     SECONDARY = "secondary" 
@@ -22,98 +30,356 @@ class ModelManager:
         ModelTier.PRIMARY: {
             "provider": "groq",
             "model": "meta-llama/llama-4-maverick-17b-128e-instruct",
+            "context_window": 131072,
             "max_tokens": 2000,
-            "temperature": 0.7
+            "temperature": 0.7,
+            "rpm": 30,
+            "tpm": 6000
         },
         ModelTier.SECONDARY: {
             "provider": "groq", 
             "model": "llama-3.3-70b-versatile",
+            "context_window": 131072,
             "max_tokens": 2000,
-            "temperature": 0.7
+            "temperature": 0.7,
+            "rpm": 30,
+            "tpm": 12000
         },
         ModelTier.TERTIARY: {
             "provider": "groq",
             "model": "llama-3.1-8b-instant",
+            "context_window": 131072,
             "max_tokens": 2000, 
-            "temperature": 0.7
+            "temperature": 0.7,
+            "rpm": 30,
+            "tpm": 6000
         },
         ModelTier.FALLBACK: {
             "provider": "groq",
             "model": "llama3-70b-8192",
+            "context_window": 8192,
             "max_tokens": 2000,
-            "temperature": 0.7
+            "temperature": 0.7,
+            "rpm": 30,
+            "tpm": 6000
         }
     }
     
-    def __init__(self):
+    def __init__(self, api_key=None, model_config=None, retry_policy=None):
+        """
+        Args:
+            api_key: Groq API key (default: $GROQ_API_KEY, then st.secrets["GROQ_API_KEY"])
+            model_config: Overrides MODEL_CONFIG, same shape
+            retry_policy: RetryPolicy to use (default: from app_config)
+        """
+        if model_config is not None:
+            self.MODEL_CONFIG = model_config
         self.clients = {}
-        self._initialize_clients()
+        self.health = get_health_tracker()
+        self.retry_policy = retry_policy or default_retry_policy()
+        self.rate_limiter = get_rate_limiter(self.MODEL_CONFIG)
+        self._initialize_clients(api_key)
 
-    def _initialize_clients(self):
+    def _initialize_clients(self, api_key=None):
         """Initialize API clients for each provider."""
         try:
-            self.clients["groq"] = groq.Groq(api_key=st.secrets["GROQ_API_KEY"])
+            api_key = api_key or os.environ.get("GROQ_API_KEY") or st.secrets["GROQ_API_KEY"]
+            self.clients["groq"] = get_groq_client(api_key)
         except Exception as e:
             logger.error(f"Failed to initialize Groq client: {str(e)}")
 
-    def generate_analysis(self, data, system_prompt, retry_count=0):
+    def _select_tiers(self):
         """
-        Generate analysis using the best available model with automatic fallback.
-        Implements agent-based decision making for model selection.
+        Order model tiers by current health instead of a fixed sequence.
+        Healthy tiers keep their preference order, degraded ones go last and
+        tiers with an open circuit or rate-limit cooldown are skipped.
         """
-        if retry_count > 3:
-            return {"success": False, "error": "All models failed after multiple retries"}
+        healthy, degraded = [], []
+        for tier in ModelTier:
+            model = self.MODEL_CONFIG[tier]["model"]
+            if not self.health.is_available(model):
+                continue
+            if self.health.is_degraded(model):
+                degraded.append(tier)
+            else:
+                healthy.append(tier)
+        
+        tiers = healthy + degraded
+        if not tiers:
+            # Everything is unhealthy; try the model that recovers soonest
+            tiers = [min(ModelTier, key=lambda t: self.health.blocked_for(self.MODEL_CONFIG[t]["model"]))]
+        return tiers
 
-        # Determine which model tier to use based on retry count
-        if retry_count == 0:
-            tier = ModelTier.PRIMARY
-        elif retry_count == 1:
-            tier = ModelTier.SECONDARY
-        elif retry_count == 2:
-            tier = ModelTier.TERTIARY
-        else:
-            tier = ModelTier.FALLBACK
-            
+    def select_tiers(self, allowed=None):
+        """Tiers in health order, limited to `allowed` when any of those are usable."""
+        tiers = self._select_tiers()
+        if allowed:
+            preferred = [tier for tier in tiers if tier in allowed]
+            if preferred:
+                return preferred
+        return tiers
+
+    def tokens_per_minute(self, tiers):
+        """Combined token rate limit of the given tiers."""
+        return sum(self.MODEL_CONFIG[tier]["tpm"] for tier in tiers)
+
+    def estimate_prompt_tokens(self, data, system_prompt):
+        """Estimate the prompt tokens a request will use."""
+        return estimate_message_tokens(self._build_messages(data, system_prompt))
+    
+    def fits_context(self, tier, prompt_tokens):
+        """Whether the prompt plus the completion fits the tier's context window."""
         model_config = self.MODEL_CONFIG[tier]
-        provider = model_config["provider"]
-        model = model_config["model"]
+        return prompt_tokens + model_config["max_tokens"] <= model_config["context_window"]
+    
+    def max_prompt_tokens(self):
+        """Largest prompt any tier can take."""
+        return max(c["context_window"] - c["max_tokens"] for c in self.MODEL_CONFIG.values())
+    
+    def _fit_context(self, tiers, prompt_tokens, trace):
+        """Drop tiers whose context window is too small for the prompt."""
+        fitting = []
+        for tier in tiers:
+            if self.fits_context(tier, prompt_tokens):
+                fitting.append(tier)
+            else:
+                self._trace(trace, tier, 0, "skipped", error=f"prompt of ~{prompt_tokens} tokens exceeds context window")
+        return fitting
+
+    def generate_analysis(self, data, system_prompt, tiers=None, max_tokens=None):
+        """
+        Generate analysis using the best available model with automatic fallback.
+        Implements agent-based decision making for model selection.
+        Every attempt is recorded in the returned "trace".
+        max_tokens caps the completion below the tier default (and is budgeted as such).
+        """
+        trace = []
+        deadline = self.retry_policy.new_deadline()
+        messages = self._build_messages(data, system_prompt)
+        prompt_tokens = estimate_message_tokens(messages)
         
-        # Check if we have a client for this provider
-        if provider not in self.clients:
-            logger.error(f"No client available for provider: {provider}")
-            return self.generate_analysis(data, system_prompt, retry_count + 1)
+        tiers = self._fit_context(tiers or self._select_tiers(), prompt_tokens, trace)
+        if not tiers:
+            return {"success": False, "error": REPORT_TOO_LONG_ERROR, "trace": trace}
+        
+        for tier in tiers:
+            model_config = self.MODEL_CONFIG[tier]
+            provider = model_config["provider"]
+            model = model_config["model"]
+            completion_tokens = min(max_tokens or model_config["max_tokens"], model_config["max_tokens"])
+            estimated_tokens = prompt_tokens + completion_tokens
             
-        try:
-            client = self.clients[provider]
-            logger.info(f"Attempting generation with {provider} model: {model}")
+            # Check if we have a client for this provider
+            if provider not in self.clients:
+                logger.error(f"No client available for provider: {provider}")
+                self._trace(trace, tier, 0, "skipped", error="no client")
+                continue
             
-            if provider == "groq":
-                completion = client.chat.completions.create(
-                    model=model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": str(data)}
-                    ],
-                    temperature=model_config["temperature"],
-                    max_tokens=model_config["max_tokens"]
-                )
+            for attempt in range(self.retry_policy.max_attempts_per_tier):
+                if time.time() >= deadline:
+                    return {"success": False, "error": "Analysis timed out. Please try again.", "trace": trace}
                 
-                return {
-                    "success": True,
-                    "content": completion.choices[0].message.content,
-                    "model_used": f"{provider}/{model}"
-                }
+                # Another session may have claimed the half-open probe for this model
+                if not self.health.allow_request(model):
+                    self._trace(trace, tier, attempt, "skipped", error="circuit open")
+                    break
                 
-        except Exception as e:
-            error_message = str(e).lower()
-            logger.warning(f"Model {model} failed: {error_message}")
-            
-            # Check for rate limit errors
-            if "rate limit" in error_message or "quota" in error_message:
-                # Wait briefly before retrying with a different model
-                time.sleep(2)
+                # Wait briefly for quota, otherwise route to a tier that still has budget
+                if not self._acquire_budget(model, estimated_tokens, deadline):
+                    self.health.release_probe(model)
+                    self._trace(trace, tier, attempt, "throttled")
+                    break
+                
+                started = time.time()
+                try:
+                    client = self.clients[provider]
+                    logger.info(f"Attempting generation with {provider} model: {model}")
+                    
+                    completion = client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=model_config["temperature"],
+                        max_tokens=completion_tokens
+                    )
+                    latency = time.time() - started
+                    usage = getattr(completion, "usage", None)
+                    self.rate_limiter.reconcile(model, estimated_tokens, getattr(usage, "total_tokens", None))
+                    self.health.record_success(model, latency)
+                    self._trace(trace, tier, attempt, "success", latency)
+                    
+                    return {
+                        "success": True,
+                        "content": completion.choices[0].message.content,
+                        "model_used": f"{provider}/{model}",
+                        "trace": trace
+                    }
+                    
+                except Exception as e:
+                    if not self._handle_failure(e, tier, attempt, started, deadline, trace):
+                        break
+        
+        return {"success": False, "error": "All models failed after multiple retries", "trace": trace}
+
+    def generate_analysis_stream(self, data, system_prompt, tiers=None):
+        """
+        Stream analysis tokens from the best available model with automatic fallback.
+        Yields event dicts:
+            {"type": "token", "content": str} for each chunk of generated text
+            {"type": "reset", "model_failed": str} when a stream breaks and generation
+                restarts (already shown text should be discarded)
+            {"type": "done", "result": dict} once, with the same shape as generate_analysis
+        """
+        trace = []
+        deadline = self.retry_policy.new_deadline()
+        messages = self._build_messages(data, system_prompt)
+        prompt_tokens = estimate_message_tokens(messages)
+        
+        tiers = self._fit_context(tiers or self._select_tiers(), prompt_tokens, trace)
+        if not tiers:
+            yield {"type": "done", "result": {
+                "success": False, "error": REPORT_TOO_LONG_ERROR, "trace": trace
+            }}
+            return
+        
+        for tier in tiers:
+            model_config = self.MODEL_CONFIG[tier]
+            provider = model_config["provider"]
+            model = model_config["model"]
+            estimated_tokens = prompt_tokens + model_config["max_tokens"]
             
-            # Try next model in hierarchy
-            return self.generate_analysis(data, system_prompt, retry_count + 1)
+            if provider not in self.clients:
+                logger.error(f"No client available for provider: {provider}")
+                self._trace(trace, tier, 0, "skipped", error="no client")
+                continue
             
-        return {"success": False, "error": "Analysis failed with all available models"}
+            for attempt in range(self.retry_policy.max_attempts_per_tier):
+                if time.time() >= deadline:
+                    yield {"type": "done", "result": {
+                        "success": False, "error": "Analysis timed out. Please try again.", "trace": trace
+                    }}
+                    return
+                
+                if not self.health.allow_request(model):
+                    self._trace(trace, tier, attempt, "skipped", error="circuit open")
+                    break
+                
+                if not self._acquire_budget(model, estimated_tokens, deadline):
+                    self.health.release_probe(model)
+                    self._trace(trace, tier, attempt, "throttled")
+                    break
+                
+                chunks = []
+                usage = None
+                started = time.time()
+                try:
+                    client = self.clients[provider]
+                    logger.info(f"Attempting streaming generation with {provider} model: {model}")
+                    
+                    stream = client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=model_config["temperature"],
+                        max_tokens=model_config["max_tokens"],
+                        stream=True
+                    )
+                    for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            chunks.append(delta)
+                            yield {"type": "token", "content": delta}
+                        # Groq reports usage on the final chunk
+                        x_groq = getattr(chunk, "x_groq", None)
+                        usage = getattr(x_groq, "usage", None) or usage
+                    latency = time.time() - started
+                    self.rate_limiter.reconcile(model, estimated_tokens, getattr(usage, "total_tokens", None))
+                    self.health.record_success(model, latency)
+                    self._trace(trace, tier, attempt, "success", latency)
+                    
+                    yield {"type": "done", "result": {
+                        "success": True,
+                        "content": "".join(chunks),
+                        "model_used": f"{provider}/{model}",
+                        "trace": trace
+                    }}
+                    return
+                    
+                except Exception as e:
+                    # Partial output from a broken stream must not be mixed with the retry's
+                    if chunks:
+                        yield {"type": "reset", "model_failed": f"{provider}/{model}"}
+                    if not self._handle_failure(e, tier, attempt, started, deadline, trace):
+                        break
+        
+        yield {"type": "done", "result": {
+            "success": False, "error": "All models failed after multiple retries", "trace": trace
+        }}
+
+    def _acquire_budget(self, model, tokens, deadline):
+        """Take rate limit budget for a call, waiting no longer than the limiter allows."""
+        max_wait = min(RATE_LIMIT_MAX_WAIT_SECONDS, max(0.0, deadline - time.time()))
+        return self.rate_limiter.acquire(model, tokens, max_wait)
+
+    def _handle_failure(self, error, tier, attempt, started, deadline, trace):
+        """
+        Record a failed attempt and wait if it should be retried on the same tier.
+        Returns True to retry the same tier, False to fall through to the next one.
+        """
+        latency = time.time() - started
+        model = self.MODEL_CONFIG[tier]["model"]
+        kind = classify_error(error)
+        retry_after = parse_retry_after(error)
+        logger.warning(f"Model {model} failed ({kind}): {str(error)}")
+        
+        # Only transient and server errors count toward the circuit breaker
+        if kind == RATE_LIMIT:
+            self.health.record_rate_limit(model, cooldown=retry_after)
+        elif kind == TRANSIENT:
+            self.health.record_failure(model, latency)
+        else:
+            self.health.record_rejection(model)
+        
+        delay = self.retry_policy.retry_delay(kind, attempt, retry_after, deadline)
+        self._trace(trace, tier, attempt, kind, latency, error=str(error),
+                    retry_after=retry_after, wait=delay)
+        if delay is None:
+            return False
+        
+        time.sleep(delay)
+        return True
+
+    def _trace(self, trace, tier, attempt, outcome, latency=0.0, error=None, retry_after=None, wait=None):
+        """Append one attempt to the structured trace returned with each result."""
+        entry = {
+            "tier": tier.value,
+            "model": self.MODEL_CONFIG[tier]["model"],
+            "attempt": attempt + 1,
+            "outcome": outcome,
+            "latency_ms": round(latency * 1000)
+        }
+        if error:
+            entry["error"] = error[:200]
+        if retry_after is not None:
+            entry["retry_after"] = round(retry_after, 2)
+        if wait is not None:
+            entry["wait"] = round(wait, 2)
+        trace.append(entry)
+
+    def _build_messages(self, data, system_prompt):
+        """Build the chat messages sent to the model."""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": self._format_report(data)}
+        ]
+    
+    def _format_report(self, data):
+        """Render the preprocessed report as plain text for the user message."""
+        if not isinstance(data, dict):
+            return str(data)
+        patient = [
+            f"{label}: {data[key]}"
+            for key, label in (("patient_name", "Patient"), ("age", "Age"), ("gender", "Gender"))
+            if data.get(key)
+        ]
+        sections = [", ".join(patient)] if patient else []
+        sections.append(data.get("report", ""))
+        return "\n\n".join(sections)
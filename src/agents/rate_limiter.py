@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config.app_config import RATE_LIMIT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+def _take(state, now, tokens, rpm, tpm):
+    """
+    Try to take one request and `tokens` tokens from a model's two buckets.
+    Both buckets refill continuously up to their per-minute capacity.
+    Returns (new_state, wait) where wait is 0 if the budget was taken,
+    otherwise the seconds until both buckets would have enough.
+    """
+    tokens = min(tokens, tpm)
+    if state is None:
+        state = {"requests": float(rpm), "tokens": float(tpm), "updated_at": now}
+
+    elapsed = max(0.0, now - state["updated_at"])
+    requests_level = min(rpm, state["requests"] + elapsed * rpm / 60)
+    tokens_level = min(tpm, state["tokens"] + elapsed * tpm / 60)
+
+    if requests_level >= 1 and tokens_level >= tokens:
+        return {"requests": requests_level - 1, "tokens": tokens_level - tokens, "updated_at": now}, 0.0
+
+    wait = max(
+        (1 - requests_level) * 60 / rpm if requests_level < 1 else 0.0,
+        (tokens - tokens_level) * 60 / tpm if tokens_level < tokens else 0.0
+    )
+    return {"requests": requests_level, "tokens": tokens_level, "updated_at": now}, wait
+
+class MemoryBucketStore:
+    """Bucket state for a single process."""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take(self, model, tokens, rpm, tpm):
+        with self._lock:
+            state, wait = _take(self._state.get(model), time.time(), tokens, rpm, tpm)
+            self._state[model] = state
+            return wait
+
+    def adjust(self, model, tokens):
+        with self._lock:
+            if model in self._state:
+                self._state[model]["tokens"] -= tokens
+
+    def snapshot(self):
+        with self._lock:
+            return {model: dict(state) for model, state in self._state.items()}
+
+class SQLiteBucketStore:
+    """Bucket state shared by several worker processes through a SQLite file."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (model TEXT PRIMARY KEY, state TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def _update(self, model, fn):
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock so check-and-take is atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT state FROM rate_buckets WHERE model = ?", (model,)
+                ).fetchone()
+                state, result = fn(json.loads(row[0]) if row else None)
+                if state is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO rate_buckets (model, state) VALUES (?, ?)",
+                        (model, json.dumps(state))
+                    )
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def take(self, model, tokens, rpm, tpm):
+        return self._update(model, lambda state: _take(state, time.time(), tokens, rpm, tpm))
+
+    def adjust(self, model, tokens):
+        def apply(state):
+            if state is None:
+                return None, None
+            state["tokens"] -= tokens
+            return state, None
+        self._update(model, apply)
+
+    def snapshot(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT model, state FROM rate_buckets").fetchall()
+        return {model: json.loads(state) for model, state in rows}
+
+class RateLimiter:
+    """
+    Token-bucket limiter enforcing per-model requests-per-minute and
+    tokens-per-minute quotas across all sessions, before a call is sent.
+    """
+
+    def __init__(self, limits, store=None):
+        self.limits = limits
+        self.store = store or MemoryBucketStore()
+
+    def acquire(self, model, tokens, max_wait=0.0):
+        """
+        Take budget for one request, waiting up to max_wait seconds for it.
+        Returns False if the model has no budget within that time.
+        """
+        if model not in self.limits:
+            return True
+        rpm, tpm = self.limits[model]
+        deadline = time.time() + max_wait
+        while True:
+            try:
+                wait = self.store.take(model, tokens, rpm, tpm)
+            except Exception as e:
+                # A broken shared store must not block analyses
+                logger.warning(f"Rate limiter unavailable: {str(e)}")
+                return True
+            if wait == 0:
+                return True
+            if time.time() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def reconcile(self, model, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the real usage of a call is known."""
+        if model not in self.limits or actual_tokens is None:
+            return
+        try:
+            self.store.adjust(model, actual_tokens - estimated_tokens)
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable: {str(e)}")
+
+    def snapshot(self):
+        return self.store.snapshot()
+
+_rate_limiters = {}
+_bucket_store = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter(model_config):
+    """
+    Return the process-wide rate limiter for a ModelManager.MODEL_CONFIG.
+    Managers with the same per-model limits share a limiter; all limiters share one bucket store.
+    """
+    global _bucket_store
+    limits = {
+        config["model"]: (config["rpm"], config["tpm"])
+        for config in model_config.values()
+        if "rpm" in config and "tpm" in config
+    }
+    key = tuple(sorted(limits.items()))
+    with _rate_limiter_lock:
+        if key not in _rate_limiters:
+            if _bucket_store is None:
+                if RATE_LIMIT_DB_PATH:
+                    try:
+                        _bucket_store = SQLiteBucketStore(RATE_LIMIT_DB_PATH)
+                    except Exception as e:
+                        logger.error(f"Failed to open rate limit database: {str(e)}")
+                _bucket_store = _bucket_store or MemoryBucketStore()
+            _rate_limiters[key] = RateLimiter(limits, _bucket_store)
+        return _rate_limiters[key]
@@ -0,0 +1,114 @@
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+import groq
+from config.app_config import (
+    MODEL_MAX_ATTEMPTS_PER_TIER,
+    MODEL_RETRY_BASE_DELAY_SECONDS,
+    MODEL_RETRY_MAX_DELAY_SECONDS,
+    MODEL_RETRY_MAX_WAIT_SECONDS,
+    ANALYSIS_DEADLINE_SECONDS
+)
+
+RATE_LIMIT = "rate_limited"
+TRANSIENT = "transient_error"
+FATAL = "error"
+
+RESET_HEADERS = ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+
+class RetryPolicy:
+    """
+    Decides whether a failed model call is retried on the same tier or
+    falls through to the next one, within a total deadline per analysis.
+    """
+
+    def __init__(self, max_attempts_per_tier=2, base_delay=0.5, max_delay=8.0,
+                 max_wait=5.0, deadline_seconds=90.0):
+        self.max_attempts_per_tier = max_attempts_per_tier
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.deadline_seconds = deadline_seconds
+
+    def new_deadline(self):
+        return time.time() + self.deadline_seconds
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def retry_delay(self, kind, attempt, retry_after, deadline):
+        """
+        Return how long to wait before retrying the same tier,
+        or None if the call should fall through to the next tier.
+        """
+        if kind == FATAL or attempt + 1 >= self.max_attempts_per_tier:
+            return None
+
+        if kind == RATE_LIMIT:
+            if retry_after is None or retry_after > self.max_wait:
+                return None
+            delay = retry_after + random.uniform(0, self.base_delay)
+        else:
+            delay = self.backoff(attempt)
+
+        if time.time() + delay >= deadline:
+            return None
+        return delay
+
+def classify_error(error):
+    """Map a provider exception to rate_limited, transient_error or error."""
+    status = getattr(error, "status_code", None)
+    message = str(error).lower()
+
+    if isinstance(error, groq.RateLimitError) or status == 429 or \
+            "rate limit" in message or "quota" in message:
+        return RATE_LIMIT
+    if isinstance(error, (groq.APIConnectionError, groq.APITimeoutError, groq.InternalServerError)):
+        return TRANSIENT
+    if status in (408, 409, 500, 502, 503, 504):
+        return TRANSIENT
+    if status is None and ("timeout" in message or "connection" in message):
+        return TRANSIENT
+    return FATAL
+
+def parse_retry_after(error):
+    """Read the server-suggested wait in seconds from a provider error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    resets = [parse_duration(headers.get(name)) for name in RESET_HEADERS]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+def parse_duration(value):
+    """Parse Groq reset durations such as '2m59.56s', '7.66s' or '120ms'."""
+    if not value:
+        return None
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+def default_retry_policy():
+    return RetryPolicy(
+        max_attempts_per_tier=MODEL_MAX_ATTEMPTS_PER_TIER,
+        base_delay=MODEL_RETRY_BASE_DELAY_SECONDS,
+        max_delay=MODEL_RETRY_MAX_DELAY_SECONDS,
+        max_wait=MODEL_RETRY_MAX_WAIT_SECONDS,
+        deadline_seconds=ANALYSIS_DEADLINE_SECONDS
+    )
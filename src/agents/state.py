@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import threading
+import streamlit as st
+
+class MemoryState:
+    """Agent state in a plain dict; for headless workers, batch jobs and benchmarks."""
+
+    def __init__(self, initial=None):
+        self._values = dict(initial or {})
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def setdefault(self, key, default):
+        with self._lock:
+            return self._values.setdefault(key, default)
+
+    def increment(self, key, field, amount=1):
+        """Atomically add amount to a counter in the dict stored under key."""
+        with self._lock:
+            counters = self._values.setdefault(key, {})
+            counters[field] = counters.get(field, 0) + amount
+
+class StreamlitState:
+    """
+    Agent state in st.session_state, scoped to one browser session.
+    Only usable from the Streamlit script thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        return st.session_state.get(key, default)
+
+    def set(self, key, value):
+        st.session_state[key] = value
+
+    def setdefault(self, key, default):
+        if key not in st.session_state:
+            st.session_state[key] = default
+        return st.session_state[key]
+
+    def increment(self, key, field, amount=1):
+        with self._lock:
+            counters = self.setdefault(key, {})
+            counters[field] = counters.get(field, 0) + amount
+
+class SQLiteState:
+    """
+    Agent state in SQLite, shared by every process using the same path and namespace.
+    Values must be JSON serializable.
+    """
+
+    def __init__(self, path, namespace="default"):
+        self.namespace = namespace
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS agent_state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self._lock = threading.Lock()
+
+    def _read(self, key):
+        row = self._conn.execute(
+            "SELECT value FROM agent_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO agent_state (namespace, key, value) VALUES (?, ?, ?)",
+            (self.namespace, key, json.dumps(value))
+        )
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._read(key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._write(key, value)
+
+    def setdefault(self, key, default):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = self._read(key)
+                if value is None:
+                    value = default
+                    self._write(key, value)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def increment(self, key, field, amount=1):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                counters = self._read(key) or {}
+                counters[field] = counters.get(field, 0) + amount
+                self._write(key, counters)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
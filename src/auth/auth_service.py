@@ -1,8 +1,28 @@
 import streamlit as st
 from st_supabase_connection import SupabaseConnection
-from datetime import datetime
 import time
 import re
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config.app_config import SESSION_PAGE_SIZE, SESSION_DELETE_WORKERS, MESSAGE_PAGE_SIZE
+from services.cache_service import get_session_list_cache, get_user_profile_cache
+from services.message_cache import get_message_cache
+from services.message_writer import get_message_writer
+from auth.token_validator import get_token_validator
+from auth.user_client import get_user_clients
+from repositories.chat_repository import get_chat_repository, utc_now
+
+_deletion_executor = None
+_deletion_executor_lock = threading.Lock()
+
+def get_deletion_executor():
+    """Return the process-wide worker for session deletes."""
+    global _deletion_executor
+    with _deletion_executor_lock:
+        if _deletion_executor is None:
+            _deletion_executor = ThreadPoolExecutor(max_workers=SESSION_DELETE_WORKERS, thread_name_prefix="session-delete")
+        return _deletion_executor
 
 class AuthService:
     def __init__(self):
@@ -23,6 +43,9 @@ class AuthService:
             st.error(f"Failed to initialize services: {str(e)}")
             raise e
         
+        # Users, sessions and messages; Supabase or a local SQLite file per DATABASE_BACKEND
+        self.repository = get_chat_repository(self.supabase.client, get_user_clients())
+        
         # Try to restore session from Supabase if no current session
         self.try_restore_session()
         
@@ -45,6 +68,7 @@ class AuthService:
                         # Restore session state
                         st.session_state.auth_token = session.access_token
                         st.session_state.user = user_data
+                        get_token_validator().mark_checked(session.access_token)
         except Exception:
             # If restoration fails, continue without session
             pass
@@ -57,11 +81,7 @@ class AuthService:
     def check_existing_user(self, email):
         """Check if user already exists."""
         try:
-            result = self.supabase.table('users')\
-                .select('id')\
-                .eq('email', email)\
-                .execute()
-            return len(result.data) > 0
+            return self.repository.user_exists(email)
         except Exception:
             return False
 
@@ -85,11 +105,11 @@ class AuthService:
                 'id': auth_response.user.id,
                 'email': email,
                 'name': name,
-                'created_at': datetime.now().isoformat()
+                'created_at': utc_now().isoformat()
             }
             
             # Insert user data into users table
-            self.supabase.table('users').insert(user_data).execute()
+            self.repository.insert_user(user_data)
             
             return True, user_data
                 
@@ -118,6 +138,8 @@ class AuthService:
                 # Store session info
                 st.session_state.auth_token = auth_response.session.access_token
                 st.session_state.user = user_data
+                get_user_profile_cache().set(user_data['id'], user_data)
+                get_token_validator().mark_checked(auth_response.session.access_token)
                 return True, user_data
                 
             return False, "Invalid login response"
@@ -127,6 +149,8 @@ class AuthService:
     def sign_out(self):
         """Sign out and clear all session data."""
         try:
+            if st.session_state.get('auth_token'):
+                get_token_validator().revoke(st.session_state.auth_token)
             self.supabase.client.auth.sign_out()
             from auth.session_manager import SessionManager
             SessionManager.clear_session_state()
@@ -142,99 +166,228 @@ class AuthService:
 
     def create_session(self, user_id, title=None):
         try:
-            current_time = datetime.now()
-            default_title = f"{current_time.strftime('%d-%m-%Y')} | {current_time.strftime('%H:%M:%S')}"
+            current_time = utc_now()
+            local_time = current_time.astimezone()
+            default_title = f"{local_time.strftime('%d-%m-%Y')} | {local_time.strftime('%H:%M:%S')}"
             
             session_data = {
                 'user_id': user_id,
                 'title': title or default_title,
                 'created_at': current_time.isoformat()
             }
-            result = self.supabase.table('chat_sessions').insert(session_data).execute()
-            return True, result.data[0] if result.data else None
+            session = self.repository.insert_session(session_data)
+            get_session_list_cache().delete(user_id)
+            return True, session
         except Exception as e:
             return False, str(e)
 
-    def get_user_sessions(self, user_id):
+    def get_user_sessions(self, user_id, limit=None, before=None):
+        """User's sessions newest first; pass the (created_at, id) of the last one seen as `before` for the next page."""
         try:
-            result = self.supabase.table('chat_sessions')\
-                .select('*')\
-                .eq('user_id', user_id)\
-                .order('created_at', desc=True)\
-                .execute()
-            return True, result.data
+            return True, self.repository.list_sessions(user_id, limit=limit, before=before)
         except Exception as e:
             st.error(f"Error fetching sessions: {str(e)}")
             return False, []
 
-    def save_chat_message(self, session_id, content, role='user'):
+    def get_recent_sessions(self, user_id, load_more=False):
+        """
+        Sessions for the sidebar as {"sessions": [...], "has_more": bool}.
+        Loaded pages are cached per user, so reruns don't query the database;
+        load_more fetches the next SESSION_PAGE_SIZE sessions.
+        """
+        cache = get_session_list_cache()
+        loaded = cache.get(user_id)
+        if loaded is not None and not load_more:
+            return True, loaded
+
+        sessions = loaded["sessions"] if loaded else []
+        before = (sessions[-1]['created_at'], sessions[-1]['id']) if sessions else None
+        # One extra row tells whether there is another page
+        success, page = self.get_user_sessions(user_id, limit=SESSION_PAGE_SIZE + 1, before=before)
+        if not success:
+            return False, {"sessions": sessions, "has_more": False}
+
+        loaded = {
+            "sessions": sessions + page[:SESSION_PAGE_SIZE],
+            "has_more": len(page) > SESSION_PAGE_SIZE
+        }
+        cache.set(user_id, loaded)
+        return True, loaded
+
+    def save_chat_message(self, session_id, content, role='user', message_id=None):
+        """
+        Queue a message on the write-behind writer and return it without waiting for the database.
+        It shows up in this process's chat history immediately. This is fire-and-forget:
+        the writer retries inserts while the database is unreachable and logs rows it
+        rejects, so insert failures are never reported back here.
+        """
         try:
             message_data = {
+                'id': message_id or str(uuid.uuid4()),
                 'session_id': session_id,
                 'content': content,
                 'role': role,
-                'created_at': datetime.now().isoformat()
+                'created_at': utc_now().isoformat()
             }
-            result = self.supabase.table('chat_messages').insert(message_data).execute()
-            return True, result.data[0] if result.data else None
+            get_message_writer(self.repository).write(message_data)
+            get_message_cache().append(session_id, message_data)
+            return True, message_data
         except Exception as e:
             return False, str(e)
 
-    def get_session_messages(self, session_id):
+    def get_session_messages(self, session_id, since=None, before=None, limit=None):
+        """
+        Session messages oldest first.
+        since/before filter on created_at; with limit, the newest `limit` matching messages are returned.
+        """
         try:
-            result = self.supabase.table('chat_messages')\
-                .select('*')\
-                .eq('session_id', session_id)\
-                .order('created_at')\
-                .execute()
-            return True, result.data
+            return True, self.repository.list_messages(session_id, since=since, before=before, limit=limit)
         except Exception as e:
             return False, str(e)
 
-    def delete_session(self, session_id):
+    def get_cached_messages(self, session_id, load_earlier=False):
+        """
+        Chat history as {"messages": [...], "has_earlier": bool}.
+        The newest MESSAGE_PAGE_SIZE messages are loaded first and cached per session;
+        later reads only fetch rows newer than the cached cursor, at most every
+        MESSAGE_CACHE_REFRESH_SECONDS. load_earlier adds the previous page.
+        """
+        cache = get_message_cache()
+        entry = cache.get(session_id)
+
+        if entry is None:
+            # One extra row tells whether there are older messages
+            success, rows = self.get_session_messages(session_id, limit=MESSAGE_PAGE_SIZE + 1)
+            if not success:
+                return False, rows
+            has_earlier = len(rows) > MESSAGE_PAGE_SIZE
+            cache.store(session_id, rows[1:] if has_earlier else rows, has_earlier)
+        elif load_earlier and entry["has_earlier"] and entry["messages"]:
+            success, rows = self.get_session_messages(
+                session_id, before=entry["messages"][0]['created_at'], limit=MESSAGE_PAGE_SIZE + 1
+            )
+            if not success:
+                return False, rows
+            has_earlier = len(rows) > MESSAGE_PAGE_SIZE
+            cache.merge(session_id, rows[1:] if has_earlier else rows, has_earlier=has_earlier)
+        elif not cache.is_fresh(entry):
+            success, rows = self.get_session_messages(session_id, since=cache.fetch_since(entry))
+            if success:
+                cache.merge(session_id, rows, checked=True)
+
+        # Messages still queued for writing aren't in the database yet
+        pending = get_message_writer(self.repository).pending(session_id)
+        if pending:
+            cache.merge(session_id, pending)
+        entry = cache.get(session_id) or {"messages": [], "has_earlier": False}
+        return True, {"messages": entry["messages"], "has_earlier": entry["has_earlier"]}
+
+    def delete_session(self, session_id, user_id=None):
+        """Delete a session; the database cascades the delete to its messages."""
         try:
-            self.supabase.table('chat_messages')\
-                .delete()\
-                .eq('session_id', session_id)\
-                .execute()
+            # Unsent messages would fail against the deleted session
+            get_message_writer(self.repository).discard(session_id)
 
-            self.supabase.table('chat_sessions')\
-                .delete()\
-                .eq('id', session_id)\
-                .execute()
+            self.repository.delete_session(session_id, user_id)
 
+            get_message_cache().drop(session_id)
+            if user_id:
+                get_session_list_cache().delete(user_id)
             return True, None
         except Exception as e:
             st.error(f"Failed to delete session: {str(e)}")
             return False, str(e)
+
+    def delete_sessions(self, session_ids, user_id, access_token=None):
+        """
+        Delete several of a user's sessions and their messages in one database call.
+        access_token is the user's own token; with Supabase the delete is made as that user.
+        Doesn't touch Streamlit, so it can run off the script thread. Returns (success, deleted count or error).
+        """
+        try:
+            deleted = self.repository.delete_sessions(user_id, session_ids, access_token)
+
+            # Unsent messages would fail against the deleted sessions
+            writer = get_message_writer(self.repository)
+            for session_id in session_ids:
+                writer.discard(session_id)
+                get_message_cache().drop(session_id)
+            return True, deleted
+        except Exception as e:
+            return False, str(e)
+        finally:
+            # Refetch the list whether or not the delete went through
+            get_session_list_cache().delete(user_id)
+
+    def delete_sessions_in_background(self, session_ids, user_id, access_token=None):
+        """
+        Start delete_sessions on a worker thread and return its Future.
+        The sessions are removed from the cached session list right away.
+        """
+        session_ids = list(session_ids)
+        cache = get_session_list_cache()
+        loaded = cache.get(user_id)
+        if loaded:
+            cache.set(user_id, {
+                **loaded,
+                "sessions": [session for session in loaded["sessions"] if session['id'] not in session_ids]
+            })
+        return get_deletion_executor().submit(self.delete_sessions, session_ids, user_id, access_token)
     
     def validate_session_token(self):
-        """Validate existing session token on startup."""
+        """
+        Validate the stored session token; returns the user's data or None.
+        Tokens are verified locally and the profile comes from a shared cache, so
+        Supabase is only asked when the token is about to expire, can't be
+        verified locally, or hasn't been checked for TOKEN_REVALIDATE_SECONDS.
+        """
+        token = st.session_state.get('auth_token')
+        if not token:
+            return None
+        validator = get_token_validator()
+        claims = validator.verify(token)
+        if claims and not validator.needs_network(token, claims):
+            return self.get_cached_user_data(claims['sub'])
+
+        user_data = self._validate_session_with_supabase()
+        if user_data:
+            validator.mark_checked(st.session_state.auth_token)
+        return user_data
+
+    def _validate_session_with_supabase(self):
         try:
             session = self.supabase.client.auth.get_session()
             if not session or not session.access_token:
                 return None
                 
-            # Verify token matches stored token
+            # Verify token matches stored token; a refresh of the same user's token is adopted
             if session.access_token != st.session_state.get('auth_token'):
-                return None
+                current_user = st.session_state.get('user') or {}
+                if not session.user or session.user.id != current_user.get('id'):
+                    return None
+                st.session_state.auth_token = session.access_token
                 
             user = self.supabase.client.auth.get_user()
             if not user or not user.user:
                 return None
                 
-            return self.get_user_data(user.user.id)
+            return self.get_cached_user_data(user.user.id)
         except Exception:
             return None
+
+    def get_cached_user_data(self, user_id):
+        """get_user_data through the process-wide profile cache."""
+        cache = get_user_profile_cache()
+        user_data = cache.get(user_id)
+        if user_data is None:
+            user_data = self.get_user_data(user_id)
+            if user_data:
+                cache.set(user_id, user_data)
+        return user_data
     
     def get_user_data(self, user_id):
         """Get user data from database."""
         try:
-            response = self.supabase.table('users')\
-                .select('*')\
-                .eq('id', user_id)\
-                .single()\
-                .execute()
-            return response.data if response else None
+            return self.repository.get_user(user_id)
         except Exception:
             return None
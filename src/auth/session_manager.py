@@ -143,20 +143,57 @@ class SessionManager:
         )
     
     @staticmethod
-    def get_user_sessions():
-        """Get user's chat sessions."""
+    def get_user_sessions(load_more=False):
+        """Get user's chat sessions as {"sessions": [...], "has_more": bool}, newest first."""
         if not SessionManager.is_authenticated():
-            return False, []
-        return st.session_state.auth_service.get_user_sessions(
-            st.session_state.user['id']
+            return False, {"sessions": [], "has_more": False}
+        return st.session_state.auth_service.get_recent_sessions(
+            st.session_state.user['id'], load_more=load_more
         )
     
     @staticmethod
     def delete_session(session_id):
-        """Delete a chat session."""
+        """Delete a chat session in the background."""
+        return SessionManager.delete_sessions([session_id])
+    
+    @staticmethod
+    def delete_sessions(session_ids):
+        """
+        Start deleting chat sessions in the background and return right away.
+        Failures are reported by collect_finished_deletions on a later run.
+        """
         if not SessionManager.is_authenticated():
             return False, "Not authenticated"
-        return st.session_state.auth_service.delete_session(session_id)
+        future = st.session_state.auth_service.delete_sessions_in_background(
+            session_ids, st.session_state.user['id'], st.session_state.get('auth_token')
+        )
+        st.session_state.setdefault('pending_deletions', []).append((list(session_ids), future))
+        return True, None
+    
+    @staticmethod
+    def deleting_session_ids():
+        """Ids of sessions whose delete is still running."""
+        return {
+            session_id
+            for session_ids, future in st.session_state.get('pending_deletions', [])
+            if not future.done()
+            for session_id in session_ids
+        }
+    
+    @staticmethod
+    def collect_finished_deletions():
+        """Forget finished background deletes and return the errors of failed ones."""
+        errors = []
+        pending = []
+        for session_ids, future in st.session_state.get('pending_deletions', []):
+            if not future.done():
+                pending.append((session_ids, future))
+                continue
+            success, error = future.result()
+            if not success:
+                errors.append(error)
+        st.session_state.pending_deletions = pending
+        return errors
     
     @staticmethod
     def logout():
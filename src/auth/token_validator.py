@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+import time
+import jwt
+import streamlit as st
+from config.app_config import (
+    TOKEN_REFRESH_MARGIN_SECONDS,
+    TOKEN_REVALIDATE_SECONDS,
+    JWKS_CACHE_SECONDS
+)
+from services.cache_service import MemoryCache
+
+AUDIENCE = "authenticated"
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+class TokenValidator:
+    """
+    Verifies Supabase access tokens locally.
+    HS256 tokens are checked against the project's JWT secret and asymmetric ones
+    against its JWKS, which is fetched once and cached. A verified token still
+    needs a network check when it is about to expire, so it can be refreshed, and
+    every revalidate_seconds, so sessions revoked elsewhere are noticed.
+    """
+
+    def __init__(self, supabase_url, api_key=None, jwt_secret=None,
+                 refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS,
+                 revalidate_seconds=TOKEN_REVALIDATE_SECONDS,
+                 jwks_cache_seconds=JWKS_CACHE_SECONDS):
+        self.jwt_secret = jwt_secret
+        self.refresh_margin = refresh_margin
+        self._jwks = jwt.PyJWKClient(
+            f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+            lifespan=jwks_cache_seconds,
+            headers={"apikey": api_key} if api_key else None
+        )
+        self._checked = MemoryCache(max_entries=10000, ttl_seconds=revalidate_seconds)
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def verify(self, token):
+        """Return the token's claims if its signature and expiry check out locally, otherwise None."""
+        try:
+            algorithm = jwt.get_unverified_header(token).get("alg")
+            if algorithm == "HS256":
+                if not self.jwt_secret:
+                    return None
+                key = self.jwt_secret
+            elif algorithm in ASYMMETRIC_ALGORITHMS:
+                key = self._jwks.get_signing_key_from_jwt(token).key
+            else:
+                return None
+            claims = jwt.decode(
+                token, key, algorithms=[algorithm], audience=AUDIENCE,
+                options={"require": ["exp", "sub"]}
+            )
+        except (jwt.PyJWTError, jwt.PyJWKClientError):
+            return None
+        if self._is_revoked(_session_key(token, claims)):
+            return None
+        return claims
+
+    def needs_network(self, token, claims):
+        """Whether a locally verified token should still be checked with Supabase."""
+        if claims["exp"] - time.time() < self.refresh_margin:
+            return True
+        return self._checked.get(_session_key(token, claims)) is None
+
+    def mark_checked(self, token):
+        """Record that Supabase accepted the token just now."""
+        claims = _unverified_claims(token)
+        if claims is not None:
+            self._checked.set(_session_key(token, claims), True)
+
+    def revoke(self, token):
+        """Reject the token locally from now on, e.g. after signing out."""
+        claims = _unverified_claims(token)
+        if claims is None:
+            return
+        key = _session_key(token, claims)
+        self._checked.delete(key)
+        with self._lock:
+            now = time.time()
+            self._revoked = {k: exp for k, exp in self._revoked.items() if exp > now}
+            self._revoked[key] = claims.get("exp", now + TOKEN_REVALIDATE_SECONDS)
+
+    def _is_revoked(self, key):
+        with self._lock:
+            return key in self._revoked
+
+def _unverified_claims(token):
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+
+def _session_key(token, claims):
+    """Supabase's session id, so refreshed tokens of a revoked session stay revoked."""
+    return claims.get("session_id") or hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+_token_validator = None
+_token_validator_lock = threading.Lock()
+
+def get_token_validator():
+    """Return the process-wide token validator for the configured Supabase project."""
+    global _token_validator
+    with _token_validator_lock:
+        if _token_validator is None:
+            _token_validator = TokenValidator(
+                st.secrets["SUPABASE_URL"],
+                api_key=st.secrets["SUPABASE_KEY"],
+                jwt_secret=os.environ.get("SUPABASE_JWT_SECRET") or st.secrets.get("SUPABASE_JWT_SECRET")
+            )
+        return _token_validator
@@ -0,0 +1,46 @@
+import hashlib
+import threading
+import streamlit as st
+from config.app_config import USER_CLIENT_CACHE_SIZE, USER_CLIENT_TTL_SECONDS
+from services.cache_service import MemoryCache
+
+class UserClients:
+    """
+    PostgREST clients that send one user's access token.
+    The Supabase client from st.connection is shared by every session in the
+    process, so its JWT is whoever signed in on it last. Calls that rely on
+    auth.uid() go through one of these instead. Clients are cached per token.
+    """
+
+    def __init__(self, supabase_url, api_key, max_entries=USER_CLIENT_CACHE_SIZE,
+                 ttl_seconds=USER_CLIENT_TTL_SECONDS):
+        self.rest_url = f"{supabase_url.rstrip('/')}/rest/v1"
+        self.api_key = api_key
+        self._clients = MemoryCache(max_entries=max_entries, ttl_seconds=ttl_seconds, size_of=lambda value: 0)
+
+    def get(self, access_token):
+        """A client acting as the user the token belongs to."""
+        if not access_token:
+            raise PermissionError("A signed-in user's access token is required")
+        key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+        client = self._clients.get(key)
+        if client is None:
+            # Installed with supabase; only needed when a backend is set to "supabase"
+            from postgrest import SyncPostgrestClient
+            client = SyncPostgrestClient(self.rest_url, headers={
+                "apikey": self.api_key,
+                "Authorization": f"Bearer {access_token}"
+            })
+            self._clients.set(key, client)
+        return client
+
+_user_clients = None
+_user_clients_lock = threading.Lock()
+
+def get_user_clients():
+    """Return the process-wide per-user clients for the configured Supabase project."""
+    global _user_clients
+    with _user_clients_lock:
+        if _user_clients is None:
+            _user_clients = UserClients(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+        return _user_clients
@@ -0,0 +1,45 @@
+"""
+Analyze a folder of report PDFs without the web app.
+
+    cd src
+    GROQ_API_KEY=... python batch.py reports/ -o results/reports.jsonl
+    python batch.py manifest.csv -o results/manifest.jsonl
+
+Rerunning with the same output file skips reports that are already done.
+"""
+import argparse
+import json
+import logging
+import os
+from agents.analysis_agent import AnalysisAgent
+from agents.model_manager import ModelManager
+from agents.state import MemoryState
+from config.app_config import BATCH_EXTRACTION_WORKERS, BATCH_ANALYSIS_WORKERS
+from config.prompts import SPECIALIST_PROMPTS
+from services.batch_service import BatchRunner, load_items
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze blood report PDFs in bulk.")
+    parser.add_argument("source", help="Directory of PDFs, or a .jsonl/.csv manifest with a path column")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file for results (also the resume checkpoint)")
+    parser.add_argument("--extraction-workers", type=int, default=BATCH_EXTRACTION_WORKERS)
+    parser.add_argument("--analysis-workers", type=int, default=BATCH_ANALYSIS_WORKERS)
+    parser.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY"),
+                        help="Groq API key (defaults to $GROQ_API_KEY, then .streamlit/secrets.toml)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    agent = AnalysisAgent(model_manager=ModelManager(api_key=args.api_key), state=MemoryState())
+    runner = BatchRunner(
+        agent,
+        SPECIALIST_PROMPTS["comprehensive_analyst"],
+        args.output,
+        extraction_workers=args.extraction_workers,
+        analysis_workers=args.analysis_workers
+    )
+    summary = runner.run(load_items(args.source))
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
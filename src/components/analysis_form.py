@@ -1,9 +1,10 @@
 import streamlit as st
-from services.ai_service import generate_analysis
+from services.ai_service import generate_analysis, submit_analysis, get_session_jobs, collect_finished_jobs
+from services.job_queue import QUEUED, DONE, FAILED
 from config.prompts import SPECIALIST_PROMPTS
-from utils.pdf_extractor import extract_text_from_pdf
+from utils.pdf_extractor import extract_report
 from config.sample_data import SAMPLE_REPORT
-from config.app_config import MAX_UPLOAD_SIZE_MB
+from config.app_config import MAX_UPLOAD_SIZE_MB, ANALYSIS_POLL_INTERVAL_SECONDS
 
 def show_analysis_form():
     # Initialize report source in session state for new sessions
@@ -41,12 +42,8 @@ def get_report_contents(report_source):
                 st.error("Please upload a valid PDF file.")
                 return None
                 
-            pdf_contents = extract_text_from_pdf(uploaded_file)
-            if isinstance(pdf_contents, str) and (
-                pdf_contents.startswith(("File size exceeds", "Invalid file type", "Error validating")) or
-                pdf_contents.startswith("The uploaded file") or
-                "error" in pdf_contents.lower()
-            ):
+            is_valid, pdf_contents = extract_report(uploaded_file)
+            if not is_valid:
                 st.error(pdf_contents)
                 return None
             with st.expander("View Extracted Report"):
@@ -82,34 +79,48 @@ def handle_form_submission(patient_name, age, gender, pdf_contents):
         st.stop()
         return
 
-    with st.spinner("Analyzing report..."):
-        # Save user message and proceed with analysis
+    with st.spinner("Submitting report..."):
+        # Save user message and queue the analysis
         st.session_state.auth_service.save_chat_message(
             st.session_state.current_session['id'],
             f"Analyzing report for patient: {patient_name}"
         )
         
-        # Generate analysis
-        result = generate_analysis({
+        # The analysis runs in the background; progress is shown by show_analysis_progress
+        result = submit_analysis({
             "patient_name": patient_name,
             "age": age,
             "gender": gender,
             "report": pdf_contents
-        }, SPECIALIST_PROMPTS["comprehensive_analyst"])
+        }, SPECIALIST_PROMPTS["comprehensive_analyst"], st.session_state.current_session['id'])
         
         if result["success"]:
-            # Add model used information if available
-            content = result["content"]
-            if "model_used" in result:
-                model_info = f"\n\n*Analysis generated using {result['model_used']}*"
-                content += model_info
-                
-            st.session_state.auth_service.save_chat_message(
-                st.session_state.current_session['id'],
-                content,
-                role='assistant'
-            )
             st.rerun()
         else:
             st.error(result["error"])
             st.stop()
+
+def show_analysis_progress():
+    """Show analyses still running for the current chat session."""
+    for job in collect_finished_jobs():
+        if job["status"] == FAILED:
+            st.error(job["error"] or "Analysis failed")
+    
+    if get_session_jobs(st.session_state.current_session['id']):
+        render_job_progress(st.session_state.current_session['id'])
+
+@st.fragment(run_every=ANALYSIS_POLL_INTERVAL_SECONDS)
+def render_job_progress(session_id):
+    """Poll running jobs and render their partial output as it streams in."""
+    jobs = get_session_jobs(session_id)
+    if not jobs or any(job["status"] in (DONE, FAILED) for job in jobs):
+        # Rerun the whole page so finished analyses appear in the chat history
+        st.rerun()
+    
+    for job in jobs:
+        if job["status"] == QUEUED:
+            st.info("Waiting for an available analysis worker...")
+        elif job["content"]:
+            st.success(job["content"] + " ▌")
+        else:
+            st.info("Analyzing report...")
@@ -2,6 +2,7 @@ import streamlit as st
 from auth.session_manager import SessionManager
 from components.footer import show_footer
 from config.app_config import ANALYSIS_DAILY_LIMIT
+from services.ai_service import get_remaining_analyses
 
 def show_sidebar():
     with st.sidebar:
@@ -21,10 +22,7 @@ def show_sidebar():
                 st.rerun()
 
         # Add analysis counter
-        if 'analysis_count' not in st.session_state:
-            st.session_state.analysis_count = 0
-        
-        remaining = ANALYSIS_DAILY_LIMIT - st.session_state.analysis_count
+        remaining = get_remaining_analyses()
         st.markdown(
             f"""
             <div style='
@@ -62,11 +60,20 @@ def show_sidebar():
 
 def show_session_list():
     if st.session_state.user and 'id' in st.session_state.user:
-        success, sessions = SessionManager.get_user_sessions()
+        for error in SessionManager.collect_finished_deletions():
+            st.error(f"Failed to delete: {error}")
+        
+        success, loaded = SessionManager.get_user_sessions()
         if success:
+            # Hide sessions whose delete is still running in the background
+            deleting = SessionManager.deleting_session_ids()
+            sessions = [session for session in loaded["sessions"] if session.get('id') not in deleting]
             if sessions:
                 st.subheader("Previous Sessions")
                 render_session_list(sessions)
+                if loaded["has_more"] and st.button("Load more", key="load_more_sessions", use_container_width=True):
+                    SessionManager.get_user_sessions(load_more=True)
+                    st.rerun()
             else:
                 st.info("No previous sessions")
 
@@ -75,9 +82,36 @@ def render_session_list(sessions):
     if 'delete_confirmation' not in st.session_state:
         st.session_state.delete_confirmation = None
     
+    if st.toggle("Select multiple", key="bulk_delete_mode"):
+        render_bulk_delete(sessions)
+        return
+    
     for session in sessions:
         render_session_item(session)
 
+def render_bulk_delete(sessions):
+    selected = [
+        session['id'] for session in sessions
+        if session and 'id' in session
+        and st.checkbox(f"📝 {session['title']}", key=f"select_{session['id']}")
+    ]
+    # A callback, since it resets the toggle and checkboxes rendered above
+    st.button(f"🗑️ Delete selected ({len(selected)})", key="delete_selected",
+              disabled=not selected, type="primary", use_container_width=True,
+              on_click=handle_bulk_delete, args=(selected,))
+
+def handle_bulk_delete(session_ids):
+    success, error = SessionManager.delete_sessions(session_ids)
+    if not success:
+        st.error(f"Failed to delete: {error}")
+        return
+    current_session = st.session_state.get('current_session')
+    if isinstance(current_session, dict) and current_session.get('id') in session_ids:
+        st.session_state.current_session = None
+    for session_id in session_ids:
+        st.session_state.pop(f"select_{session_id}", None)
+    st.session_state.bulk_delete_mode = False
+
 def render_session_item(session):
     if not session or not isinstance(session, dict) or 'id' not in session:
         return
@@ -7,8 +7,123 @@ APP_TAGLINE = "AI-Powered Health Insights Just for You"  # TODO: Change to your
 MAX_UPLOAD_SIZE_MB = 20
 MAX_PDF_PAGES = 50
 SESSION_TIMEOUT_MINUTES = 30
-ANALYSIS_DAILY_LIMIT = 15
+ANALYSIS_DAILY_LIMIT = 15  # Supabase enforces its own copy in consume_analysis_quota; change both
 
 # UI Settings - TODO: Customize colors to your preference
 PRIMARY_COLOR = "#4CAF50"  # Green theme - change to your preferred primary color
 SECONDARY_COLOR = "#2E7D32"  # Dark green - change to your preferred secondary color
+
+# Analysis result cache
+ANALYSIS_CACHE_MAX_ENTRIES = 256
+ANALYSIS_CACHE_TTL_SECONDS = 24 * 60 * 60
+ANALYSIS_CACHE_DB_PATH = None  # Set to a file path (e.g. ".cache/analysis.db") to share results across workers
+
+# Model health tracking
+MODEL_HEALTH_WINDOW = 50  # Number of recent calls used for error rate and latency stats
+MODEL_HEALTH_MIN_SAMPLES = 10  # Calls needed before the error rate can trip a circuit
+MODEL_CIRCUIT_ERROR_RATE = 0.5
+MODEL_CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failures that open a circuit
+MODEL_CIRCUIT_OPEN_SECONDS = 60
+MODEL_RATE_LIMIT_COOLDOWN_SECONDS = 30
+
+# Model retry policy
+MODEL_MAX_ATTEMPTS_PER_TIER = 2
+MODEL_RETRY_BASE_DELAY_SECONDS = 0.5
+MODEL_RETRY_MAX_DELAY_SECONDS = 8
+MODEL_RETRY_MAX_WAIT_SECONDS = 5  # Longer Retry-After values fall through to the next tier instead
+ANALYSIS_DEADLINE_SECONDS = 90  # Total time budget for one analysis across all tiers
+
+# Groq HTTP connection pool (shared by all sessions in the process)
+GROQ_POOL_MAX_CONNECTIONS = 50
+GROQ_POOL_MAX_KEEPALIVE = 20
+GROQ_KEEPALIVE_EXPIRY_SECONDS = 30
+GROQ_CONNECT_TIMEOUT_SECONDS = 5
+GROQ_READ_TIMEOUT_SECONDS = 60
+
+# Client-side rate limiting against Groq per-model quotas
+RATE_LIMIT_MAX_WAIT_SECONDS = 2  # Longer waits route the request to another tier instead
+RATE_LIMIT_DB_PATH = None  # Set to a file path (e.g. ".cache/rate_limits.db") to share buckets across workers
+
+# Per-user analysis quota
+QUOTA_WINDOW_SECONDS = 24 * 60 * 60  # Sliding window for ANALYSIS_DAILY_LIMIT; also set in consume_analysis_quota
+QUOTA_BACKEND = "supabase"  # "supabase" (usage table) or "sqlite" for local development
+QUOTA_DB_PATH = ".cache/usage.db"  # Used by the sqlite backend
+QUOTA_CACHE_TTL_SECONDS = 60  # How long the sidebar may show a cached remaining count
+
+# Background analysis jobs
+ANALYSIS_WORKERS = 8  # Concurrent model calls per server process
+ANALYSIS_QUEUE_MAX_PENDING = 100  # New jobs are refused beyond this many queued or running
+ANALYSIS_JOB_RETENTION_SECONDS = 60 * 60  # Finished jobs are kept this long for the UI to pick up
+ANALYSIS_POLL_INTERVAL_SECONDS = 1
+
+# PDF extraction
+PDF_PARALLEL_MIN_PAGES = 8  # Smaller PDFs are extracted serially; starting workers isn't worth it
+PDF_PAGES_PER_CHUNK = 4
+PDF_EXTRACTION_WORKERS = 4
+PDF_VALIDATION_PAGES = 3  # Non-medical PDFs are rejected after this many pages
+
+# PDF extraction cache (keyed by SHA-256 of the uploaded file)
+EXTRACTION_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Total extracted text kept in memory
+EXTRACTION_CACHE_TTL_SECONDS = 24 * 60 * 60
+EXTRACTION_CACHE_DB_PATH = None  # Set to a file path to keep extractions across restarts and workers
+
+# Map-reduce analysis for large reports
+MAP_REDUCE_MIN_REPORT_TOKENS = 4000  # Smaller reports are analyzed in a single call
+MAP_REDUCE_MIN_SECTIONS = 2
+MAP_REDUCE_SECTION_MAX_TOKENS = 600  # Completion cap for each section call; section findings are short
+MAP_REDUCE_WORKERS = 6  # Concurrent section calls per analysis
+
+# Per-user knowledge base for in-context learning
+KNOWLEDGE_DB_PATH = ".cache/knowledge.db"  # Set to None to keep learning in memory for this process only
+KNOWLEDGE_MAX_INSIGHTS_PER_KEY = 3  # Per user, indicator and patient profile; least recently used are evicted
+KNOWLEDGE_CONTEXT_ITEMS = 5  # Insights added to each prompt
+
+# Similar-case retrieval for in-context examples
+RETRIEVAL_DB_PATH = ".cache/retrieval.db"  # Set to None to keep the index in memory for this process only
+RETRIEVAL_VECTOR_DIM = 128  # Analytes are hashed into this many dimensions
+RETRIEVAL_EXAMPLES = 2  # Prior cases added to each prompt
+RETRIEVAL_MIN_SIMILARITY = 0.8  # Cosine similarity below which a prior case isn't used
+RETRIEVAL_EXAMPLE_MAX_CHARS = 800  # Prior analyses are cut to this length in the prompt
+
+# Near-duplicate analysis reuse (same lab template with a few values changed, re-exports)
+NEAR_DUPLICATE_THRESHOLD = 0.9  # Estimated Jaccard similarity of the report text shingles
+NEAR_DUPLICATE_NUM_PERM = 64  # MinHash signature length
+NEAR_DUPLICATE_BANDS = 16  # LSH bands; NUM_PERM must be divisible by this
+NEAR_DUPLICATE_MAX_ENTRIES = 5000
+NEAR_DUPLICATE_TTL_SECONDS = 24 * 60 * 60
+
+# Headless batch analysis (src/batch.py)
+BATCH_EXTRACTION_WORKERS = 4  # Processes extracting PDFs
+BATCH_ANALYSIS_WORKERS = 4  # Concurrent analyses; model calls still go through the rate limiter
+BATCH_ANALYSIS_ATTEMPTS = 3  # Failed analyses (e.g. every tier throttled) are retried this many times
+BATCH_RETRY_DELAY_SECONDS = 10  # Multiplied by the attempt number
+
+# Users, chat sessions and messages
+DATABASE_BACKEND = "supabase"  # "supabase" or "sqlite" to keep chat data in a local file (sign-in still uses Supabase Auth)
+DATABASE_PATH = ".cache/chat.db"  # Used by the sqlite backend
+
+# Sidebar session list
+SESSION_PAGE_SIZE = 20  # Sessions loaded per "Load more"
+SESSION_LIST_CACHE_TTL_SECONDS = 5 * 60  # Also invalidated when this server creates or deletes a session
+SESSION_DELETE_WORKERS = 2  # Background threads running sidebar deletes
+
+# Session token validation (set SUPABASE_JWT_SECRET in secrets to verify HS256 tokens locally)
+TOKEN_REFRESH_MARGIN_SECONDS = 60  # Check with Supabase once a token is this close to expiry
+TOKEN_REVALIDATE_SECONDS = 5 * 60  # How long a revocation elsewhere can go unnoticed
+JWKS_CACHE_SECONDS = 60 * 60
+USER_CLIENT_CACHE_SIZE = 1000  # Per-user Supabase clients kept for calls that rely on auth.uid()
+USER_CLIENT_TTL_SECONDS = 60 * 60  # Supabase access tokens expire after an hour by default
+USER_PROFILE_CACHE_TTL_SECONDS = 5 * 60
+
+# Chat message cache
+MESSAGE_PAGE_SIZE = 50  # Messages loaded when opening a session and per "Show earlier messages"
+MESSAGE_CACHE_REFRESH_SECONDS = 10  # How often to check for messages written by other server processes
+MESSAGE_CACHE_TTL_SECONDS = 30 * 60
+MESSAGE_CACHE_MAX_SESSIONS = 1000
+MESSAGE_CURSOR_OVERLAP_SECONDS = 5  # Refetch this far back from the cursor to allow for clock skew
+
+# Write-behind chat message writer
+MESSAGE_WRITE_BATCH_SIZE = 50  # Flush as soon as this many messages are queued
+MESSAGE_WRITE_FLUSH_SECONDS = 0.5  # Longest a message waits before being sent
+MESSAGE_WRITE_RETRY_MAX_SECONDS = 60  # Backoff cap while the database is unreachable
+MESSAGE_SPOOL_PATH = ".cache/message_spool.jsonl"  # Unsent messages, one file per process with its pid added; resent on restart. None keeps them in memory only
@@ -58,5 +58,15 @@ SPECIALIST_PROMPTS = {
       - [Urgency of medical consultation if needed]
 
 
-    Note: Focus on early detection and prevention. Explain how current blood values might indicate future health risks and what can be done to prevent them."""
-}
\ No newline at end of file
+    Note: Focus on early detection and prevention. Explain how current blood values might indicate future health risks and what can be done to prevent them.""",
+
+    "section_analyst": """You are an expert medical analyst reviewing one section of a larger blood report.
+
+    Review only the values provided. For each value outside its reference range, note how far out of range it is and what it may indicate. Point out patterns across the values in this section (for example several red cell indices that together suggest a type of anemia).
+
+    Respond with concise bullet points only. Do not add a disclaimer, recommendations or a summary of normal values; your findings will be merged with the other sections of the report.""",
+
+    "report_synthesis": """The report was reviewed section by section. You are given the findings for each section and the out-of-range values from the whole report instead of the full report text.
+
+    Combine them into a single analysis in the format described above. Look for conditions supported by values from more than one section, resolve any contradictions between sections, and rank risks across the whole report."""
+}
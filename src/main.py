@@ -2,7 +2,7 @@ import streamlit as st
 from auth.session_manager import SessionManager
 from components.auth_pages import show_login_page
 from components.sidebar import show_sidebar
-from components.analysis_form import show_analysis_form
+from components.analysis_form import show_analysis_form, show_analysis_progress
 from components.footer import show_footer
 from config.app_config import APP_NAME, APP_TAGLINE, APP_DESCRIPTION, APP_ICON
 
@@ -50,12 +50,14 @@ def show_welcome_screen():
                 st.error("Failed to create session")
 
 def show_chat_history():
-    success, messages = st.session_state.auth_service.get_session_messages(
-        st.session_state.current_session['id']
-    )
+    session_id = st.session_state.current_session['id']
+    success, history = st.session_state.auth_service.get_cached_messages(session_id)
     
     if success:
-        for msg in messages:
+        if history["has_earlier"] and st.button("Show earlier messages", key=f"earlier_{session_id}"):
+            st.session_state.auth_service.get_cached_messages(session_id, load_earlier=True)
+            st.rerun()
+        for msg in history["messages"]:
             if msg['role'] == 'user':
                 st.info(msg['content'])
             else:
@@ -88,6 +90,7 @@ def main():
     if st.session_state.get('current_session'):
         st.title(f"📊 {st.session_state.current_session['title']}")
         show_chat_history()
+        show_analysis_progress()
         show_analysis_form()
     else:
         show_welcome_screen()
@@ -0,0 +1,308 @@
+import os
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+import jwt
+from config.app_config import DATABASE_BACKEND, DATABASE_PATH
+
+class ChatRepository(ABC):
+    """
+    Storage for users, chat sessions and chat messages.
+    Rows are dicts with the columns of my_database_setup.sql and ISO 8601 created_at
+    strings in UTC. Methods raise on failure; callers turn errors into (success, data) results.
+    tests/test_chat_repository_contract.py checks that an implementation behaves like the others.
+    """
+
+    @abstractmethod
+    def get_user(self, user_id):
+        """The users row, or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_exists(self, email):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_user(self, user):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_session(self, session):
+        """Insert a chat_sessions row and return it as stored."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_sessions(self, user_id, limit=None, before=None):
+        """
+        id, title and created_at of a user's sessions, newest first (ties by id, descending).
+        `before` is the (created_at, id) of the last session of the previous page.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_session(self, session_id, user_id=None):
+        """Delete a session and its messages."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_sessions(self, user_id, session_ids, access_token=None):
+        """
+        Delete several of a user's sessions and their messages; returns how many were deleted.
+        access_token is the user's own Supabase token, which the Supabase backend requires.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_messages(self, messages):
+        """Insert chat_messages rows; rows whose id already exists are skipped, so retries are safe."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_messages(self, session_id, since=None, before=None, limit=None):
+        """
+        A session's messages oldest first, with created_at >= since and < before.
+        With limit, the newest `limit` matching messages.
+        """
+        raise NotImplementedError
+
+class SupabaseChatRepository(ChatRepository):
+    """
+    Tables in Supabase, through a supabase-py client. Calls that rely on auth.uid()
+    go through `user_clients` (auth.user_client.UserClients) with the user's token.
+    """
+
+    def __init__(self, client, user_clients=None):
+        self.client = client
+        self.user_clients = user_clients
+
+    def get_user(self, user_id):
+        result = self.client.table('users').select('*').eq('id', user_id).limit(1).execute()
+        return result.data[0] if result.data else None
+
+    def user_exists(self, email):
+        result = self.client.table('users').select('id').eq('email', email).limit(1).execute()
+        return len(result.data) > 0
+
+    def insert_user(self, user):
+        self.client.table('users').insert(user).execute()
+
+    def insert_session(self, session):
+        result = self.client.table('chat_sessions').insert(session).execute()
+        return result.data[0] if result.data else None
+
+    def list_sessions(self, user_id, limit=None, before=None):
+        query = self.client.table('chat_sessions')\
+            .select('id, title, created_at')\
+            .eq('user_id', user_id)
+        if before:
+            created_at, session_id = before
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{session_id})'
+            )
+        query = query.order('created_at', desc=True).order('id', desc=True)
+        if limit:
+            query = query.limit(limit)
+        return query.execute().data
+
+    def delete_session(self, session_id, user_id=None):
+        # Messages go with the session through ON DELETE CASCADE
+        query = self.client.table('chat_sessions').delete().eq('id', session_id)
+        if user_id:
+            query = query.eq('user_id', user_id)
+        query.execute()
+
+    def delete_sessions(self, user_id, session_ids, access_token=None):
+        # The function deletes the token owner's sessions, so the token has to be user_id's
+        claims = jwt.decode(access_token, options={"verify_signature": False}) if access_token else {}
+        if claims.get('sub') != str(user_id):
+            raise PermissionError("Sessions can only be deleted with their owner's access token")
+        result = self.user_clients.get(access_token).rpc('delete_chat_sessions', {
+            'p_session_ids': list(session_ids)
+        }).execute()
+        return result.data
+
+    def insert_messages(self, messages):
+        self.client.table('chat_messages').upsert(messages, ignore_duplicates=True).execute()
+
+    def list_messages(self, session_id, since=None, before=None, limit=None):
+        query = self.client.table('chat_messages')\
+            .select('id, session_id, role, content, created_at')\
+            .eq('session_id', session_id)
+        if since:
+            query = query.gte('created_at', since)
+        if before:
+            query = query.lt('created_at', before)
+        if limit:
+            return list(reversed(query.order('created_at', desc=True).limit(limit).execute().data))
+        return query.order('created_at').execute().data
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    name TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(id),
+    title TEXT,
+    created_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_message_at TEXT
+);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    content TEXT,
+    role TEXT,
+    created_at TEXT NOT NULL
+);
+DROP INDEX IF EXISTS idx_chat_sessions_user_id_created_at;
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_id_created_at_id ON chat_sessions(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id_created_at ON chat_messages(session_id, created_at);
+CREATE TRIGGER IF NOT EXISTS chat_messages_inserted AFTER INSERT ON chat_messages BEGIN
+    UPDATE chat_sessions
+    SET message_count = message_count + 1,
+        last_message_at = MAX(COALESCE(last_message_at, NEW.created_at), NEW.created_at)
+    WHERE id = NEW.session_id;
+END;
+CREATE TRIGGER IF NOT EXISTS chat_messages_deleted AFTER DELETE ON chat_messages BEGIN
+    UPDATE chat_sessions SET message_count = MAX(message_count - 1, 0) WHERE id = OLD.session_id;
+END;
+"""
+
+SESSION_COLUMNS = "id, user_id, title, created_at, message_count, last_message_at"
+MESSAGE_COLUMNS = "id, session_id, role, content, created_at"
+
+class SQLiteChatRepository(ChatRepository):
+    """
+    The same tables in a local SQLite file, for offline use, load tests and small
+    single-machine deployments. WAL lets readers in other processes run alongside
+    the writer; every statement is one of a few fixed strings, so sqlite3 reuses
+    their prepared forms from its statement cache.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=5, check_same_thread=False, isolation_level=None, cached_statements=64
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _fetch(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _write(self, sql, rows):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.executemany(sql, rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def get_user(self, user_id):
+        rows = self._fetch("SELECT id, email, name, created_at FROM users WHERE id = ?", (user_id,))
+        return rows[0] if rows else None
+
+    def user_exists(self, email):
+        return bool(self._fetch("SELECT id FROM users WHERE email = ?", (email,)))
+
+    def insert_user(self, user):
+        self._write(
+            "INSERT INTO users (id, email, name, created_at) VALUES (?, ?, ?, ?)",
+            [(user.get('id') or str(uuid.uuid4()), user['email'], user.get('name'),
+              user.get('created_at') or utc_now().isoformat())]
+        )
+
+    def insert_session(self, session):
+        session = {
+            **session,
+            'id': session.get('id') or str(uuid.uuid4()),
+            'created_at': session.get('created_at') or utc_now().isoformat()
+        }
+        self._write(
+            "INSERT INTO chat_sessions (id, user_id, title, created_at) VALUES (?, ?, ?, ?)",
+            [(session['id'], session['user_id'], session.get('title'), session['created_at'])]
+        )
+        return self._fetch(f"SELECT {SESSION_COLUMNS} FROM chat_sessions WHERE id = ?", (session['id'],))[0]
+
+    def list_sessions(self, user_id, limit=None, before=None):
+        sql = "SELECT id, title, created_at FROM chat_sessions WHERE user_id = ?"
+        params = [user_id]
+        if before:
+            sql += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit or -1)
+        return self._fetch(sql, params)
+
+    def delete_session(self, session_id, user_id=None):
+        self._write(
+            "DELETE FROM chat_sessions WHERE id = ? AND (? IS NULL OR user_id = ?)",
+            [(session_id, user_id, user_id)]
+        )
+
+    def delete_sessions(self, user_id, session_ids, access_token=None):
+        return self._write(
+            "DELETE FROM chat_sessions WHERE id = ? AND user_id = ?",
+            [(session_id, user_id) for session_id in session_ids]
+        )
+
+    def insert_messages(self, messages):
+        self._write(
+            "INSERT OR IGNORE INTO chat_messages (id, session_id, role, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(message.get('id') or str(uuid.uuid4()), message['session_id'], message.get('role'),
+              message.get('content'), message.get('created_at') or utc_now().isoformat()) for message in messages]
+        )
+
+    def list_messages(self, session_id, since=None, before=None, limit=None):
+        # Only bounds that are set go into the query, so SQLite can range-scan the composite index
+        sql = f"SELECT {MESSAGE_COLUMNS} FROM chat_messages WHERE session_id = ?"
+        params = [session_id]
+        if since:
+            sql += " AND created_at >= ?"
+            params.append(since)
+        if before:
+            sql += " AND created_at < ?"
+            params.append(before)
+        if limit:
+            params.append(limit)
+            return list(reversed(self._fetch(sql + " ORDER BY created_at DESC LIMIT ?", params)))
+        return self._fetch(sql + " ORDER BY created_at", params)
+
+def utc_now():
+    """The current time, timezone-aware; every created_at is written from this."""
+    return datetime.now(timezone.utc)
+
+_chat_repository = None
+_chat_repository_lock = threading.Lock()
+
+def get_chat_repository(client=None, user_clients=None):
+    """
+    Return the process-wide chat repository.
+    `client` is the supabase-py client and `user_clients` the auth.user_client.UserClients
+    used when DATABASE_BACKEND is "supabase".
+    """
+    global _chat_repository
+    with _chat_repository_lock:
+        if _chat_repository is None:
+            if DATABASE_BACKEND == "supabase" and client is not None:
+                _chat_repository = SupabaseChatRepository(client, user_clients)
+            else:
+                _chat_repository = SQLiteChatRepository(DATABASE_PATH)
+        return _chat_repository
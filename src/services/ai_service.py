@@ -1,18 +1,28 @@
+import uuid
 import streamlit as st
 from agents.analysis_agent import AnalysisAgent
+from services.job_queue import get_job_queue
 
 def init_analysis_state():
     """Initialize analysis-related session state variables."""
     if 'analysis_agent' not in st.session_state:
         st.session_state.analysis_agent = AnalysisAgent()
+    if 'pending_jobs' not in st.session_state:
+        st.session_state.pending_jobs = []
 
 def check_rate_limit():
     # Ensure analysis agent is initialized
     init_analysis_state()
     return st.session_state.analysis_agent.check_rate_limit()
 
-def generate_analysis(data, system_prompt, check_only=False, session_id=None):
-    """Generate analysis if within rate limits."""
+def get_remaining_analyses():
+    """Analyses the current user has left today (cached briefly to keep reruns cheap)."""
+    init_analysis_state()
+    agent = st.session_state.analysis_agent
+    return agent.quota.remaining(agent._user_id(), agent._access_token())
+
+def generate_analysis(data, system_prompt, check_only=False, session_id=None, stream=False):
+    """Generate analysis if within rate limits. With stream=True, returns a generator of stream events."""
     # Ensure analysis agent is initialized
     init_analysis_state()
     
@@ -32,5 +42,80 @@ def generate_analysis(data, system_prompt, check_only=False, session_id=None):
     return st.session_state.analysis_agent.analyze_report(
         data=data,
         system_prompt=system_prompt,
-        check_only=False
-    )
\ No newline at end of file
+        check_only=False,
+        stream=stream
+    )
+
+def format_analysis_message(result):
+    """Build the assistant chat message for a successful analysis."""
+    content = result["content"]
+    # Add model used information if available
+    if "model_used" in result:
+        if result.get("near_duplicate"):
+            suffix = " (adapted from a near-identical report)"
+        else:
+            suffix = " (cached)" if result.get("cached") else ""
+        content += f"\n\n*Analysis generated using {result['model_used']}{suffix}*"
+    return content
+
+def submit_analysis(data, system_prompt, session_id):
+    """
+    Queue an analysis to run in the background.
+    The assistant message is saved by the worker when the job finishes, so a
+    rerun or tab switch doesn't lose the work. Cache hits are saved right away.
+    """
+    init_analysis_state()
+    agent = st.session_state.analysis_agent
+    auth_service = st.session_state.auth_service
+    
+    prepared = agent.prepare_analysis(data, system_prompt)
+    if "result" in prepared:
+        result = prepared["result"]
+        if result["success"]:
+            auth_service.save_chat_message(session_id, format_analysis_message(result), role='assistant')
+        return result
+    
+    message_id = str(uuid.uuid4())
+    
+    # Runs on a worker thread: must not touch st.session_state
+    def run():
+        for event in agent.run_analysis(prepared, stream=True):
+            if event["type"] == "done":
+                agent.complete_analysis(prepared, event["result"])
+            yield event
+    
+    def persist(result):
+        auth_service.save_chat_message(
+            session_id, format_analysis_message(result), role='assistant', message_id=message_id
+        )
+        agent.index_analysis(prepared, result)
+    
+    job = get_job_queue().submit(session_id, message_id, run, persist, context=prepared)
+    if job is None:
+        agent.complete_analysis(prepared, {"success": False})
+        return {"success": False, "error": "The server is busy. Please try again in a minute."}
+    
+    st.session_state.pending_jobs.append(job.key)
+    return {"success": True, "job": job.key}
+
+def get_session_jobs(session_id):
+    """Snapshots of this browser session's unfinished jobs for a chat session."""
+    init_analysis_state()
+    queue = get_job_queue()
+    jobs = [queue.get(*key) for key in st.session_state.pending_jobs if key[0] == session_id]
+    return [job.snapshot() for job in jobs if job is not None]
+
+def collect_finished_jobs():
+    """Apply finished jobs to this session's analytics and return their snapshots."""
+    init_analysis_state()
+    queue = get_job_queue()
+    finished = []
+    for key in list(st.session_state.pending_jobs):
+        job = queue.get(*key)
+        if job is None:
+            st.session_state.pending_jobs.remove(key)
+        elif job.finished:
+            st.session_state.analysis_agent.record_analysis(job.context, job.result or {"success": False})
+            st.session_state.pending_jobs.remove(key)
+            finished.append(job.snapshot())
+    return finished
@@ -0,0 +1,244 @@
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from config.app_config import (
+    BATCH_EXTRACTION_WORKERS,
+    BATCH_ANALYSIS_WORKERS,
+    BATCH_ANALYSIS_ATTEMPTS,
+    BATCH_RETRY_DELAY_SECONDS
+)
+from utils.pdf_extractor import extract_report
+
+logger = logging.getLogger(__name__)
+
+SUCCESS = "success"
+INVALID = "invalid"
+ERROR = "error"
+
+# Outcomes that won't change on a rerun; resumed batches skip these reports
+FINAL_STATUSES = (SUCCESS, INVALID)
+
+class ReportFile(io.BytesIO):
+    """A PDF on disk with the attributes of a Streamlit upload, so the upload validators apply."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.size = len(self.getvalue())
+        self.type = "application/pdf" if path.lower().endswith(".pdf") else "application/octet-stream"
+
+def load_items(source):
+    """
+    Read the reports to analyze from a directory of PDFs or a manifest.
+    Manifests are .jsonl or .csv with a "path" column and optional "id",
+    "patient_name", "age" and "gender"; relative paths are resolved against
+    the manifest's directory. Returns a list of item dicts.
+    """
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names if name.lower().endswith(".pdf")
+        )
+        return [{"id": os.path.relpath(path, source), "path": path} for path in paths]
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="", encoding="utf-8") as f:
+        if source.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for row in rows:
+        path = row["path"] if os.path.isabs(row["path"]) else os.path.join(base, row["path"])
+        items.append({**row, "id": row.get("id") or row["path"], "path": path})
+    return items
+
+def load_checkpoint(output_path):
+    """Ids already finished in a previous run of the same output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write leaves a partial last line
+                continue
+            if record.get("status") in FINAL_STATUSES:
+                done.add(record["id"])
+    return done
+
+def _extract_item(item):
+    """Extract one report in an extraction worker process."""
+    started = time.time()
+    try:
+        is_valid, text_or_error = extract_report(ReportFile(item["path"]), parallel=False)
+    except Exception as e:
+        is_valid, text_or_error = False, f"Error reading report: {str(e)}"
+    return item, is_valid, text_or_error, time.time() - started
+
+class BatchRunner:
+    """
+    Analyzes many reports without Streamlit: PDFs are extracted on a process pool
+    and analyses run on a bounded thread pool that shares the process-wide rate
+    limiter, caches and knowledge stores with the app.
+    Each finished report is appended to a JSONL file, which doubles as the
+    checkpoint for resuming an interrupted batch.
+    """
+
+    def __init__(self, agent, system_prompt, output_path,
+                 extraction_workers=BATCH_EXTRACTION_WORKERS,
+                 analysis_workers=BATCH_ANALYSIS_WORKERS,
+                 attempts=BATCH_ANALYSIS_ATTEMPTS,
+                 retry_delay=BATCH_RETRY_DELAY_SECONDS):
+        self.agent = agent
+        self.system_prompt = system_prompt
+        self.output_path = output_path
+        self.extraction_workers = extraction_workers
+        self.analysis_workers = analysis_workers
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self._write_lock = threading.Lock()
+
+    def run(self, items):
+        """Process all items not finished by an earlier run; returns the summary dict."""
+        done = load_checkpoint(self.output_path)
+        pending = [item for item in items if item["id"] not in done]
+        logger.info(f"{len(pending)} reports to analyze, {len(items) - len(pending)} already done")
+
+        started = time.time()
+        records = []
+        directory = os.path.dirname(self.output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Spawned, not forked: the analysis threads, the message writer and the HTTP
+        # pools hold locks that a forked child could inherit mid-use
+        extraction_context = multiprocessing.get_context("spawn")
+        with open(self.output_path, "a", encoding="utf-8") as output, \
+                ProcessPoolExecutor(max_workers=self.extraction_workers, mp_context=extraction_context) as extraction_pool, \
+                ThreadPoolExecutor(max_workers=self.analysis_workers, thread_name_prefix="batch") as analysis_pool:
+            extractions = {extraction_pool.submit(_extract_item, item): item for item in pending}
+            analyses = {}
+
+            # Start each analysis as soon as its extraction finishes
+            for future in as_completed(extractions):
+                try:
+                    item, is_valid, text_or_error, extraction_time = future.result()
+                except Exception as e:
+                    # A crashed worker breaks the pool and fails every extraction still
+                    # queued; they are recorded as errors so a rerun picks them up
+                    item = extractions[future]
+                    logger.error(f"Extraction of {item['id']} failed: {str(e)}")
+                    records.append(self._write(output, self._record(item, ERROR, error=f"Extraction failed: {str(e)}")))
+                    continue
+                if not is_valid:
+                    records.append(self._write(output, self._record(
+                        item, INVALID, error=text_or_error, extraction_time=extraction_time
+                    )))
+                    continue
+                analyses[analysis_pool.submit(self._analyze, item, text_or_error, extraction_time)] = item
+
+            for future in as_completed(analyses):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    item = analyses[future]
+                    logger.exception(f"Analysis of {item['id']} failed")
+                    record = self._record(item, ERROR, error=str(e))
+                records.append(self._write(output, record))
+
+        summary = summarize(records, time.time() - started, skipped=len(items) - len(pending))
+        with open(self.output_path + ".summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def _analyze(self, item, text, extraction_time):
+        data = {
+            "patient_name": item.get("patient_name", ""),
+            "age": item.get("age", ""),
+            "gender": item.get("gender", ""),
+            "report": text
+        }
+        started = time.time()
+        try:
+            for attempt in range(self.attempts):
+                prepared = self.agent.prepare_request(data, self.system_prompt)
+                if "result" in prepared:
+                    result = prepared["result"]
+                    break
+                result = self.agent.run_analysis(prepared)
+                self.agent.complete_analysis(prepared, result)
+                if result["success"]:
+                    self.agent.index_analysis(prepared, result)
+                    break
+                if attempt + 1 < self.attempts:
+                    logger.warning(f"Analysis of {item['id']} failed, retrying: {result.get('error')}")
+                    time.sleep(self.retry_delay * (attempt + 1))
+        except Exception as e:
+            logger.exception(f"Analysis of {item['id']} failed")
+            result = {"success": False, "error": str(e)}
+
+        return self._record(
+            item,
+            SUCCESS if result["success"] else ERROR,
+            result=result,
+            error=result.get("error"),
+            extraction_time=extraction_time,
+            analysis_time=time.time() - started
+        )
+
+    def _record(self, item, status, result=None, error=None, extraction_time=0.0, analysis_time=0.0):
+        result = result or {}
+        return {
+            "id": item["id"],
+            "path": item["path"],
+            "status": status,
+            "content": result.get("content"),
+            "model_used": result.get("model_used"),
+            "cached": bool(result.get("cached")),
+            "token_budget": result.get("token_budget"),
+            "error": error,
+            "extraction_ms": round(extraction_time * 1000),
+            "analysis_ms": round(analysis_time * 1000)
+        }
+
+    def _write(self, output, record):
+        with self._write_lock:
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+        logger.info(f"{record['id']}: {record['status']}")
+        return record
+
+def summarize(records, elapsed, skipped=0):
+    """Counts, throughput and latency percentiles for a batch run."""
+    analysis_times = sorted(r["analysis_ms"] for r in records if r["status"] != INVALID)
+    extraction_times = sorted(r["extraction_ms"] for r in records)
+    return {
+        "processed": len(records),
+        "skipped": skipped,
+        "succeeded": sum(1 for r in records if r["status"] == SUCCESS),
+        "invalid": sum(1 for r in records if r["status"] == INVALID),
+        "failed": sum(1 for r in records if r["status"] == ERROR),
+        "cached": sum(1 for r in records if r["cached"]),
+        "elapsed_seconds": round(elapsed, 1),
+        "reports_per_minute": round(len(records) / elapsed * 60, 1) if elapsed else 0.0,
+        "extraction_ms": {"p50": _percentile(extraction_times, 50), "p95": _percentile(extraction_times, 95)},
+        "analysis_ms": {"p50": _percentile(analysis_times, 50), "p95": _percentile(analysis_times, 95)}
+    }
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, round(percent / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
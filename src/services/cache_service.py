@@ -0,0 +1,270 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config.app_config import (
+    ANALYSIS_CACHE_MAX_ENTRIES,
+    ANALYSIS_CACHE_TTL_SECONDS,
+    ANALYSIS_CACHE_DB_PATH,
+    EXTRACTION_CACHE_MAX_BYTES,
+    EXTRACTION_CACHE_TTL_SECONDS,
+    EXTRACTION_CACHE_DB_PATH,
+    SESSION_LIST_CACHE_TTL_SECONDS,
+    USER_PROFILE_CACHE_TTL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry expiry.
+    Bounded by entry count and, if max_bytes is set, by the total size
+    of the values as measured by size_of.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, max_bytes=None, size_of=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.size_of = size_of or (lambda value: len(json.dumps(value, default=str)))
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.size_of(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time() + self.ttl_seconds, value, size)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_bytes and self.total_bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+class SQLiteCache:
+    """
+    On-disk cache tier backed by SQLite.
+    Values must be JSON serializable. The database file can be shared by
+    several Streamlit worker processes.
+    """
+
+    def __init__(self, path, ttl_seconds=3600, table="cache_entries"):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.table = table
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+            if not row or row[1] < time.time():
+                return None
+            return json.loads(row[0])
+        except Exception as e:
+            logger.warning(f"Cache read failed: {str(e)}")
+            return None
+
+    def set(self, key, value):
+        try:
+            now = time.time()
+            with self._lock:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now + self.ttl_seconds)
+                )
+                self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (now,))
+                self._conn.commit()
+        except Exception as e:
+            logger.warning(f"Cache write failed: {str(e)}")
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+class TieredCache:
+    """
+    Cache made of several tiers, fastest first.
+    Looks up each tier in order and back-fills faster tiers on a hit.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster_tier in self.tiers[:index]:
+                    faster_tier.set(key, value)
+                with self._lock:
+                    self.hits += 1
+                return dict(value)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+class AnalysisCache(TieredCache):
+    """Content-addressed cache for model analyses."""
+
+    # Only these result fields are stored; everything else is per-request
+    CACHED_FIELDS = ("content", "model_used")
+
+    @staticmethod
+    def make_key(processed_data, system_prompt, model_tier):
+        """Build a stable hash from the normalized request payload."""
+        payload = json.dumps(
+            {
+                "data": _normalize(processed_data),
+                "prompt": _normalize(system_prompt),
+                "tier": model_tier
+            },
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def set(self, key, result):
+        super().set(key, {field: result[field] for field in self.CACHED_FIELDS if field in result})
+
+def _normalize(value):
+    """Collapse insignificant whitespace so cosmetic differences share a key."""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+def get_analysis_cache():
+    """Return the process-wide analysis cache shared by all sessions."""
+    global _analysis_cache
+    with _analysis_cache_lock:
+        if _analysis_cache is None:
+            tiers = [MemoryCache(ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_TTL_SECONDS)]
+            if ANALYSIS_CACHE_DB_PATH:
+                try:
+                    tiers.append(SQLiteCache(
+                        ANALYSIS_CACHE_DB_PATH,
+                        ANALYSIS_CACHE_TTL_SECONDS,
+                        table="analysis_cache"
+                    ))
+                except Exception as e:
+                    logger.error(f"Failed to open analysis cache database: {str(e)}")
+            _analysis_cache = AnalysisCache(tiers)
+        return _analysis_cache
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+def get_extraction_cache():
+    """Return the process-wide PDF extraction cache, keyed by SHA-256 of the file bytes."""
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            tiers = [MemoryCache(
+                max_entries=10000,
+                ttl_seconds=EXTRACTION_CACHE_TTL_SECONDS,
+                max_bytes=EXTRACTION_CACHE_MAX_BYTES,
+                size_of=lambda value: len(value.get("text") or "") + len(value.get("error") or "")
+            )]
+            if EXTRACTION_CACHE_DB_PATH:
+                try:
+                    tiers.append(SQLiteCache(
+                        EXTRACTION_CACHE_DB_PATH,
+                        EXTRACTION_CACHE_TTL_SECONDS,
+                        table="extraction_cache"
+                    ))
+                except Exception as e:
+                    logger.error(f"Failed to open extraction cache database: {str(e)}")
+            _extraction_cache = TieredCache(tiers)
+        return _extraction_cache
+
+_session_list_cache = None
+_session_list_cache_lock = threading.Lock()
+
+def get_session_list_cache():
+    """Return the process-wide cache of the sidebar sessions loaded for each user."""
+    global _session_list_cache
+    with _session_list_cache_lock:
+        if _session_list_cache is None:
+            _session_list_cache = MemoryCache(max_entries=10000, ttl_seconds=SESSION_LIST_CACHE_TTL_SECONDS)
+        return _session_list_cache
+
+_user_profile_cache = None
+_user_profile_cache_lock = threading.Lock()
+
+def get_user_profile_cache():
+    """Return the process-wide cache of users table rows by user id."""
+    global _user_profile_cache
+    with _user_profile_cache_lock:
+        if _user_profile_cache is None:
+            _user_profile_cache = MemoryCache(max_entries=10000, ttl_seconds=USER_PROFILE_CACHE_TTL_SECONDS)
+        return _user_profile_cache
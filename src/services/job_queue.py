@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.app_config import (
+    ANALYSIS_WORKERS,
+    ANALYSIS_QUEUE_MAX_PENDING,
+    ANALYSIS_JOB_RETENTION_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class AnalysisJob:
+    """A single analysis running in the background, keyed by chat session and message id."""
+
+    def __init__(self, session_id, message_id, run, persist, context=None):
+        self.session_id = session_id
+        self.message_id = message_id
+        self.run = run
+        self.persist = persist
+        self.context = context
+        self.status = QUEUED
+        self.content = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        return (self.session_id, self.message_id)
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def snapshot(self):
+        """Consistent view of the job for rendering."""
+        with self._lock:
+            return {
+                "session_id": self.session_id,
+                "message_id": self.message_id,
+                "status": self.status,
+                "content": self.content,
+                "result": self.result,
+                "error": self.error
+            }
+
+    def _apply(self, event):
+        with self._lock:
+            if event["type"] == "token":
+                self.content += event["content"]
+            elif event["type"] == "reset":
+                self.content = ""
+            elif event["type"] == "done":
+                self.result = event["result"]
+
+    def _finish(self, status, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+
+class AnalysisJobQueue:
+    """
+    Bounded worker pool running analyses off the Streamlit script thread.
+    `run` must return a ModelManager stream event generator and must not use
+    st.session_state; `persist` receives the final result and hands it to the
+    write-behind message writer, so it returns before the message is in the database.
+    """
+
+    def __init__(self, max_workers, max_pending, retention_seconds):
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, message_id, run, persist, context=None):
+        """Queue a job; returns None if the queue is full."""
+        self._cleanup()
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                return None
+            job = AnalysisJob(session_id, message_id, run, persist, context)
+            self._jobs[job.key] = job
+        self._executor.submit(self._execute, job)
+        return job
+
+    def get(self, session_id, message_id):
+        with self._lock:
+            return self._jobs.get((session_id, message_id))
+
+    def jobs_for_session(self, session_id):
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.session_id == session_id]
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def _execute(self, job):
+        with job._lock:
+            job.status = RUNNING
+        try:
+            for event in job.run():
+                job._apply(event)
+
+            result = job.result or {"success": False, "error": "Analysis ended unexpectedly"}
+            if not result["success"]:
+                job._finish(FAILED, result.get("error"))
+                return
+
+            job.persist(result)
+            job._finish(DONE)
+        except Exception as e:
+            logger.exception("Analysis job failed")
+            job._finish(FAILED, str(e))
+
+    def _cleanup(self):
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [key for key, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]
+            for key in expired:
+                del self._jobs[key]
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Return the process-wide analysis job queue."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = AnalysisJobQueue(
+                ANALYSIS_WORKERS,
+                ANALYSIS_QUEUE_MAX_PENDING,
+                ANALYSIS_JOB_RETENTION_SECONDS
+            )
+        return _job_queue
@@ -0,0 +1,212 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config.app_config import (
+    KNOWLEDGE_DB_PATH,
+    KNOWLEDGE_MAX_INSIGHTS_PER_KEY,
+    KNOWLEDGE_CONTEXT_ITEMS
+)
+from utils.indicator_matcher import IndicatorMatcher
+
+logger = logging.getLogger(__name__)
+
+# Health indicators the knowledge base learns about
+KEY_INDICATORS = [
+    "hemoglobin", "glucose", "cholesterol", "triglycerides",
+    "hdl", "ldl", "wbc", "rbc", "platelet", "creatinine"
+]
+
+class MemoryKnowledgeStore:
+    """
+    Insights indexed by (user, indicator, profile), kept for this process only.
+    Each key holds at most max_per_key insights, least recently used evicted first.
+    """
+
+    def __init__(self, max_per_key):
+        self.max_per_key = max_per_key
+        self._insights = {}
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id, indicator, profile, insight):
+        with self._lock:
+            insights = self._insights.setdefault((user_id, indicator, profile), OrderedDict())
+            insights[insight] = None
+            insights.move_to_end(insight)
+            while len(insights) > self.max_per_key:
+                insights.popitem(last=False)
+            self._touch_profile(user_id, indicator, profile)
+
+    def lookup(self, user_id, indicator, profile, limit):
+        """Return up to limit of the user's (profile, insight) pairs, the given profile first, most recent first."""
+        with self._lock:
+            matches = [
+                (profile, insight) for insight in reversed(self._insights.get((user_id, indicator, profile), {}))
+            ]
+            for other in reversed(self._profiles.get((user_id, indicator), {})):
+                if len(matches) >= limit:
+                    break
+                if other != profile:
+                    matches.extend(
+                        (other, insight) for insight in reversed(self._insights[(user_id, indicator, other)])
+                    )
+            matches = matches[:limit]
+            for match_profile, insight in matches:
+                self._insights[(user_id, indicator, match_profile)].move_to_end(insight)
+                self._touch_profile(user_id, indicator, match_profile)
+            return matches
+
+    def _touch_profile(self, user_id, indicator, profile):
+        profiles = self._profiles.setdefault((user_id, indicator), OrderedDict())
+        profiles[profile] = None
+        profiles.move_to_end(profile)
+
+class SQLiteKnowledgeStore:
+    """Insights in SQLite so learning survives restarts and is shared by worker processes."""
+
+    def __init__(self, path, max_per_key):
+        self.max_per_key = max_per_key
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(knowledge)")}
+        if columns and "user_id" not in columns:
+            # Insights stored before they were scoped by user can't be attributed to anyone
+            self._conn.execute("DROP TABLE knowledge")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS knowledge ("
+            "user_id TEXT NOT NULL, indicator TEXT NOT NULL, profile TEXT NOT NULL, insight TEXT NOT NULL, "
+            "used_at REAL NOT NULL, PRIMARY KEY (user_id, indicator, profile, insight))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_user_id_indicator_used_at "
+            "ON knowledge(user_id, indicator, used_at)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def add(self, user_id, indicator, profile, insight):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO knowledge (user_id, indicator, profile, insight, used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_id, indicator, profile, insight, time.time())
+            )
+            self._conn.execute(
+                "DELETE FROM knowledge WHERE user_id = ? AND indicator = ? AND profile = ? AND insight NOT IN ("
+                "SELECT insight FROM knowledge WHERE user_id = ? AND indicator = ? AND profile = ? "
+                "ORDER BY used_at DESC LIMIT ?)",
+                (user_id, indicator, profile, user_id, indicator, profile, self.max_per_key)
+            )
+            self._conn.commit()
+
+    def lookup(self, user_id, indicator, profile, limit):
+        """Return up to limit of the user's (profile, insight) pairs, the given profile first, most recent first."""
+        with self._lock:
+            matches = self._conn.execute(
+                "SELECT profile, insight FROM knowledge WHERE user_id = ? AND indicator = ? AND profile = ? "
+                "ORDER BY used_at DESC LIMIT ?",
+                (user_id, indicator, profile, limit)
+            ).fetchall()
+            if len(matches) < limit:
+                matches += self._conn.execute(
+                    "SELECT profile, insight FROM knowledge WHERE user_id = ? AND indicator = ? AND profile != ? "
+                    "ORDER BY used_at DESC LIMIT ?",
+                    (user_id, indicator, profile, limit - len(matches))
+                ).fetchall()
+            if matches:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE knowledge SET used_at = ? "
+                    "WHERE user_id = ? AND indicator = ? AND profile = ? AND insight = ?",
+                    [(now, user_id, indicator, match_profile, insight) for match_profile, insight in matches]
+                )
+                self._conn.commit()
+            return matches
+
+class KnowledgeBase:
+    """
+    Learning from a user's previous analyses, shared by all of their sessions.
+    Maps the health indicators found in a report and a patient profile bucket
+    to lines from earlier analyses that discussed the same indicator. Those
+    lines can name the patient, so each user only ever sees their own.
+    """
+
+    def __init__(self, store, indicators=KEY_INDICATORS, context_items=KNOWLEDGE_CONTEXT_ITEMS):
+        self.store = store
+        self.indicators = indicators
+        self.context_items = context_items
+        self.matcher = IndicatorMatcher(indicators)
+
+    def learn(self, data, analysis, user_id):
+        """Store the first analysis line mentioning each indicator found in the report for the user."""
+        found = self.matcher.find(data.get('report', ''))
+        if not found or not user_id:
+            return
+        user_id = str(user_id)
+        profile = profile_bucket(data.get('age'), data.get('gender'))
+
+        for line in analysis.split('\n'):
+            for indicator in self.matcher.find(line) & found:
+                try:
+                    self.store.add(user_id, indicator, profile, line)
+                except Exception as e:
+                    logger.warning(f"Knowledge base update failed: {str(e)}")
+                found.discard(indicator)
+            if not found:
+                break
+
+    def context(self, data, user_id):
+        """Return up to context_items of the user's insights relevant to the report, similar profiles first."""
+        if not user_id:
+            return ""
+        user_id = str(user_id)
+        found = self.matcher.find(data.get('report', ''))
+        profile = profile_bucket(data.get('age'), data.get('gender'))
+
+        context_items = []
+        # Keep KEY_INDICATORS order so the same report always gets the same context
+        for indicator in (i for i in self.indicators if i in found):
+            remaining = self.context_items - len(context_items)
+            if remaining <= 0:
+                break
+            try:
+                matches = self.store.lookup(user_id, indicator, profile, remaining)
+            except Exception as e:
+                logger.warning(f"Knowledge base lookup failed: {str(e)}")
+                return ""
+            for match_profile, insight in matches:
+                label = "similar patient profile" if match_profile == profile else "other patient profile"
+                context_items.append(f"- {indicator} ({label}): {insight}")
+
+        return "\n".join(context_items)
+
+def profile_bucket(age, gender):
+    """Group patients by decade of age and gender, e.g. "40s-female"."""
+    try:
+        age_group = f"{int(age) // 10 * 10}s"
+    except (TypeError, ValueError):
+        age_group = "unknown"
+    return f"{age_group}-{str(gender or 'unknown').lower()}"
+
+_knowledge_base = None
+_knowledge_base_lock = threading.Lock()
+
+def get_knowledge_base():
+    """Return the process-wide knowledge base."""
+    global _knowledge_base
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            store = None
+            if KNOWLEDGE_DB_PATH:
+                try:
+                    store = SQLiteKnowledgeStore(KNOWLEDGE_DB_PATH, KNOWLEDGE_MAX_INSIGHTS_PER_KEY)
+                except Exception as e:
+                    logger.error(f"Failed to open knowledge database: {str(e)}")
+            _knowledge_base = KnowledgeBase(store or MemoryKnowledgeStore(KNOWLEDGE_MAX_INSIGHTS_PER_KEY))
+        return _knowledge_base
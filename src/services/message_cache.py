@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from config.app_config import (
+    MESSAGE_CACHE_REFRESH_SECONDS,
+    MESSAGE_CACHE_TTL_SECONDS,
+    MESSAGE_CACHE_MAX_SESSIONS,
+    MESSAGE_CURSOR_OVERLAP_SECONDS
+)
+from services.cache_service import MemoryCache
+
+class MessageCache:
+    """
+    Chat messages per session, shared by all browser sessions of this process.
+    Each entry keeps messages sorted by created_at, the newest created_at as the
+    cursor for incremental fetches and whether older messages exist.
+    """
+
+    def __init__(self, max_sessions, ttl_seconds, refresh_seconds, overlap_seconds):
+        self.refresh_seconds = refresh_seconds
+        self.overlap_seconds = overlap_seconds
+        self._entries = MemoryCache(max_sessions, ttl_seconds)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return a copy of the entry, or None if the session isn't loaded."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return {**entry, "messages": list(entry["messages"])} if entry else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry["checked_at"] < self.refresh_seconds
+
+    def fetch_since(self, entry):
+        """created_at to fetch newer rows from; slightly before the cursor so late writes aren't missed."""
+        if not entry["cursor"]:
+            return None
+        try:
+            cursor = datetime.fromisoformat(entry["cursor"].replace('Z', '+00:00'))
+        except ValueError:
+            return entry["cursor"]
+        return (cursor - timedelta(seconds=self.overlap_seconds)).isoformat()
+
+    def store(self, session_id, rows, has_earlier):
+        """Replace a session's entry with freshly loaded rows."""
+        with self._lock:
+            self._entries.set(session_id, self._entry(_sorted(rows), has_earlier))
+
+    def merge(self, session_id, rows, has_earlier=None, checked=False):
+        """
+        Add rows to a loaded session, replacing any with the same id.
+        has_earlier updates whether older messages exist (after loading an older page);
+        checked=True records that the rows came from a database check.
+        Does nothing if the session isn't loaded; it is fetched in full on next read.
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            by_id = {message['id']: message for message in entry["messages"]}
+            by_id.update((row['id'], row) for row in rows)
+            updated = self._entry(
+                _sorted(by_id.values()),
+                entry["has_earlier"] if has_earlier is None else has_earlier
+            )
+            if not checked:
+                updated["checked_at"] = entry["checked_at"]
+            self._entries.set(session_id, updated)
+
+    def append(self, session_id, message):
+        """Add a message this process just saved without waiting for the next fetch."""
+        self.merge(session_id, [message])
+
+    def drop(self, session_id):
+        with self._lock:
+            self._entries.delete(session_id)
+
+    def _entry(self, messages, has_earlier):
+        return {
+            "messages": messages,
+            "cursor": messages[-1]['created_at'] if messages else None,
+            "has_earlier": has_earlier,
+            "checked_at": time.time()
+        }
+
+def _sorted(rows):
+    return sorted(rows, key=lambda message: (message['created_at'], str(message['id'])))
+
+_message_cache = None
+_message_cache_lock = threading.Lock()
+
+def get_message_cache():
+    """Return the process-wide chat message cache."""
+    global _message_cache
+    with _message_cache_lock:
+        if _message_cache is None:
+            _message_cache = MessageCache(
+                MESSAGE_CACHE_MAX_SESSIONS,
+                MESSAGE_CACHE_TTL_SECONDS,
+                MESSAGE_CACHE_REFRESH_SECONDS,
+                MESSAGE_CURSOR_OVERLAP_SECONDS
+            )
+        return _message_cache
@@ -0,0 +1,289 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import httpx
+from config.app_config import (
+    MESSAGE_WRITE_BATCH_SIZE,
+    MESSAGE_WRITE_FLUSH_SECONDS,
+    MESSAGE_WRITE_RETRY_MAX_SECONDS,
+    MESSAGE_SPOOL_PATH
+)
+
+logger = logging.getLogger(__name__)
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages.
+    Messages are appended to a local spool file and returned to the caller right
+    away; a background thread bulk inserts them when batch_size are waiting or
+    flush_seconds have passed. Inserts that fail because the database is
+    unreachable are retried with backoff; rows the database rejects are dropped.
+    Each process spools to its own file next to spool_path, and on start takes
+    over the spools of processes that are no longer running.
+    Messages must carry their own id so retried inserts are idempotent.
+    """
+
+    def __init__(self, insert, spool_path=None, batch_size=MESSAGE_WRITE_BATCH_SIZE,
+                 flush_seconds=MESSAGE_WRITE_FLUSH_SECONDS,
+                 retry_max_seconds=MESSAGE_WRITE_RETRY_MAX_SECONDS):
+        self.insert = insert
+        self.spool_path = _process_spool_path(spool_path) if spool_path else None
+        self.base_spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.written = 0
+        self.rejected = 0
+        self.failed_flushes = 0
+        self._pending = []
+        self._load_spool()
+        self._oldest_at = 0.0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._flushing = False
+        self._forced = False
+        self._condition = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message):
+        """
+        Queue a message for insertion. It is in the spool, and so survives a crash,
+        once this returns; if the spool can't be written that is logged and the
+        message is only kept in memory until it is sent.
+        """
+        with self._condition:
+            if not self._pending:
+                self._oldest_at = time.time()
+            self._pending.append(message)
+            self._condition.notify_all()
+        # Outside the condition so the fsync doesn't hold up the flusher or other sessions.
+        # If the flusher rewrites the spool first, the rewrite already has this message;
+        # a copy appended after it was sent is resent on restart, which the id makes harmless.
+        try:
+            self._append_spool(message)
+        except OSError as e:
+            logger.error(f"Could not spool chat message {message['id']}, keeping it in memory only: {str(e)}")
+
+    def pending(self, session_id):
+        """Messages for a session not yet in the database, for read-your-writes."""
+        with self._condition:
+            return [message for message in self._pending if message['session_id'] == session_id]
+
+    def discard(self, session_id):
+        """Drop unsent messages of a deleted session."""
+        with self._condition:
+            self._pending = [message for message in self._pending if message['session_id'] != session_id]
+            self._rewrite_spool()
+
+    def flush(self, timeout=None):
+        """Wait until every queued message is written; returns False on timeout."""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            self._forced = True
+            self._retry_at = 0.0
+            self._condition.notify_all()
+            while self._pending or self._flushing:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._forced = False
+                    return False
+                self._condition.wait(remaining)
+            self._forced = False
+            return True
+
+    def stats(self):
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "written": self.written,
+                "rejected": self.rejected,
+                "failed_flushes": self.failed_flushes
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._pending:
+                        self._condition.wait()
+                        continue
+                    due_at = self._oldest_at + self.flush_seconds
+                    if self._forced or len(self._pending) >= self.batch_size:
+                        due_at = 0.0
+                    wake_at = max(due_at, self._retry_at)
+                    if time.time() >= wake_at:
+                        break
+                    self._condition.wait(wake_at - time.time())
+                batch = self._pending[:self.batch_size]
+                self._flushing = True
+
+            sent, rejected = self._send(batch)
+
+            with self._condition:
+                done = {message['id'] for message in sent + rejected}
+                self._pending = [message for message in self._pending if message['id'] not in done]
+                self.written += len(sent)
+                self.rejected += len(rejected)
+                if done:
+                    self._failures = 0
+                    self._retry_at = 0.0
+                    self._rewrite_spool()
+                else:
+                    self._failures += 1
+                    self.failed_flushes += 1
+                    self._retry_at = time.time() + min(self.retry_max_seconds, 2 ** self._failures)
+                self._flushing = False
+                self._condition.notify_all()
+
+    def _send(self, batch):
+        """Insert a batch; returns (sent, rejected) messages."""
+        try:
+            self.insert(batch)
+            return batch, []
+        except Exception as e:
+            if _is_outage(e):
+                logger.warning(f"Bulk insert of {len(batch)} chat messages failed, will retry: {str(e)}")
+                return [], []
+            logger.warning(f"Bulk insert of {len(batch)} chat messages was rejected: {str(e)}")
+
+        # Insert one by one so a single bad row doesn't hold back the rest
+        sent, rejected = [], []
+        for message in batch:
+            try:
+                self.insert([message])
+                sent.append(message)
+            except Exception as e:
+                if _is_outage(e):
+                    # The database went away midway; keep the rest for the retry
+                    break
+                logger.error(f"Dropping chat message {message['id']} rejected by the database: {str(e)}")
+                rejected.append(message)
+        return sent, rejected
+
+    def _load_spool(self):
+        """Take over unsent messages from earlier runs into our own spool."""
+        if not self.spool_path:
+            return
+        messages = []
+        for path in self._claim_spools():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A crash mid-write leaves a partial last line
+                        continue
+        # The same message can be in two spools if a claim was interrupted
+        messages = list({message['id']: message for message in messages}.values())
+        if messages:
+            logger.info(f"Resending {len(messages)} chat messages from {self.base_spool_path}")
+        self._pending = messages
+        self._rewrite_spool()
+        for path in self._claimed:
+            os.remove(path)
+
+    def _claim_spools(self):
+        """
+        Our own spool plus those left behind by stopped processes. Each orphan is
+        renamed to a name of ours first, so two starting processes never both take it.
+        """
+        self._claimed = []
+        paths = [self.spool_path] if os.path.exists(self.spool_path) else []
+        root, ext = os.path.splitext(self.base_spool_path)
+        orphans = [self.base_spool_path] + glob.glob(f"{glob.escape(root)}.*{ext}")
+        for path in orphans:
+            if path == self.spool_path or not os.path.exists(path) or _owner_running(path, root, ext):
+                continue
+            claimed = f"{self.spool_path}.claimed-{len(self._claimed)}"
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                # Another process claimed it first
+                continue
+            self._claimed.append(claimed)
+        # Claims an earlier start of this process did not get to finish
+        self._claimed += [path for path in glob.glob(f"{glob.escape(self.spool_path)}.claimed-*")
+                          if path not in self._claimed]
+        return paths + self._claimed
+
+    def _append_spool(self, message):
+        if not self.spool_path:
+            return
+        directory = os.path.dirname(self.spool_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(message, default=str) + "\n"
+        with self._spool_lock, open(self.spool_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_spool(self):
+        if not self.spool_path:
+            return
+        if not self._pending:
+            if os.path.exists(self.spool_path):
+                os.remove(self.spool_path)
+            return
+        temp_path = self.spool_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for message in self._pending:
+                f.write(json.dumps(message, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.spool_path)
+
+def _process_spool_path(spool_path):
+    """This process's spool: spool_path with the pid before the extension."""
+    root, ext = os.path.splitext(spool_path)
+    return f"{root}.{os.getpid()}{ext}"
+
+def _owner_running(path, root, ext):
+    """Whether the process whose pid is in a spool file name is still running."""
+    pid = path[len(root) + 1:len(path) - len(ext)]
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+def _is_outage(error):
+    """Whether an insert failed because the database was unreachable, not because it rejected the rows."""
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        # Locked or busy database, or a disk error; schema errors are permanent
+        return "no such" not in str(error)
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if str(status) in ("408", "429", "500", "502", "503", "504"):
+        return True
+    # PostgREST errors carry a SQLSTATE or PGRST code, not the HTTP status: connection
+    # exceptions (08xxx), server shutdown (57P01-57P03) and PostgREST losing its database
+    code = str(getattr(error, "code", None) or "")
+    return code.startswith(("08", "57P0", "PGRST00"))
+
+_message_writer = None
+_message_writer_lock = threading.Lock()
+
+def get_message_writer(repository):
+    """Return the process-wide chat message writer, bound to the first chat repository passed in."""
+    global _message_writer
+    with _message_writer_lock:
+        if _message_writer is None:
+            _message_writer = MessageWriter(repository.insert_messages, spool_path=MESSAGE_SPOOL_PATH)
+            # Give queued messages a chance to reach the database on a clean shutdown
+            atexit.register(_message_writer.flush, MESSAGE_WRITE_FLUSH_SECONDS * 10)
+        return _message_writer
@@ -0,0 +1,240 @@
+import hashlib
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+from config.app_config import (
+    NEAR_DUPLICATE_THRESHOLD,
+    NEAR_DUPLICATE_NUM_PERM,
+    NEAR_DUPLICATE_BANDS,
+    NEAR_DUPLICATE_MAX_ENTRIES,
+    NEAR_DUPLICATE_TTL_SECONDS
+)
+from services.knowledge_store import profile_bucket
+from utils.lab_parser import format_value
+
+# Mersenne prime for the MinHash permutations; 31-bit values keep a*x+b within uint64
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_SIZE = 3
+
+DATE = re.compile(r"\b\d{1,4}\s*[/.-]\s*\d{1,2}\s*[/.-]\s*\d{1,4}\b")
+IDENTITY_LINE = re.compile(
+    r"^(\W*(?:patient(?:'s)?\s*name|patient|name)\W*?\s*[:\-]\s*\**\s*)[^\n*]*",
+    re.IGNORECASE | re.MULTILINE
+)
+TIME = re.compile(r"\b\d{1,2}:\d{2}(:\d{2})?\s*(am|pm)?\b", re.IGNORECASE)
+
+def normalize_report(text):
+    """Lowercase, mask dates and times, and collapse whitespace so re-exports compare equal."""
+    text = DATE.sub("<date>", text.lower())
+    text = TIME.sub("<time>", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+class MinHasher:
+    """MinHash signatures of word shingles, vectorized with NumPy."""
+
+    def __init__(self, num_perm=NEAR_DUPLICATE_NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        words = normalize_report(text).split()
+        shingles = {
+            " ".join(words[i:i + SHINGLE_SIZE])
+            for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+        }
+        hashes = np.array(
+            [zlib.crc32(shingle.encode("utf-8")) % MERSENNE_PRIME for shingle in shingles],
+            dtype=np.uint64
+        )
+        return ((np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME).min(axis=0)
+
+def flag_signature(lab_panel):
+    """The out-of-range analytes and their direction; near duplicates must match exactly."""
+    return tuple(sorted(
+        (_analyte_key(value["analyte"]), value["status"])
+        for value in lab_panel or [] if value["status"] in ("low", "high")
+    ))
+
+def _analyte_key(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+def _patient_identity(processed_data):
+    return re.sub(r"\s+", " ", str(processed_data.get("patient_name") or "")).strip().lower()
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of analyzed reports for reusing analyses of nearly identical ones.
+    A report only matches an earlier one from the same user and patient, with the
+    same profile bucket, system prompt and out-of-range analytes, whose estimated
+    shingle similarity is at least threshold; analyses are never shared between
+    users. Entries are evicted oldest first.
+    """
+
+    def __init__(self, threshold, num_perm, bands, max_entries, ttl_seconds):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hasher = MinHasher(num_perm)
+        self.lookups = 0
+        self.hits = 0
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _scope(self, processed_data, system_prompt, user_id):
+        payload = "|".join([
+            str(user_id or ""),
+            _patient_identity(processed_data),
+            profile_bucket(processed_data.get("age"), processed_data.get("gender")),
+            repr(flag_signature(processed_data.get("lab_panel"))),
+            system_prompt
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _band_keys(self, scope, signature):
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def find(self, processed_data, system_prompt, user_id=None):
+        """
+        Return {"result", "similarity"} for the closest near duplicate of this user's, or None.
+        The cached analysis is adapted to the new values before it is returned.
+        """
+        if not isinstance(processed_data, dict) or not processed_data.get("lab_panel"):
+            return None
+        scope = self._scope(processed_data, system_prompt, user_id)
+        signature = self.hasher.signature(processed_data["report"])
+
+        best, best_similarity = None, 0.0
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for key in self._band_keys(scope, signature):
+                candidates |= self._buckets.get(key, set())
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry["expires_at"] < time.time():
+                    continue
+                similarity = float(np.mean(entry["signature"] == signature))
+                if similarity >= self.threshold and similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+            if best is None:
+                return None
+            self.hits += 1
+
+        content = adapt_analysis(
+            best["result"]["content"], best["lab_panel"], processed_data["lab_panel"],
+            old_name=best["patient_name"], new_name=processed_data.get("patient_name")
+        )
+        return {"result": {**best["result"], "content": content}, "similarity": best_similarity}
+
+    def add(self, processed_data, system_prompt, result, user_id=None):
+        """Index a successful analysis of a user's report."""
+        if not isinstance(processed_data, dict) or not processed_data.get("lab_panel"):
+            return
+        scope = self._scope(processed_data, system_prompt, user_id)
+        signature = self.hasher.signature(processed_data["report"])
+        band_keys = self._band_keys(scope, signature)
+
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "signature": signature,
+                "band_keys": band_keys,
+                "lab_panel": processed_data["lab_panel"],
+                "patient_name": processed_data.get("patient_name") or "",
+                "result": {"content": result["content"], "model_used": result.get("model_used")},
+                "expires_at": time.time() + self.ttl_seconds
+            }
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def _evict(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for key in entry["band_keys"]:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def stats(self):
+        """Lookups, and how many model calls near-duplicate hits saved."""
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "llm_calls_saved": self.hits,
+                "entries": len(self._entries)
+            }
+
+def adapt_analysis(content, old_panel, new_panel, old_name=None, new_name=None):
+    """
+    Update the patient identity and values quoted in a reused analysis to the new report's
+    and note what changed. Only values whose category didn't change reach here, so the
+    findings still apply.
+    """
+    content = _replace_identity(content, old_name, new_name)
+    old_values = {_analyte_key(value["analyte"]): value for value in old_panel}
+    changes = []
+    for value in new_panel:
+        old = old_values.get(_analyte_key(value["analyte"]))
+        if old is None or old["value"] == value["value"]:
+            continue
+        old_text, new_text = format_value(old["value"]), format_value(value["value"])
+        # Replace the old number where it follows the analyte name on the same line
+        content = re.sub(
+            rf"({re.escape(value['analyte'])}[^\n]{{0,40}}?)(?<![\d.]){re.escape(old_text)}(?![\d.])",
+            lambda match: match.group(1) + new_text,
+            content,
+            flags=re.IGNORECASE
+        )
+        unit = f" {value['unit']}" if value.get("unit") else ""
+        changes.append(f"{value['analyte']} {old_text} → {new_text}{unit}")
+
+    if changes:
+        content += (
+            "\n\n*Adapted from the analysis of a near-identical report. Changed values: "
+            + "; ".join(changes) + "*"
+        )
+    return content
+
+def _replace_identity(content, old_name, new_name):
+    """Rewrite "Patient: ..." / "Name: ..." lines and other mentions of the old name."""
+    new_name = (new_name or "").strip()
+    content = IDENTITY_LINE.sub(lambda match: match.group(1) + new_name, content)
+    if old_name and old_name.strip() and old_name.strip() != new_name:
+        content = re.sub(rf"\b{re.escape(old_name.strip())}\b", new_name, content, flags=re.IGNORECASE)
+    return content
+
+_near_duplicate_index = None
+_near_duplicate_index_lock = threading.Lock()
+
+def get_near_duplicate_index():
+    """Return the process-wide near-duplicate index."""
+    global _near_duplicate_index
+    with _near_duplicate_index_lock:
+        if _near_duplicate_index is None:
+            _near_duplicate_index = NearDuplicateIndex(
+                NEAR_DUPLICATE_THRESHOLD,
+                NEAR_DUPLICATE_NUM_PERM,
+                NEAR_DUPLICATE_BANDS,
+                NEAR_DUPLICATE_MAX_ENTRIES,
+                NEAR_DUPLICATE_TTL_SECONDS
+            )
+        return _near_duplicate_index
@@ -0,0 +1,219 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from config.app_config import (
+    ANALYSIS_DAILY_LIMIT,
+    QUOTA_WINDOW_SECONDS,
+    QUOTA_BACKEND,
+    QUOTA_DB_PATH,
+    QUOTA_CACHE_TTL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+class SupabaseQuotaStore:
+    """
+    Usage rows in the Supabase `usage` table; see consume_analysis_quota in my_database_setup.sql.
+    Every call is made with the requesting user's access token, and the database takes
+    the user from it and applies its own limit and window, so user_id, limit and
+    window_seconds only matter to the other stores.
+    """
+
+    def __init__(self, user_clients):
+        self.user_clients = user_clients
+
+    def consume(self, user_id, limit, window_seconds, access_token=None):
+        result = self.user_clients.get(access_token).rpc('consume_analysis_quota', {}).execute()
+        row = result.data[0]
+        return row['allowed'], row['used'], _parse_timestamp(row['oldest']), row['usage_id']
+
+    def usage(self, user_id, window_seconds, access_token=None):
+        since = datetime.now(timezone.utc) - timedelta(seconds=window_seconds)
+        result = self.user_clients.get(access_token).from_('usage')\
+            .select('created_at', count='exact')\
+            .eq('user_id', user_id)\
+            .gt('created_at', since.isoformat())\
+            .order('created_at')\
+            .limit(1)\
+            .execute()
+        oldest = _parse_timestamp(result.data[0]['created_at']) if result.data else None
+        return result.count or 0, oldest
+
+    def release(self, usage_id, access_token=None):
+        self.user_clients.get(access_token).from_('usage').delete().eq('id', usage_id).execute()
+
+class SQLiteQuotaStore:
+    """Local stand-in for the usage table, shared by worker processes on one machine."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_usage_user_id_created_at ON usage(user_id, created_at)"
+        )
+        self._lock = threading.Lock()
+
+    def _usage(self, user_id, since):
+        used, oldest = self._conn.execute(
+            "SELECT COUNT(*), MIN(created_at) FROM usage WHERE user_id = ? AND created_at > ?",
+            (user_id, since)
+        ).fetchone()
+        return used, oldest
+
+    def consume(self, user_id, limit, window_seconds, access_token=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                used, oldest = self._usage(user_id, now - window_seconds)
+                usage_id = None
+                if used < limit:
+                    usage_id = str(uuid.uuid4())
+                    self._conn.execute(
+                        "INSERT INTO usage (id, user_id, created_at) VALUES (?, ?, ?)",
+                        (usage_id, user_id, now)
+                    )
+                    used += 1
+                    oldest = oldest or now
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return usage_id is not None, used, _from_epoch(oldest), usage_id
+
+    def usage(self, user_id, window_seconds, access_token=None):
+        with self._lock:
+            used, oldest = self._usage(user_id, time.time() - window_seconds)
+        return used, _from_epoch(oldest)
+
+    def release(self, usage_id, access_token=None):
+        with self._lock:
+            self._conn.execute("DELETE FROM usage WHERE id = ?", (usage_id,))
+
+class QuotaService:
+    """
+    Per-user analysis quota over a sliding window, enforced by a persistent store.
+    Remaining counts are cached briefly so rendering the sidebar doesn't query
+    the store on every rerun; consuming always goes to the store.
+    access_token is the user's Supabase token, which the Supabase store acts with.
+    """
+
+    def __init__(self, store, limit, window_seconds, cache_ttl):
+        self.store = store
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _usage(self, user_id, access_token):
+        with self._lock:
+            cached = self._cache.get(user_id)
+        if cached and time.time() - cached[0] < self.cache_ttl:
+            return cached[1], cached[2]
+        used, oldest = self.store.usage(user_id, self.window_seconds, access_token=access_token)
+        self._remember(user_id, used, oldest)
+        return used, oldest
+
+    def _remember(self, user_id, used, oldest):
+        with self._lock:
+            self._cache[user_id] = (time.time(), used, oldest)
+
+    def _limit_message(self, oldest):
+        reset_at = (oldest or datetime.now(timezone.utc)) + timedelta(seconds=self.window_seconds)
+        time_until_reset = max(timedelta(0), reset_at - datetime.now(timezone.utc))
+        hours, remainder = divmod(int(time_until_reset.total_seconds()), 3600)
+        minutes, _ = divmod(remainder, 60)
+        return f"Daily limit reached. Reset in {hours}h {minutes}m"
+
+    def remaining(self, user_id, access_token=None):
+        """Analyses left in the current window (may be up to cache_ttl seconds stale)."""
+        try:
+            used, _ = self._usage(user_id, access_token)
+        except Exception as e:
+            logger.warning(f"Quota lookup failed: {str(e)}")
+            return self.limit
+        return max(0, self.limit - used)
+
+    def check(self, user_id, access_token=None):
+        """Check whether the user has quota left without using any."""
+        try:
+            used, oldest = self._usage(user_id, access_token)
+        except Exception as e:
+            logger.warning(f"Quota lookup failed: {str(e)}")
+            return True, None
+        if used >= self.limit:
+            return False, self._limit_message(oldest)
+        return True, None
+
+    def consume(self, user_id, access_token=None):
+        """
+        Atomically check the quota and record one analysis.
+        Returns (allowed, error_msg, usage_id); pass usage_id to release() if the analysis fails.
+        """
+        try:
+            allowed, used, oldest, usage_id = self.store.consume(
+                user_id, self.limit, self.window_seconds, access_token=access_token
+            )
+        except Exception as e:
+            # Don't block analyses because the usage store is unreachable
+            logger.warning(f"Quota update failed: {str(e)}")
+            return True, None, None
+        self._remember(user_id, used, oldest)
+        if not allowed:
+            return False, self._limit_message(oldest), None
+        return True, None, usage_id
+
+    def release(self, user_id, usage_id, access_token=None):
+        """Give back an analysis that was consumed but not delivered."""
+        if not usage_id:
+            return
+        try:
+            self.store.release(usage_id, access_token=access_token)
+        except Exception as e:
+            logger.warning(f"Quota release failed: {str(e)}")
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _from_epoch(value):
+    return datetime.fromtimestamp(value, timezone.utc) if value else None
+
+_quota_service = None
+_quota_service_lock = threading.Lock()
+
+def get_quota_service(user_clients=None):
+    """
+    Return the process-wide quota service.
+    `user_clients` is the auth.user_client.UserClients used when QUOTA_BACKEND is "supabase".
+    """
+    global _quota_service
+    with _quota_service_lock:
+        if _quota_service is None:
+            if QUOTA_BACKEND == "supabase" and user_clients is not None:
+                store = SupabaseQuotaStore(user_clients)
+            else:
+                store = SQLiteQuotaStore(QUOTA_DB_PATH)
+            _quota_service = QuotaService(
+                store,
+                ANALYSIS_DAILY_LIMIT,
+                QUOTA_WINDOW_SECONDS,
+                QUOTA_CACHE_TTL_SECONDS
+            )
+        return _quota_service
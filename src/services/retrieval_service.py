@@ -0,0 +1,245 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import numpy as np
+from config.app_config import (
+    RETRIEVAL_DB_PATH,
+    RETRIEVAL_VECTOR_DIM,
+    RETRIEVAL_EXAMPLES,
+    RETRIEVAL_MIN_SIMILARITY
+)
+
+logger = logging.getLogger(__name__)
+
+# Distance from the middle of the reference range is capped so one extreme value can't dominate
+MAX_Z_SCORE = 5.0
+
+def vectorize_panel(lab_panel, dim=RETRIEVAL_VECTOR_DIM):
+    """
+    Turn a parsed lab panel into a unit vector of analyte z-scores.
+    Each value is scored against its reference range (0 in the middle, +/-1 at
+    the limits) and hashed into a fixed number of dimensions by analyte name.
+    Returns None if no value has a reference range.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for result in lab_panel or []:
+        z = _z_score(result["value"], result.get("low"), result.get("high"))
+        if z is None:
+            continue
+        digest = zlib.crc32(_analyte_key(result["analyte"]).encode("utf-8"))
+        # The sign bit keeps colliding analytes from always adding up
+        sign = 1.0 if digest & 1 else -1.0
+        vector[(digest >> 1) % dim] += sign * z
+
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return None
+    return vector / norm
+
+def _z_score(value, low, high):
+    if low is not None and high is not None and high > low:
+        middle, half_width = (low + high) / 2, (high - low) / 2
+    elif high is not None and high > 0:
+        # "<200": treat the range as 0-200
+        middle, half_width = high / 2, high / 2
+    elif low is not None and low > 0:
+        # ">40": treat the range as 40-80
+        middle, half_width = low * 1.5, low / 2
+    else:
+        return None
+    return float(np.clip((value - middle) / half_width, -MAX_Z_SCORE, MAX_Z_SCORE))
+
+def _analyte_key(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+class VectorIndex:
+    """
+    Unit vectors in one contiguous array with brute-force top-k cosine search.
+    Capacity doubles when full, so adding is amortized O(1).
+    """
+
+    def __init__(self, dim, capacity=1024):
+        self.dim = dim
+        self.size = 0
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def add(self, item_id, vector):
+        with self._lock:
+            if self.size == len(self._ids):
+                self._grow()
+            self._vectors[self.size] = vector
+            self._ids[self.size] = item_id
+            self.size += 1
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self.size] = self._vectors[:self.size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self._ids[:self.size]
+        self._vectors, self._ids = vectors, ids
+
+    def search(self, vector, k):
+        """Return up to k (item_id, similarity) pairs, most similar first."""
+        with self._lock:
+            # Rows below size are never rewritten, so the views stay valid after the lock
+            vectors = self._vectors[:self.size]
+            ids = self._ids[:self.size]
+        if not len(ids) or k <= 0:
+            return []
+
+        scores = vectors @ vector
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return list(zip(ids[top].tolist(), scores[top].tolist()))
+
+class MemoryCaseStore:
+    """Prior cases kept for this process only."""
+
+    def __init__(self):
+        self._cases = {}
+        self._lock = threading.Lock()
+
+    def put(self, user_id, vector, report, analysis):
+        with self._lock:
+            case_id = len(self._cases) + 1
+            self._cases[case_id] = (user_id, vector, report, analysis)
+        return case_id
+
+    def load_since(self, last_id):
+        """(case_id, user_id, vector) of the cases added after last_id."""
+        with self._lock:
+            return [(case_id, case[0], case[1]) for case_id, case in self._cases.items() if case_id > last_id]
+
+    def get(self, case_ids):
+        with self._lock:
+            return {case_id: self._cases[case_id][2:] for case_id in case_ids if case_id in self._cases}
+
+class SQLiteCaseStore:
+    """Prior cases in SQLite so the index survives restarts and is shared by worker processes."""
+
+    def __init__(self, path, dim):
+        self.dim = dim
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(cases)")}
+        if columns and "user_id" not in columns:
+            # Cases stored before they were scoped by user can't be attributed to anyone
+            self._conn.execute("DROP TABLE cases")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cases ("
+            "id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, vector BLOB NOT NULL, report TEXT NOT NULL, "
+            "analysis TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def put(self, user_id, vector, report, analysis):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO cases (user_id, vector, report, analysis, created_at) VALUES (?, ?, ?, ?, ?)",
+                (str(user_id), vector.astype(np.float32).tobytes(), report, analysis, time.time())
+            )
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def load_since(self, last_id):
+        """(case_id, user_id, vector) of the cases added after last_id."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id, vector FROM cases WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+        return [
+            (case_id, user_id, np.frombuffer(blob, dtype=np.float32))
+            for case_id, user_id, blob in rows if len(blob) == self.dim * 4
+        ]
+
+    def get(self, case_ids):
+        if not case_ids:
+            return {}
+        placeholders = ",".join("?" * len(case_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, report, analysis FROM cases WHERE id IN ({placeholders})", list(case_ids)
+            ).fetchall()
+        return {case_id: (report, analysis) for case_id, report, analysis in rows}
+
+class CaseRetriever:
+    """
+    Finds a user's prior (report, analysis) pairs with similar lab panels.
+    Analyses name the patient, so cases are only ever returned to the user who
+    stored them. Each user's vectors are held in their own VectorIndex; only the
+    matched cases are read back from the store. Cases added by other processes
+    are picked up before each search.
+    """
+
+    def __init__(self, store, dim=RETRIEVAL_VECTOR_DIM):
+        self.store = store
+        self.dim = dim
+        self.indexes = {}
+        self._last_id = 0
+        self._sync_lock = threading.Lock()
+        self._sync()
+
+    def _sync(self):
+        with self._sync_lock:
+            for case_id, user_id, vector in self.store.load_since(self._last_id):
+                if user_id not in self.indexes:
+                    self.indexes[user_id] = VectorIndex(self.dim, capacity=16)
+                self.indexes[user_id].add(case_id, vector)
+                self._last_id = case_id
+
+    def add(self, user_id, lab_panel, report, analysis):
+        """Store a user's case; returns False without a user or if the panel has nothing to compare on."""
+        vector = vectorize_panel(lab_panel, self.dim)
+        if not user_id or vector is None:
+            return False
+        self.store.put(str(user_id), vector, report, analysis)
+        self._sync()
+        return True
+
+    def similar(self, user_id, lab_panel, k=RETRIEVAL_EXAMPLES, min_similarity=RETRIEVAL_MIN_SIMILARITY):
+        """Return up to k {"similarity", "report", "analysis"} dicts of the user's cases, most similar first."""
+        vector = vectorize_panel(lab_panel, self.dim)
+        if not user_id or vector is None:
+            return []
+        self._sync()
+
+        index = self.indexes.get(str(user_id))
+        if index is None:
+            return []
+        matches = [(case_id, score) for case_id, score in index.search(vector, k) if score >= min_similarity]
+        cases = self.store.get([case_id for case_id, _ in matches])
+        return [
+            {"similarity": score, "report": cases[case_id][0], "analysis": cases[case_id][1]}
+            for case_id, score in matches if case_id in cases
+        ]
+
+_case_retriever = None
+_case_retriever_lock = threading.Lock()
+
+def get_case_retriever():
+    """Return the process-wide similar-case retriever."""
+    global _case_retriever
+    with _case_retriever_lock:
+        if _case_retriever is None:
+            store = None
+            if RETRIEVAL_DB_PATH:
+                try:
+                    store = SQLiteCaseStore(RETRIEVAL_DB_PATH, RETRIEVAL_VECTOR_DIM)
+                except Exception as e:
+                    logger.error(f"Failed to open retrieval database: {str(e)}")
+            _case_retriever = CaseRetriever(store or MemoryCaseStore())
+        return _case_retriever
@@ -0,0 +1,51 @@
+from collections import deque
+
+class IndicatorMatcher:
+    """
+    Aho-Corasick matcher that finds which of a fixed set of terms occur in a
+    text in a single pass, regardless of how many terms there are.
+    Matching is case-insensitive and on substrings, like `term in text.lower()`.
+    """
+
+    def __init__(self, terms):
+        self.terms = {term.lower() for term in terms}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+
+        for term in self.terms:
+            state = 0
+            for char in term:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(set())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].add(term)
+
+        # Breadth-first pass to link each state to its longest proper suffix state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """Return the set of terms that occur in text."""
+        found = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                found |= self._output[state]
+                if len(found) == len(self.terms):
+                    break
+        return found
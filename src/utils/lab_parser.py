@@ -0,0 +1,174 @@
+import re
+
+NUMBER = r"[<>]?\s*\d[\d,]*(?:\.\d+)?|[<>]?\s*\.\d+"
+# Units start with a letter, "%" or "/letter" so dates like "15/03/2024" aren't read as values
+UNIT = r"/?[A-Za-zµμ%][^\s()]*"
+
+# "Hemoglobin: 13.5 g/dL (Reference: 12.0-15.5)"
+LABELED_LINE = re.compile(
+    r"^(?P<name>[A-Za-z][^:]{0,60}?)\s*:\s*(?P<value>" + NUMBER + r")\s*(?P<unit>" + UNIT + r")?"
+    r"\s*(?:\((?:reference|ref\.?|normal|range)[^:)]*:?\s*(?P<ref>[^)]*)\))?\s*$",
+    re.IGNORECASE
+)
+
+# "Hemoglobin    13.5   g/dL    12.0 - 15.5"
+TABLE_LINE = re.compile(
+    r"^(?P<name>[A-Za-z][A-Za-z0-9 ()/,.\-]{1,60}?)\s{2,}(?P<value>" + NUMBER + r")\s*(?P<unit>" + UNIT + r")?"
+    r"\s+(?P<ref>[<>]\s*[\d,.]+|[\d,.]+\s*-\s*[\d,.]+)\s*%?\s*$"
+)
+
+RANGE = re.compile(r"^\s*(?P<low>[\d,.]+)\s*(?:-|–|to)\s*(?P<high>[\d,.]+)")
+UPPER_BOUND = re.compile(r"^\s*(?:<|≤|<=|up to)\s*(?P<high>[\d,.]+)", re.IGNORECASE)
+LOWER_BOUND = re.compile(r"^\s*(?:>|≥|>=)\s*(?P<low>[\d,.]+)")
+
+class LabResult:
+    """A single analyte measurement with its reference range."""
+
+    def __init__(self, analyte, value, unit="", low=None, high=None, reference="", section=None):
+        self.analyte = analyte
+        self.value = value
+        self.unit = unit
+        self.low = low
+        self.high = high
+        self.reference = reference
+        self.section = section
+
+    @property
+    def status(self):
+        """"low", "high", "normal", or "unknown" if there is no reference range."""
+        if self.low is None and self.high is None:
+            return "unknown"
+        if self.low is not None and self.value < self.low:
+            return "low"
+        if self.high is not None and self.value > self.high:
+            return "high"
+        return "normal"
+
+    def to_dict(self):
+        return {
+            "analyte": self.analyte,
+            "value": self.value,
+            "unit": self.unit,
+            "low": self.low,
+            "high": self.high,
+            "reference": self.reference,
+            "section": self.section,
+            "status": self.status
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["analyte"], data["value"], data.get("unit", ""), data.get("low"),
+            data.get("high"), data.get("reference", ""), data.get("section")
+        )
+
+    def to_prompt(self):
+        line = f"{self.analyte}: {format_value(self.value)}"
+        if self.unit:
+            line += f" {self.unit}"
+        if self.reference:
+            line += f" [{self.reference}]"
+        if self.status in ("low", "high"):
+            line += f" {self.status.upper()}"
+        return line
+
+class LabPanel:
+    """Parsed lab report: typed results grouped by section plus lines that weren't results."""
+
+    def __init__(self, results, notes):
+        self.results = results
+        self.notes = notes
+
+    @property
+    def abnormal(self):
+        return [result for result in self.results if result.status in ("low", "high")]
+
+    def to_prompt(self):
+        """Serialize the panel compactly for the model prompt."""
+        lines = []
+        section = None
+        for result in self.results:
+            if result.section != section:
+                section = result.section
+                if section:
+                    lines.append(f"## {section}")
+            lines.append(result.to_prompt())
+        if self.notes:
+            lines.append("## Other report lines")
+            lines.extend(self.notes)
+        return "\n".join(lines)
+
+def parse_lab_report(text):
+    """Parse lab report text into a LabPanel."""
+    results = []
+    notes = []
+    seen_notes = set()
+    section = None
+
+    for raw_line in (text or "").splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        result = _parse_line(line, section)
+        if result:
+            results.append(result)
+            continue
+
+        if _is_section_heading(line):
+            section = line
+            continue
+
+        if line not in seen_notes:
+            seen_notes.add(line)
+            notes.append(line)
+
+    return LabPanel(results, notes)
+
+def _parse_line(line, section):
+    match = LABELED_LINE.match(line) or TABLE_LINE.match(line)
+    if not match:
+        return None
+
+    value = _to_number(match.group("value"))
+    if value is None:
+        return None
+
+    unit = (match.group("unit") or "").strip()
+    reference = (match.group("ref") or "").strip()
+    low, high = _parse_reference(reference)
+
+    # "41%" style values leave the unit on the reference ("36-46%")
+    if not unit and reference.endswith("%"):
+        unit = "%"
+
+    return LabResult(match.group("name").strip(), value, unit, low, high, reference, section)
+
+def _parse_reference(reference):
+    if not reference:
+        return None, None
+    match = RANGE.match(reference)
+    if match:
+        return _to_number(match.group("low")), _to_number(match.group("high"))
+    match = UPPER_BOUND.match(reference)
+    if match:
+        return None, _to_number(match.group("high"))
+    match = LOWER_BOUND.match(reference)
+    if match:
+        return _to_number(match.group("low")), None
+    return None, None
+
+def _is_section_heading(line):
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and ":" not in line and all(c.isupper() for c in letters)
+
+def _to_number(value):
+    try:
+        return float(re.sub(r"[<>,\s]", "", value))
+    except (TypeError, ValueError):
+        return None
+
+def format_value(value):
+    """Format a lab value the way it is shown in the compact panel."""
+    return f"{value:g}" if value < 1e6 else f"{value:.0f}"
@@ -1,32 +1,193 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from contextlib import closing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
 import streamlit as st
-from config.app_config import MAX_PDF_PAGES
-from utils.validators import validate_pdf_file, validate_pdf_content
+from config.app_config import (
+    MAX_PDF_PAGES,
+    PDF_PARALLEL_MIN_PAGES,
+    PDF_PAGES_PER_CHUNK,
+    PDF_EXTRACTION_WORKERS,
+    PDF_VALIDATION_PAGES
+)
+from services.cache_service import get_extraction_cache
+from utils.token_budget import PAGE_BREAK
+from utils.validators import (
+    validate_pdf_file,
+    validate_pdf_content,
+    find_medical_terms,
+    MIN_MEDICAL_TERMS,
+    NOT_MEDICAL_REPORT_ERROR
+)
+
+EMPTY_PAGE_ERROR = "Could not extract text from PDF. Please ensure it's not a scanned document."
+
+class PDFExtractionError(Exception):
+    """Extraction stopped early; the message is shown to the user."""
 
 def extract_text_from_pdf(pdf_file):
     """Extract and validate text from PDF file."""
+    _, text_or_error = extract_report(pdf_file)
+    return text_or_error
+
+def extract_report(pdf_file, parallel=True):
+    """
+    Extract and validate a report PDF.
+    Returns (is_valid, text) on success or (False, error message).
+    Results are cached by the SHA-256 of the file bytes, so reruns and repeat
+    uploads of the same report don't run pdfplumber again.
+    Pass parallel=False when already running in a worker process.
+    """
+    # Validate file first
+    is_valid, error = validate_pdf_file(pdf_file)
+    if not is_valid:
+        return False, error
+
+    try:
+        content_hash = hashlib.sha256(_read_bytes(pdf_file)).hexdigest()
+    except Exception as e:
+        return False, f"Error extracting text from PDF: {str(e)}"
+
+    cache = get_extraction_cache()
+    cached = cache.get(content_hash)
+    if cached:
+        return cached["valid"], cached["text"] if cached["valid"] else cached["error"]
+
     try:
-        # Validate file first
-        is_valid, error = validate_pdf_file(pdf_file)
-        if not is_valid:
-            return error
-
-        text = ""
-        with pdfplumber.open(pdf_file) as pdf:
-            if len(pdf.pages) > MAX_PDF_PAGES:
-                return f"PDF exceeds maximum page limit of {MAX_PDF_PAGES}"
-                
-            for page in pdf.pages:
+        is_valid, text_or_error = _extract_and_validate(pdf_file, parallel)
+    except Exception as e:
+        # Unexpected failures aren't cached; they may not happen on the next try
+        return False, f"Error extracting text from PDF: {str(e)}"
+
+    cache.set(content_hash, {
+        "valid": is_valid,
+        "text": text_or_error if is_valid else None,
+        "error": None if is_valid else text_or_error
+    })
+    return is_valid, text_or_error
+
+def _read_bytes(pdf_file):
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    data = pdf_file.read()
+    pdf_file.seek(0)
+    return data
+
+def _extract_and_validate(pdf_file, parallel=True):
+    try:
+        pages = []
+        found_terms = set()
+        with closing(iter_pdf_pages(pdf_file, parallel)) as page_stream:
+            for page_number, extracted in page_stream:
+                pages.append(extracted)
+
+                # Reject non-medical documents from the first pages instead of reading them all
+                if len(found_terms) < MIN_MEDICAL_TERMS:
+                    found_terms |= find_medical_terms(extracted)
+                    if page_number == PDF_VALIDATION_PAGES and len(found_terms) < MIN_MEDICAL_TERMS:
+                        return False, NOT_MEDICAL_REPORT_ERROR
+    except PDFExtractionError as e:
+        return False, str(e)
+
+    # Keep page boundaries so compaction can drop repeated pages
+    text = PAGE_BREAK.join(pages) + "\n"
+
+    # Validate extracted content
+    is_valid, error = validate_pdf_content(text)
+    if not is_valid:
+        return False, error
+
+    return True, text
+
+def iter_pdf_pages(pdf_file, parallel=True):
+    """
+    Yield (page_number, text) for each page in order, as soon as it is extracted.
+    Large PDFs are split into page ranges extracted in parallel worker processes.
+    Raises PDFExtractionError at the first page without text.
+    """
+    with pdfplumber.open(pdf_file) as pdf:
+        page_count = len(pdf.pages)
+        if page_count > MAX_PDF_PAGES:
+            raise PDFExtractionError(f"PDF exceeds maximum page limit of {MAX_PDF_PAGES}")
+
+        if not parallel or page_count < PDF_PARALLEL_MIN_PAGES:
+            for index, page in enumerate(pdf.pages):
                 extracted = page.extract_text()
                 if not extracted:
-                    return "Could not extract text from PDF. Please ensure it's not a scanned document."
-                text += extracted + "\n"
-        
-        # Validate extracted content
-        is_valid, error = validate_pdf_content(text)
-        if not is_valid:
-            return error
-            
-        return text
-    except Exception as e:
-        return f"Error extracting text from PDF: {str(e)}"
+                    raise PDFExtractionError(EMPTY_PAGE_ERROR)
+                yield index + 1, extracted
+            return
+
+    yield from _iter_pages_parallel(pdf_file, page_count)
+
+def _iter_pages_parallel(pdf_file, page_count):
+    pdf_file.seek(0)
+    # Workers open the PDF from a temporary file instead of receiving the bytes pickled per chunk
+    handle, path = tempfile.mkstemp(suffix=".pdf")
+    futures = []
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            temp_file.write(pdf_file.read())
+
+        executor = _get_extraction_pool()
+        futures = [
+            executor.submit(_extract_page_range, path, start, min(start + PDF_PAGES_PER_CHUNK, page_count))
+            for start in range(0, page_count, PDF_PAGES_PER_CHUNK)
+        ]
+        for future in futures:
+            for index, extracted in future.result():
+                if not extracted:
+                    raise PDFExtractionError(EMPTY_PAGE_ERROR)
+                yield index + 1, extracted
+    finally:
+        # Stop extracting once the caller is done (fail fast or early rejection)
+        for future in futures:
+            future.cancel()
+        _remove_when_done(path, futures)
+
+def _extract_page_range(path, start, end):
+    """Extract pages [start, end) in a worker process, stopping at the first empty page."""
+    results = []
+    with pdfplumber.open(path) as pdf:
+        for index in range(start, end):
+            extracted = pdf.pages[index].extract_text() or ""
+            results.append((index, extracted))
+            if not extracted:
+                break
+    return results
+
+def _remove_when_done(path, futures):
+    """Delete the temporary PDF once no running chunk needs it any more."""
+    lock = threading.Lock()
+    remaining = [len(futures)]
+
+    def on_done(_future):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and os.path.exists(path):
+            os.remove(path)
+
+    if not futures:
+        os.remove(path)
+    for future in futures:
+        future.add_done_callback(on_done)
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+def _get_extraction_pool():
+    """Return the process pool shared by all sessions for page extraction."""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            # Forking a threaded server can copy held locks into the child; start clean interpreters instead
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extraction_pool
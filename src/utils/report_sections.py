@@ -0,0 +1,42 @@
+import re
+
+# Report areas from SPECIALIST_PROMPTS["comprehensive_analyst"], matched against section headings
+SECTION_KEYWORDS = [
+    ("Complete Blood Count (CBC)", ("cbc", "blood count", "hemogram", "haemogram", "hematology", "haematology")),
+    ("Liver Function", ("liver", "hepatic", "lft")),
+    ("Pancreatic Markers", ("pancrea", "amylase", "lipase")),
+    ("Metabolic Panel", ("metabolic", "renal", "kidney", "electrolyte", "glucose", "diabet")),
+    ("Lipid Profile", ("lipid", "cholesterol")),
+    ("Thyroid Function", ("thyroid",)),
+    ("Infection & Inflammation", ("infect", "inflamm", "serolog", "immun", "crp"))
+]
+OTHER_SECTION = "Other Findings"
+
+HEADING = re.compile(r"^##\s*(?P<title>.+)$")
+
+def split_sections(report):
+    """
+    Split a compacted report into sections by its "## heading" lines.
+    Headings are mapped to the report areas in SECTION_KEYWORDS; sections that
+    don't match any area are grouped under OTHER_SECTION.
+    Returns a list of (area, text) in order of first appearance.
+    """
+    sections = {}
+    area = OTHER_SECTION
+    for line in report.splitlines():
+        match = HEADING.match(line)
+        if match:
+            area = classify_heading(match.group("title"))
+        sections.setdefault(area, []).append(line)
+
+    return [
+        (name, "\n".join(lines)) for name, lines in sections.items()
+        if any(not HEADING.match(line) for line in lines)
+    ]
+
+def classify_heading(title):
+    title = title.lower()
+    for area, keywords in SECTION_KEYWORDS:
+        if any(keyword in title for keyword in keywords):
+            return area
+    return OTHER_SECTION
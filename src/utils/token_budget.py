@@ -0,0 +1,90 @@
+import re
+from collections import Counter
+from utils.tokens import estimate_tokens
+
+# Page separator used by the PDF extractor
+PAGE_BREAK = "\f"
+
+# Whole lines that carry no clinical information
+BOILERPLATE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"page\s*\d+(\s*(of|/)\s*\d+)?",
+    r"[-=*_\s]*end of (the )?report[-=*_\s]*",
+    r"[-=*_\s]+",
+    r"(strictly |private (and|&) )?confidential( (document|report|information))?[.!]*",
+    r"(this (report|document) (is|was|has been) )?electronically (generated|verified|signed|reported)"
+    r"( report| document| by\b.*)?[.!]*",
+    r"this (is a computer generated|report is (not valid|intended|generated))\b.*",
+    r"(printed|generated|reported) (on|at|by)\b.*",
+    r"(tel|phone|fax|e-?mail|website)\s*[:.].*",
+    r"(www\.|https?://)\S*"
+)]
+
+# A number or a unit such as mg/dL or %: the line may be a result and is never deduplicated
+MEASUREMENT = re.compile(r"\d|%|\b[A-Za-zµμ]+/[A-Za-zµμ]+\b")
+
+# Lines this close to the top or bottom of a page can be running headers or footers
+PAGE_EDGE_LINES = 3
+
+# A bare page number such as "2 of 5" or "2/5"; also the shape of "120/80" and "1/160",
+# so it is only dropped at a page edge and when it counts the report's own pages
+PAGE_NUMBER = re.compile(r"(\d+)\s*(of|/)\s*(\d+)", re.IGNORECASE)
+
+def compact_report(text):
+    """
+    Shrink extracted report text before it is sent to a model.
+    Drops repeated pages and boilerplate lines, and keeps only the first copy
+    of page headers/footers, i.e. lines repeated at the top or bottom of pages.
+    """
+    raw_pages = (text or "").split(PAGE_BREAK)
+    pages = []
+    seen_pages = set()
+    for page in raw_pages:
+        lines = [line.strip() for line in page.splitlines() if line.strip()]
+        signature = "\n".join(lines)
+        if lines and signature not in seen_pages:
+            seen_pages.add(signature)
+            pages.append(lines)
+
+    # Lines at a page edge on at least half the pages (and more than one) are headers or footers
+    edge_counts = Counter(
+        line for lines in pages
+        for line in set(lines[:PAGE_EDGE_LINES] + lines[-PAGE_EDGE_LINES:])
+        if not MEASUREMENT.search(line)
+    )
+    repeated = {line for line, count in edge_counts.items() if count > 1 and count * 2 >= len(pages)}
+
+    compacted = []
+    seen_lines = set()
+    for lines in pages:
+        edges = set(lines[:PAGE_EDGE_LINES] + lines[-PAGE_EDGE_LINES:])
+        for line in lines:
+            if _is_boilerplate(line) or line in seen_lines:
+                continue
+            if line in edges and _is_page_number(line, len(raw_pages)):
+                continue
+            if line in repeated:
+                seen_lines.add(line)
+            compacted.append(line)
+    return "\n".join(compacted)
+
+def truncate_to_tokens(text, max_tokens):
+    """Keep whole lines from the start of text up to roughly max_tokens."""
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+def _is_boilerplate(line):
+    return any(pattern.fullmatch(line) for pattern in BOILERPLATE_PATTERNS)
+
+def _is_page_number(line, page_count):
+    match = PAGE_NUMBER.fullmatch(line)
+    if not match or page_count < 2:
+        return False
+    number, total = int(match.group(1)), int(match.group(3))
+    return total == page_count and 1 <= number <= total
@@ -0,0 +1,15 @@
+import math
+
+# Llama tokenizers average roughly four characters per token on English and lab report text
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text):
+    """Cheap token estimate for a piece of text."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def estimate_message_tokens(messages):
+    """Estimate prompt tokens for a list of chat messages."""
+    return sum(estimate_tokens(m.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
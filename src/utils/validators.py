@@ -1,6 +1,15 @@
 import re
 from config.app_config import MAX_UPLOAD_SIZE_MB
 
+# Common medical report indicators
+MEDICAL_TERMS = [
+    'blood', 'test', 'report', 'laboratory', 'lab', 'patient', 'specimen',
+    'reference range', 'analysis', 'results', 'medical', 'diagnostic',
+    'hemoglobin', 'wbc', 'rbc', 'platelet', 'glucose', 'creatinine'
+]
+MIN_MEDICAL_TERMS = 3
+NOT_MEDICAL_REPORT_ERROR = "The uploaded file doesn't appear to be a medical report. Please upload a valid medical report."
+
 def validate_password(password):
     """Validate password meets security requirements."""
     if len(password) < 8:
@@ -53,22 +62,17 @@ def validate_pdf_file(file):
 
 def validate_pdf_content(text):
     """Validate if the PDF content appears to be a medical report."""
-    # Common medical report indicators
-    medical_terms = [
-        'blood', 'test', 'report', 'laboratory', 'lab', 'patient', 'specimen',
-        'reference range', 'analysis', 'results', 'medical', 'diagnostic',
-        'hemoglobin', 'wbc', 'rbc', 'platelet', 'glucose', 'creatinine'
-    ]
-    
     # Validate minimum text length
     if len(text.strip()) < 50:
         return False, "Extracted text is too short. Please ensure the PDF contains valid text."
     
     # Check for medical terms
-    text_lower = text.lower()
-    term_matches = sum(1 for term in medical_terms if term in text_lower)
-    
-    if term_matches < 3:
-        return False, "The uploaded file doesn't appear to be a medical report. Please upload a valid medical report."
+    if len(find_medical_terms(text)) < MIN_MEDICAL_TERMS:
+        return False, NOT_MEDICAL_REPORT_ERROR
     
-    return True, None
\ No newline at end of file
+    return True, None
+
+def find_medical_terms(text):
+    """Return the medical report indicators present in text."""
+    text_lower = text.lower()
+    return {term for term in MEDICAL_TERMS if term in text_lower}
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from agents import analysis_agent
+from agents.analysis_agent import AnalysisAgent
+from agents.model_manager import ModelTier
+from agents.state import MemoryState
+from services.cache_service import AnalysisCache, MemoryCache
+from services.knowledge_store import KnowledgeBase, MemoryKnowledgeStore
+from services.near_duplicate_cache import NearDuplicateIndex
+from services.retrieval_service import CaseRetriever, MemoryCaseStore
+from utils.tokens import estimate_tokens
+
+MAX_PROMPT_TOKENS = 300
+REPORT = "\n".join(f"Marker {i}: {i % 9 + 1}.5 mg/dL (Reference: 1.0-5.0)" for i in range(100))
+
+class FakeModelManager:
+    """Only the planning side of ModelManager, with a small context window."""
+
+    def select_tiers(self, allowed=None):
+        return [ModelTier.PRIMARY]
+
+    def estimate_prompt_tokens(self, data, system_prompt):
+        return estimate_tokens(data["report"]) + estimate_tokens(system_prompt)
+
+    def max_prompt_tokens(self):
+        return MAX_PROMPT_TOKENS
+
+    def fits_context(self, tier, prompt_tokens):
+        return prompt_tokens <= MAX_PROMPT_TOKENS
+
+class FakeQuota:
+    def consume(self, user_id, access_token=None):
+        return True, None, None
+
+    def release(self, user_id, usage_id, access_token=None):
+        pass
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setattr(analysis_agent, "get_analysis_cache", lambda: AnalysisCache([MemoryCache()]))
+    monkeypatch.setattr(analysis_agent, "get_knowledge_base", lambda: KnowledgeBase(MemoryKnowledgeStore(3)))
+    monkeypatch.setattr(analysis_agent, "get_case_retriever", lambda: CaseRetriever(MemoryCaseStore()))
+    monkeypatch.setattr(analysis_agent, "get_near_duplicate_index", lambda: NearDuplicateIndex(
+        threshold=0.9, num_perm=64, bands=16, max_entries=100, ttl_seconds=3600
+    ))
+    return AnalysisAgent(model_manager=FakeModelManager(), state=MemoryState(), quota=FakeQuota())
+
+def _data():
+    return {"patient_name": "A", "age": "40", "gender": "female", "report": REPORT}
+
+def test_oversized_report_is_trimmed_for_the_model_only(agent):
+    prepared = agent.prepare_request(_data(), "sys", user_id="alice")
+
+    assert prepared["token_budget"]["truncated"]
+    assert len(prepared["model_data"]["report"]) < len(prepared["processed_data"]["report"])
+    assert prepared["processed_data"]["report"].startswith(prepared["model_data"]["report"])
+
+def test_trimmed_analysis_is_served_from_the_cache(agent):
+    prepared = agent.prepare_request(_data(), "sys", user_id="alice")
+    result = {
+        "success": True,
+        "content": "Several markers are high.",
+        "model_used": "primary-model",
+        "trace": [{"tier": ModelTier.PRIMARY.value, "outcome": "success"}]
+    }
+    agent.complete_analysis(prepared, result)
+
+    again = agent.prepare_request(_data(), "sys", user_id="alice")
+    assert again["cache_status"] == "hits"
+    assert again["result"]["content"] == "Several markers are high."
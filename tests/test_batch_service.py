@@ -0,0 +1,31 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.batch_service import ERROR, INVALID, BatchRunner, load_checkpoint
+
+class UnusedAgent:
+    def prepare_request(self, data, system_prompt):
+        raise AssertionError("no report in this batch should reach analysis")
+
+def test_a_failed_extraction_is_recorded_and_the_batch_continues(tmp_path):
+    output_path = str(tmp_path / "results.jsonl")
+    runner = BatchRunner(UnusedAgent(), "sys", output_path, extraction_workers=2, analysis_workers=1)
+    items = [
+        # Can't be sent to a worker process, so its future fails instead of returning
+        {"id": "unpicklable", "path": str(tmp_path / "a.pdf"), "callback": lambda: None},
+        {"id": "missing", "path": str(tmp_path / "missing.pdf")}
+    ]
+
+    summary = runner.run(items)
+
+    with open(output_path, encoding="utf-8") as f:
+        records = {record["id"]: record for record in map(json.loads, f)}
+    assert records["unpicklable"]["status"] == ERROR
+    assert records["unpicklable"]["error"].startswith("Extraction failed")
+    assert records["missing"]["status"] == INVALID
+    assert summary["processed"] == 2
+    # Errors aren't final, so a rerun tries the report again
+    assert load_checkpoint(output_path) == {"missing"}
@@ -0,0 +1,91 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services import cache_service
+from services.cache_service import AnalysisCache, MemoryCache, SQLiteCache, TieredCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_service, "time", clock)
+    return clock
+
+def test_memory_cache_evicts_the_least_recently_used(clock):
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_memory_cache_entries_expire(clock):
+    cache = MemoryCache(ttl_seconds=60)
+    cache.set("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+
+def test_memory_cache_is_bounded_by_size(clock):
+    cache = MemoryCache(max_bytes=10, size_of=len)
+    cache.set("a", "x" * 6)
+    cache.set("b", "x" * 3)
+    cache.set("c", "x" * 4)
+    assert cache.get("a") is None
+    assert cache.total_bytes == 7
+
+    # Larger than the whole cache: not stored at all
+    cache.set("d", "x" * 11)
+    assert cache.get("d") is None
+    assert cache.total_bytes == 7
+
+def test_sqlite_cache_entries_expire(clock, tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    cache.set("a", {"content": "x"})
+    assert cache.get("a") == {"content": "x"}
+    clock.now += 61
+    assert cache.get("a") is None
+
+def test_tiered_cache_backfills_faster_tiers(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    TieredCache([MemoryCache(), SQLiteCache(path)]).set("a", {"content": "x"})
+
+    memory = MemoryCache()
+    cache = TieredCache([memory, SQLiteCache(path)])
+    assert memory.get("a") is None
+    assert cache.get("a") == {"content": "x"}
+    assert memory.get("a") == {"content": "x"}
+    assert cache.get("missing") is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+def test_tiered_cache_hits_are_copies(clock):
+    cache = TieredCache([MemoryCache()])
+    cache.set("a", {"content": "x"})
+    cache.get("a")["content"] = "changed"
+    assert cache.get("a") == {"content": "x"}
+
+def test_analysis_cache_keys_ignore_whitespace_but_not_the_tier(clock):
+    data = {"report": "Glucose:  160 mg/dL\n", "age": "40"}
+    key = AnalysisCache.make_key(data, "Analyze this.", "primary")
+    assert AnalysisCache.make_key({"age": "40", "report": "Glucose: 160 mg/dL"}, " Analyze this.", "primary") == key
+    assert AnalysisCache.make_key(data, "Analyze this.", "secondary") != key
+    assert AnalysisCache.make_key({**data, "age": "41"}, "Analyze this.", "primary") != key
+
+def test_analysis_cache_stores_only_the_answer(clock):
+    cache = AnalysisCache([MemoryCache()])
+    cache.set("k", {"success": True, "content": "Fine", "model_used": "llama", "trace": [{"tier": "primary"}]})
+    assert cache.get("k") == {"content": "Fine", "model_used": "llama"}
@@ -0,0 +1,164 @@
+"""
+Checks that every chat repository behaves the way AuthService expects.
+
+SQLite always runs, in a temporary file. Supabase runs when CONTRACT_SUPABASE_URL and
+CONTRACT_SUPABASE_KEY are set; use a test project and its service role key. Each test
+creates an auth user with a random email and deletes sessions with that user's access
+token, since delete_chat_sessions only deletes the token owner's sessions; the user and
+its rows are deleted afterwards.
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from auth.user_client import UserClients
+from repositories.chat_repository import SQLiteChatRepository, SupabaseChatRepository
+
+SUPABASE_URL = os.environ.get("CONTRACT_SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("CONTRACT_SUPABASE_KEY")
+
+class Backend:
+    """A repository plus the user the test writes as."""
+
+    def __init__(self, repository, user_id=None, email=None, access_token=None):
+        self.repository = repository
+        self.user_id = user_id or str(uuid.uuid4())
+        self.email = email or f"contract-{uuid.uuid4().hex[:12]}@example.com"
+        self.access_token = access_token
+        self.start = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def at(self, seconds):
+        return (self.start + timedelta(seconds=seconds)).isoformat()
+
+    def insert_user(self):
+        user = {'id': self.user_id, 'email': self.email, 'name': "Contract Check", 'created_at': self.at(0)}
+        self.repository.insert_user(user)
+        return user
+
+    def insert_sessions(self, titles, seconds=None):
+        return [
+            self.repository.insert_session({
+                'user_id': self.user_id,
+                'title': title,
+                'created_at': self.at(index if seconds is None else seconds)
+            })
+            for index, title in enumerate(titles)
+        ]
+
+def _supabase_backend():
+    if not (SUPABASE_URL and SUPABASE_KEY):
+        pytest.skip("set CONTRACT_SUPABASE_URL and CONTRACT_SUPABASE_KEY to check the Supabase repository")
+    from supabase import create_client
+    admin = create_client(SUPABASE_URL, SUPABASE_KEY)
+    email = f"contract-{uuid.uuid4().hex[:12]}@example.com"
+    password = uuid.uuid4().hex
+    user = admin.auth.admin.create_user({"email": email, "password": password, "email_confirm": True}).user
+    try:
+        # Sign in on a separate client so `admin` keeps acting with the service key
+        session = create_client(SUPABASE_URL, SUPABASE_KEY).auth\
+            .sign_in_with_password({"email": email, "password": password}).session
+        repository = SupabaseChatRepository(admin, UserClients(SUPABASE_URL, SUPABASE_KEY))
+        yield Backend(repository, user_id=user.id, email=email, access_token=session.access_token)
+    finally:
+        admin.table('users').delete().eq('id', user.id).execute()
+        admin.auth.admin.delete_user(user.id)
+
+@pytest.fixture(params=["sqlite", "supabase"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        yield Backend(SQLiteChatRepository(str(tmp_path / "chat.db")))
+    else:
+        yield from _supabase_backend()
+
+def test_users(backend):
+    repository = backend.repository
+    user = backend.insert_user()
+
+    stored = repository.get_user(user['id'])
+    assert stored and stored['email'] == user['email'] and stored['name'] == user['name'], stored
+    assert repository.get_user(str(uuid.uuid4())) is None
+    assert repository.user_exists(user['email'])
+    assert not repository.user_exists(f"missing-{uuid.uuid4().hex}@example.com")
+
+def test_sessions_are_listed_newest_first_and_paged_by_cursor(backend):
+    repository = backend.repository
+    backend.insert_user()
+    sessions = backend.insert_sessions([f"Session {index}" for index in range(3)])
+    assert all(session and session['id'] for session in sessions), sessions
+
+    listed = repository.list_sessions(backend.user_id)
+    assert [row['title'] for row in listed] == ["Session 2", "Session 1", "Session 0"], listed
+    assert set(listed[0]) >= {'id', 'title', 'created_at'}, listed[0]
+    first_page = repository.list_sessions(backend.user_id, limit=2)
+    assert [row['title'] for row in first_page] == ["Session 2", "Session 1"], first_page
+    cursor = (first_page[-1]['created_at'], first_page[-1]['id'])
+    next_page = repository.list_sessions(backend.user_id, limit=2, before=cursor)
+    assert [row['title'] for row in next_page] == ["Session 0"], next_page
+    assert repository.list_sessions(str(uuid.uuid4())) == []
+
+def test_sessions_created_in_the_same_instant_are_paged_once(backend):
+    repository = backend.repository
+    backend.insert_user()
+    backend.insert_sessions([f"Session {index}" for index in range(3)])
+    tied = backend.insert_sessions([f"Tied {index}" for index in range(3)], seconds=5)
+
+    paged, cursor = [], None
+    while True:
+        page = repository.list_sessions(backend.user_id, limit=1, before=cursor)
+        if not page:
+            break
+        paged += page
+        cursor = (page[-1]['created_at'], page[-1]['id'])
+    assert [row['id'] for row in paged] == [row['id'] for row in repository.list_sessions(backend.user_id)], paged
+    assert len(paged) == 6 and {row['id'] for row in tied} <= {row['id'] for row in paged}, paged
+
+def test_messages_are_listed_oldest_first_and_inserted_idempotently(backend):
+    repository = backend.repository
+    backend.insert_user()
+    session_id = backend.insert_sessions(["Session"])[0]['id']
+    messages = [
+        {'id': str(uuid.uuid4()), 'session_id': session_id, 'role': "user" if index % 2 == 0 else "assistant",
+         'content': f"Message {index}", 'created_at': backend.at(10 + index)}
+        for index in range(5)
+    ]
+    repository.insert_messages(messages[:3])
+    repository.insert_messages(messages)
+
+    listed = repository.list_messages(session_id)
+    assert [row['content'] for row in listed] == [f"Message {index}" for index in range(5)], listed
+    assert set(listed[0]) >= {'id', 'session_id', 'role', 'content', 'created_at'}, listed[0]
+    newest = repository.list_messages(session_id, limit=2)
+    assert [row['content'] for row in newest] == ["Message 3", "Message 4"], newest
+    earlier = repository.list_messages(session_id, before=newest[0]['created_at'], limit=2)
+    assert [row['content'] for row in earlier] == ["Message 1", "Message 2"], earlier
+    since = repository.list_messages(session_id, since=listed[3]['created_at'])
+    assert [row['content'] for row in since] == ["Message 3", "Message 4"], since
+    assert repository.list_messages(str(uuid.uuid4())) == []
+
+def test_deletes_cascade_and_only_touch_the_owners_sessions(backend):
+    repository = backend.repository
+    backend.insert_user()
+    sessions = backend.insert_sessions([f"Session {index}" for index in range(3)])
+    session_id = sessions[0]['id']
+    repository.insert_messages([{
+        'id': str(uuid.uuid4()), 'session_id': session_id, 'role': "user",
+        'content': "Message", 'created_at': backend.at(10)
+    }])
+
+    repository.delete_session(session_id, backend.user_id)
+    assert repository.list_messages(session_id) == []
+    assert [row['title'] for row in repository.list_sessions(backend.user_id)] == ["Session 2", "Session 1"]
+
+    remaining = [session['id'] for session in sessions[1:]]
+    try:
+        # Deleting as someone else deletes nothing, or is refused outright
+        assert repository.delete_sessions(str(uuid.uuid4()), remaining, backend.access_token) == 0
+    except PermissionError:
+        pass
+    assert repository.delete_sessions(backend.user_id, remaining, backend.access_token) == 2
+    assert repository.list_sessions(backend.user_id) == []
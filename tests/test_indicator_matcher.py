@@ -0,0 +1,28 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.indicator_matcher import IndicatorMatcher
+
+def test_finds_terms_case_insensitively():
+    matcher = IndicatorMatcher(["Glucose", "HbA1c", "LDL"])
+    assert matcher.find("FASTING GLUCOSE: 160 mg/dL\nhba1c 7.1%") == {"glucose", "hba1c"}
+    assert matcher.find("No relevant values") == set()
+
+def test_overlapping_and_nested_terms():
+    matcher = IndicatorMatcher(["he", "she", "his", "hers", "cholesterol", "hdl cholesterol"])
+    assert matcher.find("ushers") == {"she", "he", "hers"}
+    assert matcher.find("HDL Cholesterol: 35") == {"cholesterol", "hdl cholesterol"}
+
+def test_matches_substrings_like_the_in_operator():
+    rng = random.Random(7)
+    terms = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(20)]
+    matcher = IndicatorMatcher(terms)
+    for _ in range(200):
+        text = "".join(rng.choice("abcAB ") for _ in range(rng.randint(0, 30)))
+        assert matcher.find(text) == {term for term in matcher.terms if term in text.lower()}, text
+
+def test_no_terms_finds_nothing():
+    assert IndicatorMatcher([]).find("glucose") == set()
@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.job_queue import DONE, FAILED, RUNNING, AnalysisJobQueue
+
+def _wait(queue, key):
+    job = queue.get(*key)
+    for _ in range(500):
+        if job.finished:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError("job did not finish")
+
+def test_job_streams_runs_and_persists():
+    persisted = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def run():
+        started.set()
+        release.wait(5)
+        yield {"type": "token", "content": "Hel"}
+        yield {"type": "token", "content": "lo"}
+        yield {"type": "done", "result": {"success": True, "content": "Hello"}}
+
+    queue = AnalysisJobQueue(max_workers=1, max_pending=10, retention_seconds=60)
+    job = queue.submit("s1", "m1", run, persisted.append)
+    assert started.wait(5)
+    assert job.snapshot()["status"] == RUNNING
+    release.set()
+
+    job = _wait(queue, job.key)
+    assert job.snapshot()["status"] == DONE
+    assert job.snapshot()["content"] == "Hello"
+    assert persisted == [{"success": True, "content": "Hello"}]
+
+def test_failed_analysis_is_not_persisted():
+    persisted = []
+
+    def run():
+        yield {"type": "done", "result": {"success": False, "error": "All models are busy"}}
+
+    queue = AnalysisJobQueue(max_workers=1, max_pending=10, retention_seconds=60)
+    job = _wait(queue, queue.submit("s1", "m1", run, persisted.append).key)
+    assert job.snapshot()["status"] == FAILED
+    assert job.snapshot()["error"] == "All models are busy"
+    assert persisted == []
+
+def test_full_queue_refuses_new_jobs():
+    release = threading.Event()
+
+    def run():
+        release.wait(5)
+        yield {"type": "done", "result": {"success": False, "error": "stopped"}}
+
+    queue = AnalysisJobQueue(max_workers=1, max_pending=1, retention_seconds=60)
+    first = queue.submit("s1", "m1", run, lambda result: None)
+    assert queue.submit("s1", "m2", run, lambda result: None) is None
+    release.set()
+    _wait(queue, first.key)
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.knowledge_store import KnowledgeBase, MemoryKnowledgeStore, SQLiteKnowledgeStore, profile_bucket
+
+DATA = {"patient_name": "Jane Doe", "age": "45", "gender": "Female", "report": "Glucose: 160 mg/dL"}
+ANALYSIS = "Summary\nJane Doe's glucose of 160 mg/dL is above the reference range."
+
+@pytest.fixture(params=["memory", "sqlite"])
+def knowledge_base(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryKnowledgeStore(max_per_key=3)
+    else:
+        store = SQLiteKnowledgeStore(str(tmp_path / "knowledge.db"), max_per_key=3)
+    return KnowledgeBase(store)
+
+def test_insights_are_only_shown_to_the_user_who_learned_them(knowledge_base):
+    knowledge_base.learn(DATA, ANALYSIS, "alice")
+
+    assert knowledge_base.context(DATA, "bob") == ""
+    assert knowledge_base.context(DATA, None) == ""
+    assert "Jane Doe's glucose" in knowledge_base.context(DATA, "alice")
+
+def test_nothing_is_learned_without_a_user(knowledge_base):
+    knowledge_base.learn(DATA, ANALYSIS, None)
+    assert knowledge_base.context(DATA, "alice") == ""
+
+def test_same_profile_comes_first(knowledge_base):
+    older = {**DATA, "age": "72", "gender": "male"}
+    knowledge_base.learn(older, "Glucose is fine for this age.", "alice")
+    knowledge_base.learn(DATA, ANALYSIS, "alice")
+    knowledge_base.context_items = 2
+
+    lines = knowledge_base.context(DATA, "alice").splitlines()
+    assert "similar patient profile" in lines[0]
+    assert "other patient profile" in lines[1]
+
+def test_unscoped_sqlite_table_is_dropped(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "knowledge.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE knowledge (indicator TEXT, profile TEXT, insight TEXT, used_at REAL)")
+    conn.execute("INSERT INTO knowledge VALUES ('glucose', '40s-female', 'shared insight', 0)")
+    conn.commit()
+    conn.close()
+
+    knowledge_base = KnowledgeBase(SQLiteKnowledgeStore(path, max_per_key=3))
+    assert knowledge_base.context(DATA, "alice") == ""
+
+def test_profile_bucket():
+    assert profile_bucket("45", "Female") == "40s-female"
+    assert profile_bucket(None, None) == "unknown-unknown"
@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.lab_parser import LabResult, format_value, parse_lab_report
+
+def _only(text):
+    panel = parse_lab_report(text)
+    assert len(panel.results) == 1, panel.results
+    return panel.results[0]
+
+def test_labeled_line_with_reference_range():
+    result = _only("Hemoglobin: 10.2 g/dL (Reference: 12.0-15.5)")
+    assert (result.analyte, result.value, result.unit) == ("Hemoglobin", 10.2, "g/dL")
+    assert (result.low, result.high) == (12.0, 15.5)
+    assert result.status == "low"
+
+def test_table_line():
+    result = _only("Glucose    160   mg/dL    70 - 100")
+    assert (result.analyte, result.value, result.unit) == ("Glucose", 160.0, "mg/dL")
+    assert (result.low, result.high, result.status) == (70.0, 100.0, "high")
+
+def test_one_sided_references_and_thousands_separators():
+    ldl = _only("LDL: 90 mg/dL (Reference: < 100)")
+    assert (ldl.low, ldl.high, ldl.status) == (None, 100.0, "normal")
+    hdl = _only("HDL: 35 mg/dL (Normal: > 40)")
+    assert (hdl.low, hdl.high, hdl.status) == (40.0, None, "low")
+    platelets = _only("Platelets: 250,000 /uL (Range: 150,000-400,000)")
+    assert (platelets.value, platelets.low, platelets.high, platelets.status) == (250000.0, 150000.0, 400000.0, "normal")
+
+def test_percent_unit_is_taken_from_the_reference():
+    result = _only("Hematocrit: 41 (Reference: 36-46%)")
+    assert result.unit == "%"
+    assert result.status == "normal"
+
+def test_values_without_a_range_have_unknown_status():
+    assert _only("Vitamin D: 25 ng/mL").status == "unknown"
+
+def test_dates_and_prose_are_not_results():
+    panel = parse_lab_report("Collected: 15/03/2024\nPatient fasted overnight.")
+    assert panel.results == []
+    assert panel.notes == ["Collected: 15/03/2024", "Patient fasted overnight."]
+
+def test_sections_group_results_and_notes_are_deduplicated():
+    panel = parse_lab_report(
+        "COMPLETE BLOOD COUNT\n"
+        "Hemoglobin: 13.5 g/dL (Reference: 12.0-15.5)\n"
+        "Sample hemolyzed\n"
+        "LIPID PANEL\n"
+        "Cholesterol: 240 mg/dL (Reference: 125-200)\n"
+        "Sample hemolyzed\n"
+    )
+    assert [(result.analyte, result.section) for result in panel.results] == [
+        ("Hemoglobin", "COMPLETE BLOOD COUNT"),
+        ("Cholesterol", "LIPID PANEL")
+    ]
+    assert panel.notes == ["Sample hemolyzed"]
+    assert [result.analyte for result in panel.abnormal] == ["Cholesterol"]
+    assert panel.to_prompt() == (
+        "## COMPLETE BLOOD COUNT\n"
+        "Hemoglobin: 13.5 g/dL [12.0-15.5]\n"
+        "## LIPID PANEL\n"
+        "Cholesterol: 240 mg/dL [125-200] HIGH\n"
+        "## Other report lines\n"
+        "Sample hemolyzed"
+    )
+
+def test_results_round_trip_through_dicts():
+    result = _only("Glucose: 160 mg/dL (Reference: 70-100)")
+    restored = LabResult.from_dict(result.to_dict())
+    assert restored.to_dict() == result.to_dict()
+    assert restored.to_dict()["status"] == "high"
+
+def test_format_value():
+    assert format_value(13.5) == "13.5"
+    assert format_value(160.0) == "160"
+    assert format_value(2500000.0) == "2500000"
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.message_writer import MessageWriter, _is_outage
+
+class APIError(Exception):
+    """Shaped like postgrest.APIError: a SQLSTATE or PGRST code and no HTTP status."""
+
+    def __init__(self, code):
+        super().__init__(f"error {code}")
+        self.code = code
+
+class HTTPError(Exception):
+    def __init__(self, status_code, code=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.code = code
+
+def test_connection_errors_and_unavailable_statuses_are_outages():
+    assert _is_outage(httpx.ConnectError("refused"))
+    assert _is_outage(TimeoutError())
+    assert _is_outage(sqlite3.OperationalError("database is locked"))
+    assert _is_outage(HTTPError(503))
+    assert _is_outage(HTTPError(503, code="PGRST301"))
+
+def test_database_codes_are_checked_apart_from_the_http_status():
+    assert _is_outage(APIError("08006"))
+    assert _is_outage(APIError("57P01"))
+    assert _is_outage(APIError("PGRST000"))
+    assert not _is_outage(APIError("23503"))
+    assert not _is_outage(APIError("PGRST204"))
+    assert not _is_outage(HTTPError(409, code="23505"))
+    assert not _is_outage(sqlite3.OperationalError("no such table: chat_messages"))
+
+def _message(i, session_id="s1"):
+    return {"id": f"m{i}", "session_id": session_id, "content": f"hello {i}"}
+
+def test_messages_are_spooled_and_sent(tmp_path):
+    inserted = []
+    writer = MessageWriter(inserted.extend, spool_path=str(tmp_path / "spool.jsonl"), flush_seconds=60)
+    writer.write(_message(1))
+
+    assert writer.pending("s1") == [_message(1)]
+    assert os.path.exists(writer.spool_path)
+    assert writer.flush(timeout=5)
+    assert inserted == [_message(1)]
+    assert not os.path.exists(writer.spool_path)
+
+def test_unsent_messages_are_resent_by_the_next_writer(tmp_path):
+    spool_path = str(tmp_path / "spool.jsonl")
+
+    def unreachable(batch):
+        raise httpx.ConnectError("refused")
+
+    first = MessageWriter(unreachable, spool_path=spool_path, flush_seconds=60)
+    first.write(_message(1))
+    first.write(_message(2))
+    assert not first.flush(timeout=0.5)
+    assert first.stats()["pending"] == 2
+
+    # A later process with the same pid takes over its own spool
+    inserted = []
+    second = MessageWriter(inserted.extend, spool_path=spool_path, flush_seconds=60)
+    assert second.flush(timeout=5)
+    assert sorted(message["id"] for message in inserted) == ["m1", "m2"]
+
+def test_rejected_rows_are_dropped_without_holding_back_the_rest(tmp_path):
+    inserted = []
+
+    def insert(batch):
+        if any(message["id"] == "m2" for message in batch):
+            raise APIError("23503")
+        inserted.extend(batch)
+
+    writer = MessageWriter(insert, flush_seconds=60)
+    for i in range(3):
+        writer.write(_message(i))
+    assert writer.flush(timeout=5)
+    assert [message["id"] for message in inserted] == ["m0", "m1"]
+    assert writer.stats()["rejected"] == 1
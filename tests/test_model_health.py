@@ -0,0 +1,110 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from agents import model_health
+from agents.model_health import ModelHealthTracker
+
+MODEL = "llama"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_health, "time", clock)
+    return clock
+
+def _tracker():
+    return ModelHealthTracker(window=10, min_samples=4, error_rate_threshold=0.5,
+                              failure_threshold=3, open_seconds=60, rate_limit_cooldown=30)
+
+def test_consecutive_failures_open_the_circuit(clock):
+    tracker = _tracker()
+    for _ in range(2):
+        tracker.record_failure(MODEL, 1.0)
+    assert tracker.allow_request(MODEL)
+
+    tracker.record_failure(MODEL, 1.0)
+    assert not tracker.allow_request(MODEL)
+    assert tracker.blocked_for(MODEL) == 60
+    assert tracker.snapshot()[MODEL]["state"] == "open"
+
+def test_error_rate_opens_the_circuit_once_there_are_enough_samples(clock):
+    tracker = _tracker()
+    for _ in range(2):
+        tracker.record_success(MODEL, 1.0)
+        tracker.record_failure(MODEL, 1.0)
+    assert not tracker.is_available(MODEL)
+
+def test_half_open_lets_one_probe_through(clock):
+    tracker = _tracker()
+    for _ in range(3):
+        tracker.record_failure(MODEL, 1.0)
+    clock.now += 60
+
+    assert tracker.allow_request(MODEL)
+    assert not tracker.allow_request(MODEL)
+    tracker.record_success(MODEL, 1.0)
+    assert tracker.snapshot()[MODEL]["state"] == "closed"
+    assert tracker.snapshot()[MODEL]["calls"] == 1
+    assert tracker.allow_request(MODEL)
+
+def test_failed_probe_reopens_the_circuit(clock):
+    tracker = _tracker()
+    for _ in range(3):
+        tracker.record_failure(MODEL, 1.0)
+    clock.now += 60
+    assert tracker.allow_request(MODEL)
+
+    tracker.record_failure(MODEL, 1.0)
+    assert tracker.blocked_for(MODEL) == 60
+
+def test_abandoned_probe_is_given_back_after_the_open_period(clock):
+    tracker = _tracker()
+    for _ in range(3):
+        tracker.record_failure(MODEL, 1.0)
+    clock.now += 60
+    assert tracker.allow_request(MODEL)
+
+    clock.now += 60
+    assert tracker.allow_request(MODEL)
+    tracker.release_probe(MODEL)
+    assert tracker.allow_request(MODEL)
+
+def test_rate_limit_cools_down_without_counting_as_a_failure(clock):
+    tracker = _tracker()
+    tracker.record_rate_limit(MODEL, cooldown=12)
+    assert tracker.blocked_for(MODEL) == 12
+    assert tracker.snapshot()[MODEL]["error_rate"] == 0.0
+
+    clock.now += 12
+    assert tracker.is_available(MODEL)
+    tracker.record_rate_limit(MODEL)
+    assert tracker.blocked_for(MODEL) == 30
+
+def test_degraded_before_the_circuit_opens(clock):
+    tracker = _tracker()
+    for outcome in (True, True, True, False, True, False):
+        if outcome:
+            tracker.record_success(MODEL, 1.0)
+        else:
+            tracker.record_failure(MODEL, 1.0)
+    assert tracker.is_available(MODEL)
+    assert tracker.is_degraded(MODEL)
+
+def test_latency_percentiles(clock):
+    tracker = _tracker()
+    for latency in (0.1, 0.2, 0.3, 0.4, 2.0):
+        tracker.record_success(MODEL, latency)
+    stats = tracker.snapshot()[MODEL]
+    assert stats["p50_latency"] == 0.3
+    assert stats["p95_latency"] == 2.0
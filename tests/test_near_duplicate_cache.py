@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.near_duplicate_cache import NearDuplicateIndex, adapt_analysis
+from utils.lab_parser import parse_lab_report
+
+REPORT = """Complete Blood Count
+Hemoglobin: 10.2 g/dL (Reference: 12.0-15.5)
+WBC: 7.1 K/uL (Reference: 4.0-11.0)
+Platelets: 250 K/uL (Reference: 150-400)
+"""
+PROMPT = "You are a medical analyst."
+
+def _processed(name, age, report=REPORT):
+    panel = parse_lab_report(report)
+    return {
+        "patient_name": name,
+        "age": age,
+        "gender": "female",
+        "report": panel.to_prompt(),
+        "lab_panel": [result.to_dict() for result in panel.results]
+    }
+
+def _index():
+    return NearDuplicateIndex(threshold=0.9, num_perm=64, bands=16, max_entries=100, ttl_seconds=3600)
+
+def test_different_users_never_share_a_hit():
+    index = _index()
+    index.add(_processed("Alice", 34), PROMPT, {"content": "Patient: Alice\nHemoglobin 10.2 is low."}, user_id="alice")
+
+    assert index.find(_processed("Bob", 37), PROMPT, user_id="bob") is None
+    # Same patient details submitted by another account
+    assert index.find(_processed("Alice", 34), PROMPT, user_id="bob") is None
+    assert index.find(_processed("Alice", 34), PROMPT, user_id="alice") is not None
+
+def test_same_user_different_patient_is_not_reused():
+    index = _index()
+    index.add(_processed("Alice", 34), PROMPT, {"content": "Patient: Alice"}, user_id="clinic")
+
+    assert index.find(_processed("Carol", 34), PROMPT, user_id="clinic") is None
+
+def test_adapt_analysis_rewrites_identity_lines():
+    content = "**Patient:** Alice Smith\nName - Alice Smith\nAlice Smith's hemoglobin is low."
+    adapted = adapt_analysis(content, [], [], old_name="Alice Smith", new_name="alice smith")
+
+    assert "Alice Smith" not in adapted
+    assert adapted.count("alice smith") == 3
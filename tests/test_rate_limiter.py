@@ -0,0 +1,97 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from agents import rate_limiter
+from agents.rate_limiter import MemoryBucketStore, RateLimiter, SQLiteBucketStore
+
+MODEL = "llama"
+
+class Clock:
+    """Stands in for the time module: time() plus a sleep that only advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBucketStore()
+    return SQLiteBucketStore(str(tmp_path / "rate_limits.db"))
+
+def test_requests_per_minute(clock, store):
+    limiter = RateLimiter({MODEL: (2, 10000)}, store)
+    assert limiter.acquire(MODEL, 10)
+    assert limiter.acquire(MODEL, 10)
+    assert not limiter.acquire(MODEL, 10)
+
+    # One request refills every 30 seconds
+    clock.now += 30
+    assert limiter.acquire(MODEL, 10)
+    assert not limiter.acquire(MODEL, 10)
+
+def test_tokens_per_minute(clock, store):
+    limiter = RateLimiter({MODEL: (100, 600)}, store)
+    assert limiter.acquire(MODEL, 500)
+    assert not limiter.acquire(MODEL, 200)
+    clock.now += 10
+    assert limiter.acquire(MODEL, 200)
+
+def test_requests_larger_than_the_bucket_take_all_of_it(clock, store):
+    limiter = RateLimiter({MODEL: (100, 600)}, store)
+    assert limiter.acquire(MODEL, 5000)
+    assert not limiter.acquire(MODEL, 1)
+
+def test_acquire_waits_up_to_max_wait(clock, store):
+    limiter = RateLimiter({MODEL: (1, 10000)}, store)
+    assert limiter.acquire(MODEL, 10)
+    assert not limiter.acquire(MODEL, 10, max_wait=30)
+    assert clock.slept == 0
+
+    assert limiter.acquire(MODEL, 10, max_wait=60)
+    assert clock.slept == pytest.approx(60)
+
+def test_reconcile_charges_the_real_usage(clock, store):
+    limiter = RateLimiter({MODEL: (100, 1000)}, store)
+    assert limiter.acquire(MODEL, 100)
+    limiter.reconcile(MODEL, 100, 900)
+    assert limiter.snapshot()[MODEL]["tokens"] == pytest.approx(100)
+    assert not limiter.acquire(MODEL, 200)
+
+    limiter.reconcile(MODEL, 900, 100)
+    assert limiter.acquire(MODEL, 200)
+
+def test_unknown_models_are_not_limited(clock, store):
+    limiter = RateLimiter({MODEL: (1, 10)}, store)
+    assert all(limiter.acquire("other", 1000) for _ in range(5))
+
+def test_sqlite_buckets_are_shared_between_limiters(clock, tmp_path):
+    path = str(tmp_path / "rate_limits.db")
+    first = RateLimiter({MODEL: (1, 10000)}, SQLiteBucketStore(path))
+    second = RateLimiter({MODEL: (1, 10000)}, SQLiteBucketStore(path))
+    assert first.acquire(MODEL, 10)
+    assert not second.acquire(MODEL, 10)
+
+def test_a_broken_store_does_not_block_calls(clock):
+    class BrokenStore:
+        def take(self, model, tokens, rpm, tpm):
+            raise RuntimeError("database is locked")
+
+    assert RateLimiter({MODEL: (1, 10)}, BrokenStore()).acquire(MODEL, 5)
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.retrieval_service import CaseRetriever, MemoryCaseStore, SQLiteCaseStore, vectorize_panel
+from utils.lab_parser import parse_lab_report
+
+REPORT = """Hemoglobin: 10.2 g/dL (Reference: 12.0-15.5)
+Glucose: 160 mg/dL (Reference: 70-100)
+Cholesterol: 180 mg/dL (Reference: 125-200)
+"""
+
+def _panel(report=REPORT):
+    return [result.to_dict() for result in parse_lab_report(report).results]
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCaseStore()
+    return SQLiteCaseStore(str(tmp_path / "retrieval.db"), 128)
+
+def test_a_users_cases_are_never_returned_to_another_user(store):
+    retriever = CaseRetriever(store)
+    assert retriever.add("alice", _panel(), "Glucose high", "Patient: Alice Smith\nGlucose is high.")
+
+    assert retriever.similar("bob", _panel()) == []
+    assert retriever.similar(None, _panel()) == []
+    cases = retriever.similar("alice", _panel())
+    assert [case["analysis"] for case in cases] == ["Patient: Alice Smith\nGlucose is high."]
+
+def test_cases_without_a_user_are_not_stored(store):
+    retriever = CaseRetriever(store)
+    assert not retriever.add(None, _panel(), "Glucose high", "analysis")
+    assert store.load_since(0) == []
+
+def test_cases_from_other_processes_keep_their_user(tmp_path):
+    path = str(tmp_path / "retrieval.db")
+    writer = CaseRetriever(SQLiteCaseStore(path, 128))
+    reader = CaseRetriever(SQLiteCaseStore(path, 128))
+    writer.add("alice", _panel(), "Glucose high", "analysis")
+
+    assert reader.similar("bob", _panel()) == []
+    assert len(reader.similar("alice", _panel())) == 1
+
+def test_vectorize_panel_needs_a_reference_range():
+    assert vectorize_panel([{"analyte": "Glucose", "value": 90.0, "low": None, "high": None}]) is None
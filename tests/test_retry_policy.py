@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+from email.utils import formatdate
+
+import groq
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from agents.retry_policy import (
+    FATAL,
+    RATE_LIMIT,
+    TRANSIENT,
+    RetryPolicy,
+    classify_error,
+    parse_duration,
+    parse_retry_after
+)
+
+REQUEST = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+
+def _status_error(error_class, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return error_class("error", response=response, body=None)
+
+def test_classify_error():
+    assert classify_error(_status_error(groq.RateLimitError, 429)) == RATE_LIMIT
+    assert classify_error(_status_error(groq.InternalServerError, 503)) == TRANSIENT
+    assert classify_error(groq.APIConnectionError(request=REQUEST)) == TRANSIENT
+    assert classify_error(groq.APITimeoutError(request=REQUEST)) == TRANSIENT
+    assert classify_error(_status_error(groq.BadRequestError, 400)) == FATAL
+    assert classify_error(_status_error(groq.AuthenticationError, 401)) == FATAL
+    assert classify_error(RuntimeError("Read timeout")) == TRANSIENT
+    assert classify_error(ValueError("bad prompt")) == FATAL
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66),
+    ("2m59.56s", 179.56),
+    ("120ms", 0.12),
+    ("1h2m", 3720.0),
+    ("", None),
+    ("soon", None)
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+def test_retry_after_seconds_and_http_date():
+    assert parse_retry_after(_status_error(groq.RateLimitError, 429, {"retry-after": "3"})) == 3.0
+    date = formatdate(time.time() + 10, usegmt=True)
+    wait = parse_retry_after(_status_error(groq.RateLimitError, 429, {"retry-after": date}))
+    assert 8 <= wait <= 10
+    past = formatdate(time.time() - 60, usegmt=True)
+    assert parse_retry_after(_status_error(groq.RateLimitError, 429, {"retry-after": past})) == 0.0
+
+def test_retry_after_falls_back_to_the_longest_reset_header():
+    error = _status_error(groq.RateLimitError, 429, {
+        "x-ratelimit-reset-requests": "2.5s",
+        "x-ratelimit-reset-tokens": "1m"
+    })
+    assert parse_retry_after(error) == 60.0
+    assert parse_retry_after(_status_error(groq.RateLimitError, 429)) is None
+    assert parse_retry_after(RuntimeError("no response")) is None
+
+def _policy():
+    return RetryPolicy(max_attempts_per_tier=3, base_delay=0.5, max_delay=4.0, max_wait=5.0, deadline_seconds=90)
+
+def test_rate_limits_wait_only_for_short_retry_after():
+    policy = _policy()
+    deadline = policy.new_deadline()
+    delay = policy.retry_delay(RATE_LIMIT, 0, 2.0, deadline)
+    assert 2.0 <= delay <= 2.5
+    assert policy.retry_delay(RATE_LIMIT, 0, 30.0, deadline) is None
+    assert policy.retry_delay(RATE_LIMIT, 0, None, deadline) is None
+
+def test_transient_errors_back_off_within_the_cap():
+    policy = _policy()
+    deadline = policy.new_deadline()
+    assert 0 <= policy.retry_delay(TRANSIENT, 0, None, deadline) <= 0.5
+    assert all(0 <= policy.backoff(10) <= 4.0 for _ in range(50))
+
+def test_no_retry_when_fatal_out_of_attempts_or_past_the_deadline():
+    policy = _policy()
+    deadline = policy.new_deadline()
+    assert policy.retry_delay(FATAL, 0, None, deadline) is None
+    assert policy.retry_delay(TRANSIENT, 2, None, deadline) is None
+    assert policy.retry_delay(RATE_LIMIT, 0, 2.0, time.time() + 1) is None
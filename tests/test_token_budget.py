@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.token_budget import PAGE_BREAK, compact_report, truncate_to_tokens
+from utils.tokens import estimate_tokens
+
+def test_blood_pressure_and_titers_are_kept():
+    report = "Blood Pressure\n120/80\nANA titer\n1/160\nSeen 2 of 3 times"
+    assert compact_report(report) == report
+
+def test_ratios_at_a_page_edge_are_kept_unless_they_count_pages():
+    report = PAGE_BREAK.join([
+        "Vitals\nPulse: 72 bpm\n120/80",
+        "ANA titer\n1/160\nGlucose: 90 mg/dL"
+    ])
+    assert "120/80" in compact_report(report)
+    assert "1/160" in compact_report(report)
+
+def test_page_numbers_are_dropped():
+    report = PAGE_BREAK.join([
+        "Glucose: 90 mg/dL\n1/2",
+        "Page 2 of 2\nSodium: 140 mmol/L\n2 of 2"
+    ])
+    assert compact_report(report) == "Glucose: 90 mg/dL\nSodium: 140 mmol/L"
+
+def test_repeated_pages_and_footers_are_dropped():
+    header = "City Lab - Patient Report"
+    report = PAGE_BREAK.join([
+        f"{header}\nGlucose: 90 mg/dL",
+        f"{header}\nSodium: 140 mmol/L",
+        f"{header}\nSodium: 140 mmol/L",
+        f"{header}\nPotassium: 4.1 mmol/L\nEnd of report"
+    ])
+    assert compact_report(report) == (
+        f"{header}\nGlucose: 90 mg/dL\nSodium: 140 mmol/L\nPotassium: 4.1 mmol/L"
+    )
+
+def test_repeated_result_lines_are_kept():
+    report = PAGE_BREAK.join(["Glucose: 90 mg/dL\nNormal", "Glucose: 90 mg/dL\nNormal\nRepeat test"])
+    assert compact_report(report).count("Glucose: 90 mg/dL") == 2
+
+def test_truncate_keeps_whole_lines_within_budget():
+    text = "\n".join(f"Line {i}: some result text" for i in range(50))
+    truncated = truncate_to_tokens(text, 40)
+    assert text.startswith(truncated)
+    assert truncated.endswith("some result text")
+    assert estimate_tokens(truncated) <= 40